@@ -31,7 +31,8 @@ def get_args():
     parser.add_argument("-t", "--table", type=str, help="归档表的表名，如：orders或orders:orders_history(可以使用冒号分别指定源端和目标端table名)")
     parser.add_argument("-m", "--mode", type=str, default='archive',
                         choices=['archive', 'archive-slow', 'archive-slow-replace', 'delete', 'archive-to-file',
-                                 'archive-partition', 'archive-partition-slow'],
+                                 'archive-partition', 'archive-partition-slow', 'archive-native',
+                                 'archive-to-file-native'],
                         help="核对模式，archive：速度快；archive-slow：速度慢，兼容性高；delete：只删除不归档")
     parser.add_argument("-w", "--where", type=str, required=True, help="归档条件")
     parser.add_argument("-i", "--interval", type=int, default=1, help="执行间隔天数,默认间隔1天")
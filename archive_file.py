@@ -0,0 +1,327 @@
+#!/bin/python3
+# -*- encoding: utf-8 -*-
+"""
+####################################################################################################
+#  Name        :  archive_file.py
+#  Author      :  Elison
+#  Email       :  Ly99@qq.com
+#  Description :  压缩分块归档文件：TSV格式（兼容LOAD DATA），按大小切分，每个目录一个manifest.json
+#  Updates     :
+#      Version     When            What
+#      --------    -----------     -----------------------------------------------------------------
+#      v1.0        2026-10-18
+####################################################################################################
+"""
+import os
+import re
+import gzip
+import json
+import time
+import decimal
+import datetime
+import threading
+
+try:
+    import zstandard  # 可选依赖：pip3 install zstandard
+except ImportError:
+    zstandard = None
+
+MANIFEST_NAME = 'manifest.json'
+SUFFIXES = {'gzip': '.tsv.gz', 'zstd': '.tsv.zst'}
+CHUNK_FILE_REGEX = re.compile(r'^.+_\d+\.tsv\.(gz|zst)$')
+BINARY_TYPES = ['binary', 'varbinary', 'tinyblob', 'blob', 'mediumblob', 'longblob', 'bit', 'geometry', 'point',
+                'linestring', 'polygon', 'multipoint', 'multilinestring', 'multipolygon', 'geometrycollection']
+INT_TYPES = ['tinyint', 'smallint', 'mediumint', 'int', 'bigint']
+PY_CHARSETS = {'utf8': 'utf8', 'utf8mb4': 'utf8', 'gbk': 'gbk', 'latin1': 'latin1', 'binary': 'latin1'}
+
+# LOAD DATA默认格式：FIELDS TERMINATED BY '\t' ESCAPED BY '\\' LINES TERMINATED BY '\n'，NULL写为\N
+ESCAPES = [(b'\\', b'\\\\'), (b'\t', b'\\t'), (b'\n', b'\\n'), (b'\r', b'\\r'), (b'\x00', b'\\0')]
+UNESCAPES = {b't': b'\t', b'n': b'\n', b'r': b'\r', b'0': b'\x00', b'\\': b'\\', b'N': None}
+
+
+def escape_bytes(data):
+    "转义TSV中的特殊字符"
+    for old, new in ESCAPES:
+        data = data.replace(old, new)
+    return data
+
+
+def encode_value(value, charset='utf8mb4', is_binary=False):
+    "把一个字段的值编码为LOAD DATA格式，二进制字段写为十六进制（加载时用UNHEX还原）"
+    if value is None:
+        return b'\\N'
+    if is_binary:
+        if isinstance(value, str):
+            value = value.encode(PY_CHARSETS.get(charset, 'utf8'))
+        return bytes(value).hex().encode('ascii')
+    if isinstance(value, bytes):
+        return escape_bytes(value)
+    if isinstance(value, bool):
+        return b'1' if value else b'0'
+    if isinstance(value, (int, decimal.Decimal)):
+        return str(value).encode('ascii')
+    if isinstance(value, float):
+        return repr(value).encode('ascii')
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(' ').encode('ascii')
+    if isinstance(value, datetime.date):
+        return value.isoformat().encode('ascii')
+    if isinstance(value, datetime.timedelta):
+        return format_timedelta(value).encode('ascii')
+    if isinstance(value, (set, frozenset)):
+        value = ','.join(sorted(value))
+    return escape_bytes(str(value).encode(PY_CHARSETS.get(charset, 'utf8')))
+
+
+def format_timedelta(value):
+    "TIME类型(timedelta)格式化为[-]HH:MM:SS[.ffffff]"
+    sign = '-' if value < datetime.timedelta(0) else ''
+    value = abs(value)
+    seconds = value.days * 86400 + value.seconds
+    text = '{}{:02d}:{:02d}:{:02d}'.format(sign, seconds // 3600, seconds % 3600 // 60, seconds % 60)
+    if value.microseconds:
+        text += '.{:06d}'.format(value.microseconds)
+    return text
+
+
+def encode_row(row, charset='utf8mb4', binary_flags=None):
+    "把一行编码为LOAD DATA格式的一行（含换行符）"
+    if binary_flags is None:
+        binary_flags = [False] * len(row)
+    return b'\t'.join([encode_value(v, charset, b) for v, b in zip(row, binary_flags)]) + b'\n'
+
+
+def decode_line(line):
+    "解析LOAD DATA格式的一行，返回bytes列表，NULL返回None"
+    values = []
+    for field in line.rstrip(b'\n').split(b'\t'):
+        if field == b'\\N':
+            values.append(None)
+            continue
+        if b'\\' not in field:
+            values.append(field)
+            continue
+        out = bytearray()
+        i = 0
+        while i < len(field):
+            if field[i:i + 1] == b'\\' and i + 1 < len(field):
+                out += UNESCAPES.get(field[i + 1:i + 2]) or field[i + 1:i + 2]
+                i += 2
+            else:
+                out += field[i:i + 1]
+                i += 1
+        values.append(bytes(out))
+    return values
+
+
+def open_writer(path, compress):
+    "打开压缩写入流"
+    if compress == 'gzip':
+        return gzip.open(path, 'wb', compresslevel=6)
+    if compress == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstd压缩需要安装zstandard：pip3 install zstandard")
+        fh = open(path, 'wb')
+        return zstandard.ZstdCompressor(level=3).stream_writer(fh, closefd=True)
+    raise ValueError("不支持的压缩格式：{}".format(compress))
+
+
+def open_reader(path):
+    "打开解压读取流（根据文件后缀判断压缩格式）"
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError("zstd解压需要安装zstandard：pip3 install zstandard")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return open(path, 'rb')
+
+
+def to_json_value(value):
+    "manifest中的主键、时间字段值：整数保持整数，其它转为字符串"
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, bytes):
+        return value.decode('utf8', errors='replace')
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(' ')
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return str(value)
+
+
+class ChunkManifest:
+    "归档目录的清单：记录每个分块文件的行数、主键范围、时间字段范围"
+
+    def __init__(self, dirname):
+        self.dirname = dirname
+        self.path = os.path.join(dirname, MANIFEST_NAME)
+        self.lock = threading.Lock()
+        self.data = {'chunks': []}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                self.data = json.load(f)
+
+    def init_table(self, table_info):
+        "记录表信息（字段、主键、字符集等），表结构变化时以最新的为准"
+        with self.lock:
+            self.data.update(table_info)
+            self.save()
+
+    def add_chunk(self, entry):
+        "增加一个分块记录"
+        with self.lock:
+            self.data['chunks'].append(entry)
+            self.save()
+
+    def save(self):
+        "原子写入manifest"
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def chunks(self):
+        "所有分块记录"
+        return list(self.data['chunks'])
+
+    def orphan_files(self):
+        "目录中未记录到manifest的分块文件（异常退出时未关闭的分块）"
+        known = set([i['file'] for i in self.data['chunks']])
+        return sorted([i for i in os.listdir(self.dirname) if CHUNK_FILE_REGEX.match(i) and i not in known])
+
+    def recover_orphans(self):
+        "扫描未记录的分块文件，补录到manifest（截断的压缩流读取到可读的最后一行为止）"
+        columns = self.data.get('columns', [])
+        pk_columns = self.data.get('pk_columns', [])
+        time_column = self.data.get('time_column')
+        column_types = self.data.get('column_types', {})
+        if not columns:
+            return []
+        int_flags = [column_types.get(i) in INT_TYPES for i in columns]
+        recovered = []
+        for name in self.orphan_files():
+            entry = ChunkStats(name, columns, pk_columns, time_column)
+            try:
+                with open_reader(os.path.join(self.dirname, name)) as f:
+                    for line in f:
+                        if not line.endswith(b'\n'):
+                            break
+                        row = [None if v is None else (int(v) if is_int else v.decode('utf8', errors='replace'))
+                               for v, is_int in zip(decode_line(line), int_flags)]
+                        entry.add_values(row)
+            except Exception:
+                pass  # 截断的分块，保留已读取的部分
+            entry.bytes = os.path.getsize(os.path.join(self.dirname, name))
+            self.add_chunk(entry.to_dict())
+            recovered.append(name)
+        return recovered
+
+
+class ChunkStats:
+    "单个分块的统计信息"
+
+    def __init__(self, filename, columns, pk_columns, time_column=None):
+        self.file = filename
+        self.pk_index = [columns.index(i) for i in pk_columns]
+        self.time_index = columns.index(time_column) if time_column in columns else None
+        self.rows = 0
+        self.raw_bytes = 0
+        self.bytes = 0
+        self.pk_min = None
+        self.pk_max = None
+        self.time_min = None
+        self.time_max = None
+        self.created = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
+
+    def add_values(self, row):
+        "累加一行"
+        self.rows += 1
+        pk = [row[i] for i in self.pk_index]
+        if self.pk_min is None or pk < self.pk_min:
+            self.pk_min = pk
+        if self.pk_max is None or pk > self.pk_max:
+            self.pk_max = pk
+        if self.time_index is not None:
+            value = row[self.time_index]
+            if value is not None:
+                if self.time_min is None or value < self.time_min:
+                    self.time_min = value
+                if self.time_max is None or value > self.time_max:
+                    self.time_max = value
+
+    def to_dict(self):
+        "转为manifest记录"
+        return {'file': self.file, 'rows': self.rows, 'bytes': self.bytes, 'raw_bytes': self.raw_bytes,
+                'pk_min': [to_json_value(i) for i in self.pk_min or []],
+                'pk_max': [to_json_value(i) for i in self.pk_max or []],
+                'time_min': to_json_value(self.time_min), 'time_max': to_json_value(self.time_max),
+                'created': self.created}
+
+
+class ChunkFileWriter:
+    "分块文件写入：行流式写入压缩流，未压缩大小超过上限时切换到新文件并写入manifest"
+
+    def __init__(self, manifest, prefix, columns, pk_columns, column_types, charset='utf8mb4', compress='gzip',
+                 max_bytes=256 * 1024 * 1024, time_column=None):
+        self.manifest = manifest
+        self.prefix = prefix
+        self.columns = columns
+        self.pk_columns = pk_columns
+        self.charset = charset
+        self.compress = compress
+        self.max_bytes = max_bytes
+        self.time_column = time_column
+        self.binary_flags = [column_types.get(i) in BINARY_TYPES for i in columns]
+        self.seq = 0
+        self.fh = None
+        self.stats = None
+
+    def open_chunk(self):
+        "打开新的分块文件"
+        self.seq += 1
+        filename = "{}_{}{}".format(self.prefix, self.seq, SUFFIXES[self.compress])
+        self.fh = open_writer(os.path.join(self.manifest.dirname, filename), self.compress)
+        self.stats = ChunkStats(filename, self.columns, self.pk_columns, self.time_column)
+
+    def write_rows(self, rows):
+        "写入一批行，写完后flush到操作系统，保证删除源表数据前归档数据已落盘"
+        if self.fh is None:
+            self.open_chunk()
+        for row in rows:
+            line = encode_row(row, self.charset, self.binary_flags)
+            self.fh.write(line)
+            self.stats.raw_bytes += len(line)
+            self.stats.add_values(row)
+        self.flush()
+        if self.stats.raw_bytes >= self.max_bytes:
+            self.close_chunk()
+
+    def flush(self):
+        "刷新压缩流"
+        if self.compress == 'zstd':
+            self.fh.flush(zstandard.FLUSH_BLOCK)
+        else:
+            self.fh.flush()
+
+    def close_chunk(self):
+        "关闭当前分块并记录到manifest"
+        if self.fh is None:
+            return
+        self.fh.close()
+        path = os.path.join(self.manifest.dirname, self.stats.file)
+        with open(path, 'rb') as f:
+            os.fsync(f.fileno())
+        self.stats.bytes = os.path.getsize(path)
+        if self.stats.rows > 0:
+            self.manifest.add_chunk(self.stats.to_dict())
+        else:
+            os.remove(path)
+        self.fh = None
+        self.stats = None
+
+    def close(self):
+        "关闭"
+        self.close_chunk()
@@ -11,15 +11,35 @@
 #      --------    -----------     -----------------------------------------------------------------
 #      v1.0        2022-11-13
 #      v1.1        2022-12-08      增加slow-copy、slow-replace等模式
+#      v1.2        2026-10-18      增加-l参数，批次大小可配置
+#      v1.3        2026-10-18      增加-b参数，批量归档所有符合条件的分区，拷贝下一个分区与核对、删除上一个分区并行执行；
+#                                  支持RANGE COLUMNS分区，支持TO_DAYS、UNIX_TIMESTAMP分区函数（date、datetime、timestamp字段）
+#      v1.4        2026-10-18      删除分区前按主键分块并行比较行数和校验和，只校验该分区的范围
+#      v1.5        2026-10-18      收到SIGTERM时，处理完正在拷贝的分区后暂停退出（退出码0）
+#      v1.6        2026-10-18      拷贝前检查归档表是否已有该分区的数据（上次拷贝后未删除分区）：数据一致时跳过拷贝，否则用replace重新拷贝
+#      v1.7        2026-10-18      时间字段的分区上界和归档条件转换为字段类型后比较
 ####################################################################################################
 """
+import re
 import sys
 import time
+import signal
 import argparse
 import logging
+from concurrent.futures import ThreadPoolExecutor
 import util
+import checksum
 from archiver import expr_to_date
 
+INT_TYPES = ['tinyint', 'smallint', 'mediumint', 'int', 'bigint']
+# 分区表达式：字段名，或TO_DAYS(字段名)、UNIX_TIMESTAMP(字段名)
+EXPRESSION_REGEX = re.compile(r'^\s*(?:(to_days|unix_timestamp)\s*\(\s*)?`?(\w+)`?\s*\)?\s*$', re.I)
+# 分区表达式的值还原为字段的值
+BOUND_FUNCTIONS = {None: '{}', 'to_days': 'from_days({})', 'unix_timestamp': 'from_unixtime({})'}
+WHERE_REGEX = re.compile(r'^\s*`?(\w+)`?\s*(<=|<)\s*(.+?)\s*$', re.S)
+# 时间字段的分区上界和归档条件都转换为字段类型再比较，避免按字符串比较（如'2026-1-5'和'2026-01-05'）
+CAST_TYPES = {'date': 'date', 'datetime': 'datetime', 'timestamp': 'datetime'}
+
 
 def set_log_level(level='info'):
     "设置日志等级"
@@ -49,6 +69,11 @@ def get_args():
     parser.add_argument("-m", "--mode", default='copy', choices=['copy', 'slow-copy', 'slow-replace', 'no-copy'],
                         help="模式，copy:使用pt-archiver拷贝数据，slow-copy:兼容模式（不会丢数据），no-copy:不拷贝数据")
     parser.add_argument("-r", "--repeat", action='store_true', help="重复执行，直到异常退出")
+    parser.add_argument("-b", "--batch", action='store_true',
+                        help="批量模式：一次规划所有符合条件的分区，拷贝下一个分区时并行核对、删除上一个分区")
+    parser.add_argument("-l", "--limit", type=int, default=1000, help="每批次处理的行数")
+    parser.add_argument("--verify-chunk-size", type=int, default=10000, help="校验数据时每块的行数")
+    parser.add_argument("--verify-parallel", type=int, default=4, help="校验数据的并行线程数")
     args = parser.parse_args()
 
     # 处理参数
@@ -100,6 +125,10 @@ def get_args():
     dct['password'] = args.password
     dct['mode'] = args.mode
     dct['repeat'] = args.repeat
+    dct['batch'] = args.batch
+    dct['limit'] = args.limit
+    dct['verify_chunk_size'] = args.verify_chunk_size
+    dct['verify_parallel'] = max(args.verify_parallel, 1)
 
     return dct
 
@@ -119,12 +148,18 @@ class ArchivePartTable:
         self.charset = conf['charset']
         self.where = expr_to_date(conf['where'])
         self.mode = expr_to_date(conf['mode'])
+        self.limit = conf['limit']
+        self.batch = conf.get('batch', False)
+        self.verify_chunk_size = conf.get('verify_chunk_size', 10000)
+        self.verify_parallel = conf.get('verify_parallel', 4)
         self.source_conf = {"host": self.source_host, "port": self.source_port, "db": self.source_db, 'user': self.user,
                             "password": self.password}
         self.target_conf = {"host": self.target_host, "port": self.target_port, "db": self.target_db, 'user': self.user,
                             "password": self.password}
-        self.oldest_partition = None
+        self.partition_list = []
+        self.plan = []
         self.precheck_result = False
+        self.pause_flag = False
         self.status = 'begin'
 
     def __str__(self):
@@ -141,67 +176,95 @@ class ArchivePartTable:
             conn.close()
             return data_type
         except Exception as e:
-            logging.info("获取字段类型报错: ", e)
+            logging.info("获取字段类型报错: {}".format(e))
             sys.exit(1)
 
-    def get_oldest_partition(self):
-        "获取最旧的分区信息"
+    def get_partitions(self):
+        "获取所有分区信息，按分区顺序排列"
         sql = """select table_schema db,table_name tb,partition_name pname, partition_method method,partition_expression partition_by_column, partition_description less_than_value from information_schema.partitions 
-        where table_schema='{}' and table_name='{}' order by less_than_value limit 1""".format(self.source_db,
-                                                                                               self.source_table)
+        where table_schema='{}' and table_name='{}' order by partition_ordinal_position""".format(self.source_db,
+                                                                                                  self.source_table)
         conn = util.mysql(self.source_conf)
         res = conn.query(sql)
         conn.close()
-        if len(res) == 1:
-            self.oldest_partition_info = res[0]
+        if len(res) > 0 and res[0]['pname']:
+            self.partition_list = res
         else:
             logging.info("没有找到源表的分区信息,请检查表是否存在或是否是分区表")
             sys.exit(1)
 
     def precheck(self):
-        "预检查"
+        "预检查：解析分区键，按分区顺序找出所有上界不超过归档条件的分区"
         self.status = 'precheck'
-        logging.info("即将归档的分区信息：{}".format(self.oldest_partition_info))
-        if self.oldest_partition_info['method'] == 'RANGE':
-            self.partition_by_column = self.oldest_partition_info['partition_by_column']
-            data_type = self.get_column_type(self.partition_by_column)
-            if data_type == 'int':
-                self.count_sql = """select count(*) from {}""".format(self.oldest_partition_info['tb'])
-                self.partition_subsql = """ partition({})""".format(self.oldest_partition_info['pname'])
-                self.drop_sql = "alter table {} drop partition {}".format(self.oldest_partition_info['tb'],
-                                                                          self.oldest_partition_info['pname'])
-                self.less_than_value = self.oldest_partition_info['less_than_value']
+        info = self.partition_list[0]
+        if info['method'] not in ['RANGE', 'RANGE COLUMNS']:
+            logging.info("不支持该分区类型：{}".format(info['method']))
+            sys.exit(1)
+        res = EXPRESSION_REGEX.match(info['partition_by_column'])
+        if not res or (info['method'] == 'RANGE COLUMNS' and res.group(1)):
+            logging.info("不支持该分区表达式：{}".format(info['partition_by_column']))
+            sys.exit(1)
+        func = res.group(1).lower() if res.group(1) else None
+        self.partition_by_column = res.group(2)
+        data_type = self.get_column_type(self.partition_by_column)
+        if info['method'] == 'RANGE' and func is None and data_type not in INT_TYPES:
+            logging.info("不支持分区键的字段类型：{}".format(data_type))
+            sys.exit(1)
 
-                _where = self.where.lower()
-                _where = _where.replace(self.partition_by_column.lower(), "")
-                _where = _where.replace("<", "")
-                _sql = "select {} <{}".format(self.less_than_value, _where)
-                # print(_sql)
-                try:
-                    conn = util.mysql(self.source_conf, mode='list')
-                    _check_less_than_value = conn.query(_sql)[0][0]
-                    conn.close()
-                    if _check_less_than_value == 1:
-                        self.precheck_result = True
-                    else:
-                        logging.info("less_than_value:{} 大于 {}".format(self.less_than_value, self.where))
-                        logging.info("预检不通过，退出")
-                        sys.exit(0)
-                except Exception as e:
-                    logging.info("判断where参数异常：{}".format(self.where))
-                    logging.info(e)
-                    sys.exit(1)
-            else:
-                logging.info("不支持分区键的字段类型")
-                sys.exit(1)
-        else:
-            logging.info("不支持该分区类型：{}".format(self.oldest_partition_info['method']))
+        res = WHERE_REGEX.match(self.where)
+        if not res or res.group(1).lower() != self.partition_by_column.lower():
+            logging.info("归档条件必须为：{} < 值，或 {} <= 值".format(self.partition_by_column, self.partition_by_column))
             sys.exit(1)
+        where_value = res.group(3)
 
-    def archive_partition(self):
+        # 分区上界换算为字段的值。分区内的值都满足 字段 < 上界，上界 <= 归档条件的值时整个分区都符合归档条件（条件为 < 或 <= 都成立），
+        # 所以用 <= 比较，上界等于该值的分区也会归档；条件为 <= 时上界 = 值+1 的分区也符合，不特殊处理，最多少归档一个分区
+        cast_type = CAST_TYPES.get((data_type or '').lower())
+        if cast_type:
+            where_value = 'cast({} as {})'.format(where_value, cast_type)
+        conn = util.mysql(self.source_conf, mode='list')
+        lower_value = None
+        try:
+            for i in self.partition_list:
+                if i['less_than_value'].upper() == 'MAXVALUE':
+                    break
+                bound_expr = BOUND_FUNCTIONS[func].format(i['less_than_value'])
+                if cast_type:
+                    bound_expr = 'cast({} as {})'.format(bound_expr, cast_type)
+                upper_value, is_eligible = conn.query("select {0}, {0} <= {1}".format(bound_expr, where_value))[0]
+                if is_eligible != 1:
+                    logging.info("less_than_value:{} 大于 {}".format(i['less_than_value'], self.where))
+                    break
+                upper_value = str(upper_value) if isinstance(upper_value, int) else "'{}'".format(upper_value)
+                self.plan.append({'pname': i['pname'], 'lower_value': lower_value, 'upper_value': upper_value,
+                                  'where': self.range_where(lower_value, upper_value)})
+                lower_value = upper_value
+                if not self.batch:
+                    break
+        except Exception as e:
+            logging.info("判断where参数异常：{}".format(self.where))
+            logging.info(e)
+            sys.exit(1)
+        finally:
+            conn.close()
+
+        if not self.plan:
+            logging.info("预检不通过，退出")
+            sys.exit(0)
+        logging.info("即将归档的分区：{}".format([i['pname'] for i in self.plan]))
+        self.precheck_result = True
+
+    def range_where(self, lower_value, upper_value):
+        "分区对应的字段范围，第一个分区包含NULL"
+        column = self.partition_by_column  # 不加反引号，where会放在pt-archiver命令的双引号中
+        if lower_value is None:
+            return "({0} is null or {0}<{1})".format(column, upper_value)
+        return "{0}>={1} and {0}<{2}".format(column, lower_value, upper_value)
+
+    def archive_partition(self, part):
         "调用pt-archiver"
         ts = time.time()
-        _where = "{}<{}".format(self.partition_by_column, self.less_than_value)
+        _where = part['where']
         subcmd1 = "--source A={},h={},P={},u={},p={},D={},t={}".format(self.charset, self.source_host, self.source_port,
                                                                        self.user, self.password, self.source_db,
                                                                        self.source_table)
@@ -210,64 +273,134 @@ class ArchivePartTable:
                                                                      self.target_table)
         if self.mode == "no-copy":
             logging.info("mode：{},不拷贝数据".format(self.mode))
-        else:
-            if self.mode == "slow-copy":
-                logging.info("mode={},启用慢拷贝模式(兼容性高)".format(self.mode))
-                cmd = 'pt-archiver {} {} --progress=1000000 --statistics --txn-size=1000 --no-delete --charset={} --check-charset --where "{}"'.format(
-                    subcmd1, subcmd2, self.charset, _where)
-            elif self.mode == "slow-replace":
-                logging.info("mode={},启用慢替换模式(兼容性高)".format(self.mode))
-                cmd = 'pt-archiver {} {} --progress=1000000 --statistics --replace --txn-size=1000 --no-delete --charset={} --check-charset --where "{}"'.format(
-                    subcmd1, subcmd2, self.charset, _where)
+            return True
+        copied = self.check_copied(part)
+        if copied == 'done':
+            logging.info("分区{}已拷贝到归档表（上次拷贝后未删除分区），跳过拷贝".format(part['pname']))
+            part['verified'] = True
+            return True
+        if copied == 'partial' or self.mode == "slow-replace":
+            if copied == 'partial':
+                logging.info("归档表已有分区{}的部分数据（上次拷贝后未删除分区），用慢替换模式重新拷贝".format(part['pname']))
             else:
-                cmd = 'pt-archiver {} {} --progress=1000000 --statistics --bulk-insert --limit=1000 --commit-each --no-delete --charset={} --check-charset --where "{}"'.format(
-                    subcmd1, subcmd2, self.charset, _where)
-            logging.info("开始执行：{}".format(cmd))
-            output = util.run_command_once_output(cmd)
-            print(output)
-            seconds = int(time.time() - ts)
-            logging.info("执行结束,耗时{}s".format(seconds))
+                logging.info("mode={},启用慢替换模式(兼容性高)".format(self.mode))
+            cmd = 'pt-archiver {} {} --progress=1000000 --statistics --replace --txn-size={} --no-delete --charset={} --check-charset --where "{}"'.format(
+                subcmd1, subcmd2, self.limit, self.charset, _where)
+        elif self.mode == "slow-copy":
+            logging.info("mode={},启用慢拷贝模式(兼容性高)".format(self.mode))
+            cmd = 'pt-archiver {} {} --progress=1000000 --statistics --txn-size={} --no-delete --charset={} --check-charset --where "{}"'.format(
+                subcmd1, subcmd2, self.limit, self.charset, _where)
+        else:
+            cmd = 'pt-archiver {} {} --progress=1000000 --statistics --bulk-insert --limit={} --commit-each --no-delete --charset={} --check-charset --where "{}"'.format(
+                subcmd1, subcmd2, self.limit, self.charset, _where)
+        logging.info("开始拷贝分区{}：{}".format(part['pname'], cmd.replace("p={},".format(self.password), "p=***,")))
+        returncode = util.run_command_stdout(cmd)
+        seconds = int(time.time() - ts)
+        logging.info("分区{}拷贝结束,耗时{}s".format(part['pname'], seconds))
+        if returncode != 0:
+            logging.info("分区{}拷贝失败，退出码：{}".format(part['pname'], returncode))
+            return False
+        return True
 
-    def drop_partition(self):
-        "核对数据"
-        self.status = 'drop'
-        sql = self.count_sql + self.partition_subsql
-        logging.info(sql)
-        logging.info("计算source端行数")
+    def get_columns(self):
+        "获取字段和主键，用于校验数据"
         conn = util.mysql(self.source_conf, mode='list')
-        self.source_rowcnt = conn.query(sql)[0][0]
-        conn.close()
-        logging.info("source端行数:{}".format(self.source_rowcnt))
+        try:
+            self.columns, self.pk_columns = checksum.get_table_columns(conn, self.source_db, self.source_table)
+        finally:
+            conn.close()
 
-        logging.info("计算target端行数")
-        conn = util.mysql(self.target_conf, mode='list')
-        self.target_rowcnt = conn.query(sql)[0][0]
-        conn.close()
-        logging.info("target端行数:{}".format(self.target_rowcnt))
+    def checksum_partition(self, part):
+        "按主键分块比较分区和归档表对应范围的行数和校验和，返回(不一致的块列表, 行数)"
+        o = checksum.ChunkChecksum(self.source_conf, self.target_conf,
+                                   "`{}` partition({})".format(self.source_table, part['pname']),
+                                   "`{}`".format(self.target_table), self.columns, self.pk_columns, part['where'],
+                                   self.verify_chunk_size, self.verify_parallel)
+        diffs = o.run()
+        return diffs, o.rows
 
-        if self.source_rowcnt == self.target_rowcnt:
-            logging.info("源表和归档表行数一致，检查通过")
-            logging.info("删除表分区: " + self.drop_sql)
+    def check_copied(self, part):
+        "检查归档表是否已有分区范围的数据：没有返回None，与分区一致返回done，否则返回partial"
+        try:
+            conn = util.mysql(self.target_conf, mode='list')
             try:
-                conn = util.mysql(self.source_conf, mode='list')
-                # conn.execute("set sql_log_bin=0")
-                self.source_rowcnt = conn.execute(self.drop_sql)
+                res = conn.query("select 1 from `{}` where {} limit 1".format(self.target_table, part['where']))
+            finally:
                 conn.close()
-                logging.info("删除表分区执行成功")
-                self.status = 'done & ok'
-            except Exception as e:
-                logging.info("删除表分区执行失败: {}".format(e))
-                sys.exit(1)
+            if not res:
+                return None
+            diffs, rows = self.checksum_partition(part)
+        except Exception as e:
+            logging.info("检查归档表数据报错: {}".format(e))
+            return 'partial'
+        return 'partial' if diffs else 'done'
+
+    def drop_partition(self, part, source_conn):
+        "核对数据（按主键分块比较行数和校验和），一致时删除分区"
+        self.status = 'drop'
+        if part.get('verified'):
+            logging.info("分区{}拷贝前已核对数据，检查通过".format(part['pname']))
         else:
-            logging.info("源表和归档表行数不一致，检查不通过")
-            sys.exit(1)
+            try:
+                diffs, rows = self.checksum_partition(part)
+            except Exception as e:
+                logging.info("校验数据报错: {}".format(e))
+                return False
+            if diffs:
+                logging.info("源表和归档表数据不一致，检查不通过")
+                return False
+            logging.info("源表和归档表数据一致，检查通过，行数：{}".format(rows))
+        drop_sql = "alter table `{}` drop partition {}".format(self.source_table, part['pname'])
+        logging.info("删除表分区: " + drop_sql)
+        try:
+            source_conn.conn.ping(reconnect=True)
+            source_conn.execute(drop_sql)
+            logging.info("删除表分区执行成功")
+        except Exception as e:
+            logging.info("删除表分区执行失败: {}".format(e))
+            return False
+        return True
+
+    def pause(self, signum=None, frame=None):
+        "暂停：不再拷贝新的分区，正在拷贝的分区核对、删除后退出"
+        logging.info("收到暂停信号，处理完正在拷贝的分区后退出")
+        self.pause_flag = True
 
     def run(self):
-        self.get_oldest_partition()
+        self.get_partitions()
         self.precheck()
-        if self.precheck_result:
-            self.archive_partition()
-            self.drop_partition()
+        if not self.precheck_result:
+            return
+        self.get_columns()
+        # 拷贝分区N+1与核对、删除分区N并行执行，最多只有一个分区在后台拷贝
+        source_conn = util.mysql(self.source_conf, mode='list')
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            future = executor.submit(self.archive_partition, self.plan[0])
+            for i, part in enumerate(self.plan):
+                copy_ok = future.result()
+                future = None
+                if not copy_ok:
+                    self.status = 'done & error'
+                    break
+                if i + 1 < len(self.plan) and not self.pause_flag:
+                    future = executor.submit(self.archive_partition, self.plan[i + 1])
+                if not self.drop_partition(part, source_conn):
+                    self.status = 'done & error'
+                    break
+                self.status = 'done & ok'
+                if future is None and i + 1 < len(self.plan):
+                    logging.info("已暂停，剩余分区：{}".format([j['pname'] for j in self.plan[i + 1:]]))
+                    self.status = 'paused'
+                    break
+            if future is not None:
+                logging.info("等待正在拷贝的分区结束（该分区不会删除，下次执行时核对后跳过或重新拷贝）")
+                future.result()
+        finally:
+            executor.shutdown()
+            source_conn.close()
+        if self.status not in ['done & ok', 'paused']:
+            sys.exit(1)
 
 
 # main
@@ -278,8 +411,9 @@ if __name__ == "__main__":
 
     while True:
         o = ArchivePartTable(args)
+        signal.signal(signal.SIGTERM, o.pause)
         o.run()
-        if not args['repeat']:
+        if not args['repeat'] or args['batch'] or o.pause_flag:
             break
         if o.status != 'done & ok':
             break
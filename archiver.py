@@ -19,18 +19,55 @@
 #      v1.3.4      2022-10-27      支持设置归档时间间隔功能
 #      v1.3.5      2022-12-02      增加archive-slow-replace、archive-partition、archive-partition-slow模式
 #      v1.3.6      2022-12-30      增加archive-no-ascend模式
+#      v1.4.0      2026-10-18      增加archive-native模式（原生引擎，主键分页+读写删流水线）
+#      v1.4.1      2026-10-18      archive-native支持按主键范围拆分并行归档（split_parallel）
+#      v1.4.2      2026-10-18      批次大小可按任务配置，archive-native根据事务耗时自适应调整批次大小
+#      v1.4.3      2026-10-18      根据从库复制延迟、源库Threads_running限流（replica_hosts）
+#      v1.4.4      2026-10-18      configdb使用连接池，复用连接
+#      v1.4.5      2026-10-18      事件驱动调度：预编译时间窗口（支持多个窗口、跨零点），睡眠到下一个窗口开启
+#      v1.4.6      2026-10-18      按源实例、目标实例限制并发（SOURCE_SLOTS、DEST_SLOTS）
+#      v1.4.7      2026-10-18      实时解析进度和统计输出，写入archive_task_stats表
+#      v1.4.8      2026-10-18      增加archive-to-file-native模式（压缩分块文件+manifest）
+#      v1.4.9      2026-10-18      archive-native支持LOAD DATA LOCAL INFILE写入归档表（dest_writer）
+#      v1.4.10     2026-10-18      分区表归档模式使用批量模式，一次归档所有符合条件的分区
+#      v1.4.11     2026-10-18      archive-native支持删除前校验数据（verify_checksum）
+#      v1.4.12     2026-10-18      原生引擎记录断点（archive_checkpoint），任务中断后下次从断点继续
+#      v1.4.13     2026-10-18      执行前EXPLAIN归档条件，估算行数，自动选择是否按主键顺序扫描和批次大小（auto_plan）
+#      v1.4.14     2026-10-18      根据历史耗时预测任务耗时，在执行时间窗口内排列任务，记录计划开始时间和预测耗时
+#      v1.4.15     2026-10-18      执行时间窗口关闭时通知任务在批次之间停止，标记为paused，下一个窗口开启时继续执行
+#      v1.4.16     2026-10-18      增加Prometheus监控指标接口（METRICS_PORT）
+#      v1.4.17     2026-10-18      拆分历史耗时查询和耗时预测，供调度模拟（simulate.py）使用
+#      v1.4.18     2026-10-18      按集合生成任务：一次查询需要执行的配置，在一个事务内分批insert ignore，重复执行不生成重复任务
+#      v1.4.19     2026-10-18      多节点部署：按owner+lease_expire原子认领任务，心跳续租，回收失效节点的任务
+#      v1.4.20     2026-10-18      可选asyncio执行核心（EXECUTOR = 'asyncio'），一个事件循环管理所有任务的子进程
+#      v1.4.21     2026-10-18      执行前检查使用表结构指纹缓存，比较字段类型和字符集，增加archive-slow-replace、archive-no-ascend模式的检查
+#      v1.4.22     2026-10-18      exec_log只保存首尾若干行和摘要（log_summary），完整日志逐行压缩保存到logs/archive，按天数清理
+#      v1.4.23     2026-10-18      owner改为节点标识:进程号:启动时间，只续租本进程持有的任务，启动时回收本节点遗留的任务
+#      v1.4.24     2026-10-18      续租失败时在租约过期前（LEASE_SECONDS-2*HEARTBEAT_SECONDS）停止任务，启动时检查租约参数
+#      v1.4.25     2026-10-18      执行命令报错时记录为exit_code=-1，保证调用finish并取消窗口定时器
+#      v1.4.26     2026-10-18      删除ArchiveConfig.is_need_run、start，生成任务只使用get_need_run_config_ids
+#      v1.4.27     2026-10-18      暂停后继续执行的任务，archive_task_stats在上次的统计信息上累加
 ####################################################################################################
 """
 
 import os, sys
+import socket
 import time, datetime
 import re
+import json
 import logging
 import threading
-import queue
 import signal
 import util
 import settings
+import throttle
+import scheduler
+import task_stats
+import planner
+import metrics
+import orchestrator
+import schema_cache
+import task_log
 
 
 def expr_to_date(expr):
@@ -70,20 +107,195 @@ def exit_handler(signum, frame):
     "处理退出信号"
     global PRODUCER_FINISH
     PRODUCER_FINISH = True
+    SCHEDULER.notify(reload=False)
     logging.info('收到停止信号，程序准备退出')
 
 
+CONFIGDB_POOL = None
+CONFIGDB_POOL_LOCK = threading.Lock()
+
+
+def get_configdb_pool():
+    "获取配置库连接池"
+    global CONFIGDB_POOL
+    with CONFIGDB_POOL_LOCK:
+        if CONFIGDB_POOL is None:
+            CONFIGDB_POOL = util.mysql_pool(settings.CONFIG_DB,
+                                            max_idle=getattr(settings, 'CONFIGDB_POOL_MAX_IDLE', settings.PARALLEL + 2),
+                                            max_idle_seconds=getattr(settings, 'CONFIGDB_POOL_IDLE_SECONDS', 300))
+        return CONFIGDB_POOL
+
+
 def get_configdb_conn():
-    "创建配置库连接"
+    "从连接池获取配置库连接，用完调用close()归还"
     for i in range(3):
         try:
-            conn = util.mysql(settings.CONFIG_DB)
+            conn = get_configdb_pool().get_conn()
             return conn
         except Exception as e:
             logging.warning('连接configdb报错：{}'.format(e))
             time.sleep(1)
 
 
+def get_node_id():
+    "节点标识，默认为主机名"
+    return getattr(settings, 'NODE_ID', '') or socket.gethostname()
+
+
+OWNER = None
+
+
+def get_owner():
+    "任务的owner：节点标识:进程号:启动时间，进程重启后不会续租上一个进程遗留的任务"
+    global OWNER
+    if OWNER is None:
+        OWNER = '{}:{}:{}'.format(get_node_id(), os.getpid(), int(time.time()))
+    return OWNER
+
+
+def get_held_task_ids():
+    "本进程持有的任务：执行中的任务和执行队列中等待实例并发的任务"
+    with RUNNING_TASKS_LOCK:
+        task_ids = list(RUNNING_TASKS.keys())
+    task_ids += [task.id for task in JOB_QUEUE.tasks() if isinstance(task, ArchiveTask)]
+    return task_ids
+
+
+def renew_leases(conn):
+    "只续租本进程持有的任务（waiting、running），返回续租的任务数"
+    task_ids = get_held_task_ids()
+    if not task_ids:
+        return 0
+    sql = "update archive_tasks set lease_expire=date_add(now(),interval %s second) where id in ({}) and owner=%s and exec_status in ('waiting','running')".format(
+        ','.join(['%s'] * len(task_ids)))
+    return conn.update(sql, [getattr(settings, 'LEASE_SECONDS', 60)] + task_ids + [get_owner()])
+
+
+def reclaim_node_tasks(conn):
+    "启动时回收本节点上一个进程遗留的任务（进程崩溃、kill -9、重启）：未开始的恢复为initial，执行中的标记为paused，返回回收的任务数"
+    node_id = get_node_id()
+    cnt = 0
+    for status, new_status in [('waiting', 'initial'), ('running', 'paused')]:
+        sql = "update archive_tasks set exec_status=%s,owner=null,lease_expire=null where exec_status=%s and (owner=%s or left(owner,%s)=%s) and owner<>%s"
+        n = conn.update(sql, (new_status, status, node_id, len(node_id) + 1, node_id + ':', get_owner()))
+        if n:
+            logging.warning("回收本节点遗留的任务：{}个{}任务改为{}".format(n, status, new_status))
+        cnt += n
+    return cnt
+
+
+def reclaim_expired_tasks(conn):
+    "回收租约过期（节点失效）的任务：未开始的恢复为initial，执行中的标记为paused（原生引擎从断点继续），返回回收的任务数"
+    cnt = 0
+    for status, new_status in [('waiting', 'initial'), ('running', 'paused')]:
+        sql = "update archive_tasks set exec_status=%s,owner=null,lease_expire=null where exec_status=%s and lease_expire<now()"
+        n = conn.update(sql, (new_status, status))
+        if n:
+            logging.warning("回收租约过期的任务：{}个{}任务改为{}".format(n, status, new_status))
+        cnt += n
+    return cnt
+
+
+def check_lease_settings():
+    "检查租约参数：租约过期前需要留出至少两次心跳的时间停止任务，LEASE_SECONDS至少为HEARTBEAT_SECONDS的4倍"
+    lease_seconds = getattr(settings, 'LEASE_SECONDS', 60)
+    heartbeat_seconds = getattr(settings, 'HEARTBEAT_SECONDS', 15)
+    if heartbeat_seconds <= 0 or lease_seconds < 4 * heartbeat_seconds:
+        raise ValueError('LEASE_SECONDS（{}）至少为HEARTBEAT_SECONDS（{}）的4倍'.format(lease_seconds, heartbeat_seconds))
+
+
+def heartbeat_job():
+    "心跳：续租本进程的任务，回收失效节点的任务；续租连续失败时在租约过期前两次心跳停止本进程的任务，避免与其他节点重复执行"
+    heartbeat_seconds = getattr(settings, 'HEARTBEAT_SECONDS', 15)
+    stop_seconds = getattr(settings, 'LEASE_SECONDS', 60) - 2 * heartbeat_seconds
+    last_renew = time.time()
+    while not PRODUCER_FINISH:
+        time.sleep(heartbeat_seconds)
+        try:
+            conn = get_configdb_conn()
+            try:
+                renew_leases(conn)
+                last_renew = time.time()
+                if reclaim_expired_tasks(conn):
+                    SCHEDULER.notify()
+            finally:
+                conn.close()
+        except Exception:
+            logging.error('心跳报错', exc_info=True)
+            if time.time() - last_renew > stop_seconds:
+                with RUNNING_TASKS_LOCK:
+                    running_tasks = list(RUNNING_TASKS.values())
+                for task in running_tasks:
+                    logging.error("租约过期，停止任务：[task_id:{}]".format(task.id))
+                    task.request_stop()
+
+
+SCHEMA_CACHE = schema_cache.SchemaCache(getattr(settings, 'SCHEMA_CACHE_SECONDS', 3600),
+                                        getattr(settings, 'SCHEMA_CACHE_TRUST_SECONDS', 60))
+SCHEMA_CHECK_MODES = ['archive', 'archive-slow', 'archive-slow-replace', 'archive-no-ascend', 'archive-native']
+
+RUNNING_TASKS = {}  # 执行中的任务，{task_id: ArchiveTask}，用于监控指标
+RUNNING_TASKS_LOCK = threading.Lock()
+
+
+def add_running_task(obj):
+    "登记执行中的任务"
+    with RUNNING_TASKS_LOCK:
+        RUNNING_TASKS[obj.id] = obj
+
+
+def remove_running_task(obj):
+    "任务结束，取消登记"
+    with RUNNING_TASKS_LOCK:
+        RUNNING_TASKS.pop(obj.id, None)
+
+
+def collect_metrics():
+    "采集监控指标"
+    queue_depth = metrics.MetricFamily('archiver_job_queue_depth', 'gauge', '执行队列中等待的任务数')
+    queue_depth.add(JOB_QUEUE.qsize())
+    with RUNNING_TASKS_LOCK:
+        running_tasks = list(RUNNING_TASKS.values())
+    consumers = metrics.MetricFamily('archiver_consumer_threads', 'gauge', '消费线程数')
+    consumers.add(len(running_tasks), state='busy')
+    consumers.add(max(PARALLEL - len(running_tasks), 0), state='idle')
+
+    rows_per_sec = metrics.MetricFamily('archiver_task_rows_per_second', 'gauge', '执行中任务的每秒处理行数')
+    rows_selected = metrics.MetricFamily('archiver_task_rows_selected', 'gauge', '执行中任务的已读取行数')
+    elapsed = metrics.MetricFamily('archiver_task_elapsed_seconds', 'gauge', '执行中任务的已运行秒数')
+    throttle_seconds = metrics.MetricFamily('archiver_task_throttle_seconds', 'gauge', '执行中任务的限流暂停时间（秒）')
+    for task in running_tasks:
+        labels = {'task_id': task.id, 'config_id': task.config_id, 'mode': task.archive_mode,
+                  'table': '{}.{}'.format(task.source_db, task.source_table)}
+        stats = task.stats.snapshot() if task.stats else {}
+        rows_per_sec.add(float(stats.get('rows_per_sec', 0)), **labels)
+        rows_selected.add(stats.get('rows_selected', 0), **labels)
+        elapsed.add(round(time.time() - task.start_ts, 3), **labels)
+        throttle_seconds.add(float(stats.get('throttle_seconds', 0)), **labels)
+
+    pool = get_configdb_pool()
+    query_seconds = metrics.MetricFamily('archiver_configdb_query_seconds', 'summary', 'configdb执行sql的耗时（秒）')
+    query_seconds.add(round(pool.query_seconds, 6), '_sum')
+    query_seconds.add(pool.query_count, '_count')
+
+    # 当天生成的任务按状态计数
+    task_status = metrics.MetricFamily('archiver_tasks', 'gauge', '当天任务数（按状态）')
+    conn = get_configdb_conn()
+    try:
+        sql = "select exec_status,count(*) cnt from archive_tasks where sys_ctime>=curdate() group by exec_status"
+        for row in conn.query(sql):
+            task_status.add(row['cnt'], status=row['exec_status'])
+    finally:
+        conn.close()
+    return [queue_depth, consumers, rows_per_sec, rows_selected, elapsed, throttle_seconds, query_seconds,
+            task_status]
+
+
+TASK_FIELDS = ['config_id', 'task_date', 'source_host', 'source_port', 'source_db', 'source_table', 'dest_host',
+               'dest_port', 'dest_db', 'dest_table', 'archive_mode', 'exec_time_window', 'priority', 'exec_status',
+               'archive_cmd', 'auto_plan']
+
+
 def get_archive_config(conn):
     "获取归档配置"
     sql = "select * from archive_config where is_deleted=0"
@@ -91,13 +303,69 @@ def get_archive_config(conn):
     return res
 
 
+def get_need_run_config_ids(conn):
+    "一次查询所有满足interval天数、没有暂停任务（暂停的任务在下一个窗口继续执行）的配置id"
+    sql = """select c.id from archive_config c where c.is_deleted=0 and not exists (
+    select 1 from archive_tasks t where t.config_id=c.id and ((t.exec_status in ('done & ok','running') and t.exec_start>=date_add(curdate(),interval 1-c.interval_day day)) or t.exec_status='paused'))"""
+    return set([i['id'] for i in conn.query(sql)])
+
+
 def get_archive_tasks(conn):
     "获取归档任务"
-    sql = "select * from archive_tasks where exec_status in ('initial','waiting timeout') and sys_ctime>=curdate() order by priority desc"
+    sql = "select * from archive_tasks where (exec_status in ('initial','waiting timeout') and sys_ctime>=curdate()) or exec_status='paused' order by priority desc"
     res = conn.query(expr_to_date(sql))
     return res
 
 
+def median(values):
+    "中位数，没有值时返回None"
+    values = sorted(values)
+    return values[len(values) // 2] if values else None
+
+
+def get_task_history(conn, config_ids):
+    "每个配置最近PREDICT_HISTORY_RUNS次成功执行的记录，返回{config_id: [row]}，按时间倒序"
+    if not config_ids:
+        return {}
+    history_runs = getattr(settings, 'PREDICT_HISTORY_RUNS', 7)
+    sql = """select t.config_id,t.exec_start,t.exec_seconds,s.rows_per_sec from archive_tasks t left join archive_task_stats s on s.task_id=t.id
+    where t.config_id in ({}) and t.exec_status='done & ok' and t.sys_ctime>=date_sub(curdate(),interval {} day) order by t.id desc""".format(
+        ','.join([str(i) for i in config_ids]), getattr(settings, 'PREDICT_HISTORY_DAYS', 30))
+    history = {}
+    for row in conn.query(sql):
+        runs = history.setdefault(row['config_id'], [])
+        if len(runs) < history_runs:
+            runs.append(row)
+    return history
+
+
+def predict_task_seconds(conn, task_list, history=None):
+    "根据每个配置最近成功执行的历史预测耗时：有估算行数时按历史速度计算，否则取历史耗时的中位数"
+    if history is None:
+        config_ids = sorted(set([i['config_id'] for i in task_list if i.get('config_id')]))
+        history = get_task_history(conn, config_ids)
+    for task in task_list:
+        runs = history.get(task.get('config_id'), [])
+        seconds = median([i['exec_seconds'] for i in runs if i['exec_seconds'] is not None])
+        rows_per_sec = median([float(i['rows_per_sec']) for i in runs if i['rows_per_sec']])
+        if task.get('est_rows') and rows_per_sec:
+            seconds = int(task['est_rows'] / rows_per_sec)
+        task['predicted_seconds'] = seconds
+
+
+def save_task_plan(conn, task_list):
+    "回写计划开始时间和预测耗时（只更新有变化的任务）"
+    for task in task_list:
+        planned_start = task.get('planned_start')
+        if planned_start is not None:
+            planned_start = planned_start.replace(microsecond=0)
+        if task.get('saved_planned_start') == planned_start and task.get('saved_predicted_seconds') == task.get(
+                'predicted_seconds'):
+            continue
+        conn.execute("update archive_tasks set planned_start=%s,predicted_seconds=%s where id=%s",
+                     (planned_start, task.get('predicted_seconds'), task['id']))
+
+
 def get_failed_tasks():
     "获取当天运行失败的作业"
     sql = "select id,exec_status from archive_tasks where sys_ctime>=curdate() and exec_status<>'done & ok'"
@@ -129,19 +397,14 @@ def send_exec_result():
 
 def is_during_time_window(time_window_str):
     "是否在执行时间窗口"
-    now_num = int(time.strftime('%H%M', time.localtime()))
     try:
-        time_window_list = time_window_str.split(',')
-        for i in time_window_list:
-            start_time, end_time = i.split('-')
-            start_time_num = int(start_time.replace(':', ''))
-            end_time_num = int(end_time.replace(':', ''))
-            if start_time_num <= now_num and now_num <= end_time_num:
-                return 1
-            else:
-                return 0
+        window = scheduler.compile_time_window(time_window_str)
     except Exception:
         return -1  # "time_window格式错误"
+    if window.contains(datetime.datetime.now()):
+        return 1
+    else:
+        return 0
 
 
 class ArchiveConfig:
@@ -164,23 +427,41 @@ class ArchiveConfig:
         self.archive_condition = conf['archive_condition']
         self.exec_time_window = conf['exec_time_window']
         self.priority = conf['priority']
+        self.split_parallel = conf.get('split_parallel') or 1
+        self.chunk_size = conf.get('chunk_size') or 1000
+        self.chunk_size_min = conf.get('chunk_size_min') or 100
+        self.chunk_size_max = conf.get('chunk_size_max') or 20000
+        self.txn_target_ms = conf.get('txn_target_ms') or 500
+        self.replica_hosts = conf.get('replica_hosts') or ''
+        self.file_compress = conf.get('file_compress') or 'gzip'
+        self.time_column = conf.get('time_column') or ''
+        self.dest_writer = conf.get('dest_writer') or 'insert'
+        self.verify_checksum = conf.get('verify_checksum') or 0
+        self.auto_plan = conf.get('auto_plan') or 0
         self.exec_status = 'initial'
         self.archive_cmd_list = []
 
     def __str__(self):
         return str(self.__dict__)
 
-    def is_need_run(self, conn):
-        "判断是否符合满足interval天数"
-        sql = "select count(*) cnt from archive_tasks where config_id={} and exec_status in ('done & ok','running') and exec_start>=date_add(curdate(),interval {} day)".format(
-            self.id, 1 - self.interval_day)
-        res = conn.query(sql)
-        cnt = res[0]['cnt']
-        if cnt == 0:
-            return True
-        else:
-            logging.info("不满足间隔天数:[ id:{},interval_day:{} ]".format(self.id, self.interval_day))
-            return False
+    def get_lag_opts(self):
+        "生成pt-archiver检查从库延迟的参数"
+        opts = ''
+        for host, port in throttle.parse_hosts(self.replica_hosts):
+            opts += " --check-slave-lag h={},P={},u={},p={}".format(host, port, self.user, self.password)
+        if opts:
+            opts += " --max-lag={} --check-interval={}".format(getattr(settings, 'THROTTLE_MAX_LAG', 30),
+                                                            getattr(settings, 'THROTTLE_CHECK_INTERVAL', 1))
+        return opts
+
+    def get_throttle_opts(self):
+        "生成原生引擎的限流参数"
+        opts = " --max-lag {} --max-threads-running {} --check-interval {}".format(
+            getattr(settings, 'THROTTLE_MAX_LAG', 30), getattr(settings, 'THROTTLE_MAX_THREADS_RUNNING', 0),
+            getattr(settings, 'THROTTLE_CHECK_INTERVAL', 1))
+        if self.replica_hosts:
+            opts += " --replicas {}".format(self.replica_hosts)
+        return opts
 
     def generate_cmds(self):
         "生成归档命令"
@@ -195,28 +476,33 @@ class ArchiveConfig:
         self.archive_condition = expr_to_date(self.archive_condition)
 
         if self.archive_mode == 'archive':
-            cmd = 'pt-archiver {} {} --progress=10000 --statistics --bulk-insert --limit=1000 --bulk-delete --commit-each --charset=utf8 --check-charset'.format(
-                subcmd1, subcmd2)
+            cmd = 'pt-archiver {} {} --progress=10000 --statistics --bulk-insert --limit={limit} --bulk-delete --commit-each --charset=utf8 --check-charset'.format(
+                subcmd1, subcmd2, limit=self.chunk_size)
+            cmd += self.get_lag_opts()
             archive_cmd = '{} --where="{}"'.format(cmd, self.archive_condition)
             self.archive_cmd_list.append(archive_cmd)
         elif self.archive_mode == 'archive-no-ascend':
-            cmd = 'pt-archiver {} {} --progress=10000 --statistics --bulk-insert --limit=1000 --bulk-delete --commit-each --charset=utf8 --check-charset --no-ascend'.format(
-                subcmd1, subcmd2)
+            cmd = 'pt-archiver {} {} --progress=10000 --statistics --bulk-insert --limit={limit} --bulk-delete --commit-each --charset=utf8 --check-charset --no-ascend'.format(
+                subcmd1, subcmd2, limit=self.chunk_size)
+            cmd += self.get_lag_opts()
             archive_cmd = '{} --where="{}"'.format(cmd, self.archive_condition)
             self.archive_cmd_list.append(archive_cmd)
         elif self.archive_mode == 'archive-slow':
-            cmd = 'pt-archiver {} {} --progress=10000 --statistics --bulk-delete --commit-each --limit=1000 --charset=utf8 --check-charset'.format(
-                subcmd1, subcmd2)
+            cmd = 'pt-archiver {} {} --progress=10000 --statistics --bulk-delete --commit-each --limit={limit} --charset=utf8 --check-charset'.format(
+                subcmd1, subcmd2, limit=self.chunk_size)
+            cmd += self.get_lag_opts()
             archive_cmd = '{} --where="{}"'.format(cmd, self.archive_condition)
             self.archive_cmd_list.append(archive_cmd)
         elif self.archive_mode == 'archive-slow-replace':
-            cmd = 'pt-archiver {} {} --progress=10000 --statistics --replace --bulk-delete --commit-each --limit=1000 --charset=utf8 --check-charset'.format(
-                subcmd1, subcmd2)
+            cmd = 'pt-archiver {} {} --progress=10000 --statistics --replace --bulk-delete --commit-each --limit={limit} --charset=utf8 --check-charset'.format(
+                subcmd1, subcmd2, limit=self.chunk_size)
+            cmd += self.get_lag_opts()
             archive_cmd = '{} --where="{}"'.format(cmd, self.archive_condition)
             self.archive_cmd_list.append(archive_cmd)
         elif self.archive_mode == 'delete':
-            cmd = 'pt-archiver {} --progress=10000 --statistics --txn-size=1000 --purge --bulk-delete --limit=1000 --charset=utf8 --check-charset'.format(
-                subcmd1)
+            cmd = 'pt-archiver {} --progress=10000 --statistics --txn-size={limit} --purge --bulk-delete --limit={limit} --charset=utf8 --check-charset'.format(
+                subcmd1, limit=self.chunk_size)
+            cmd += self.get_lag_opts()
             archive_cmd = '{} --where="{}"'.format(cmd, self.archive_condition)
             self.archive_cmd_list.append(archive_cmd)
         elif self.archive_mode == 'archive-to-file':
@@ -225,60 +511,92 @@ class ArchiveConfig:
             filename = "{}/%Y%m%d_%H.dat".format(dirname)
             if not os.path.exists(dirname):
                 os.makedirs(dirname)
-            cmd = 'pt-archiver {} --progress=10000 --statistics --txn-size=1000 --file={} --bulk-delete --limit=1000 --charset=utf8 --check-charset'.format(
-                subcmd1, filename)
+            cmd = 'pt-archiver {} --progress=10000 --statistics --txn-size={limit} --file={} --bulk-delete --limit={limit} --charset=utf8 --check-charset'.format(
+                subcmd1, filename, limit=self.chunk_size)
+            cmd += self.get_lag_opts()
+            archive_cmd = '{} --where="{}"'.format(cmd, self.archive_condition)
+            self.archive_cmd_list.append(archive_cmd)
+        elif self.archive_mode == 'archive-native':
+            cmd = 'python3 native_archiver.py -S {}:{} -T {}:{} -d {}:{} -t {}:{} -c {}'.format(
+                self.source_host, self.source_port, self.dest_host, self.dest_port, self.source_db, self.dest_db,
+                self.source_table, self.dest_table, self.charset)
+            cmd += " -l {} --min-limit {} --max-limit {} --txn-target {} --writer {} --checkpoint-id {}".format(
+                self.chunk_size, self.chunk_size_min, self.chunk_size_max, self.txn_target_ms, self.dest_writer,
+                self.id)
+            if self.split_parallel > 1:
+                cmd += " -n {}".format(self.split_parallel)
+            if self.verify_checksum:
+                cmd += " --verify"
+            cmd += self.get_throttle_opts()
+            archive_cmd = '{} --where="{}"'.format(cmd, self.archive_condition)
+            self.archive_cmd_list.append(archive_cmd)
+        elif self.archive_mode == 'archive-to-file-native':
+            dirname = "archive_data/{}_{}/{}.{}".format(self.source_host, self.source_port, self.source_db,
+                                                        self.source_table)
+            cmd = 'python3 native_archiver.py -S {}:{} -d {} -t {} -c {} --file-dir {} --compress {} --file-size {}'.format(
+                self.source_host, self.source_port, self.source_db, self.source_table, self.charset, dirname,
+                self.file_compress, getattr(settings, 'ARCHIVE_FILE_SIZE_MB', 256))
+            if self.time_column:
+                cmd += " --time-column {}".format(self.time_column)
+            cmd += " -l {} --min-limit {} --max-limit {} --txn-target {} --checkpoint-id {}".format(
+                self.chunk_size, self.chunk_size_min, self.chunk_size_max, self.txn_target_ms, self.id)
+            if self.split_parallel > 1:
+                cmd += " -n {}".format(self.split_parallel)
+            cmd += self.get_throttle_opts()
             archive_cmd = '{} --where="{}"'.format(cmd, self.archive_condition)
             self.archive_cmd_list.append(archive_cmd)
         elif self.archive_mode == 'archive-partition':
             cmd = 'python3 archive_partition_table.py -S {}:{} -T {}:{} -d {}:{} -t {}:{} -c {}'.format(
                 self.source_host, self.source_port, self.dest_host, self.dest_port, self.source_db, self.dest_db,
                 self.source_table, self.dest_table, self.charset)
-            cmd += " -m copy"
+            cmd += " -m copy -l {} --batch".format(self.chunk_size)
             archive_cmd = '{} --where="{}"'.format(cmd, self.archive_condition)
             self.archive_cmd_list.append(archive_cmd)
         elif self.archive_mode == 'archive-partition-slow-copy':
             cmd = 'python3 archive_partition_table.py -S {}:{} -T {}:{} -d {}:{} -t {}:{} -c {}'.format(
                 self.source_host, self.source_port, self.dest_host, self.dest_port, self.source_db, self.dest_db,
                 self.source_table, self.dest_table, self.charset)
-            cmd += " -m slow-copy"
+            cmd += " -m slow-copy -l {} --batch".format(self.chunk_size)
             archive_cmd = '{} --where="{}"'.format(cmd, self.archive_condition)
             self.archive_cmd_list.append(archive_cmd)
         elif self.archive_mode == 'archive-partition-slow-replace':
             cmd = 'python3 archive_partition_table.py -S {}:{} -T {}:{} -d {}:{} -t {}:{} -c {}'.format(
                 self.source_host, self.source_port, self.dest_host, self.dest_port, self.source_db, self.dest_db,
                 self.source_table, self.dest_table, self.charset)
-            cmd += " -m slow-replace"
+            cmd += " -m slow-replace -l {} --batch".format(self.chunk_size)
             archive_cmd = '{} --where="{}"'.format(cmd, self.archive_condition)
             self.archive_cmd_list.append(archive_cmd)
         else:
             logging.error("archive_mode参数错误：[ id:{},archive_mode:{} ]".format(self.id, self.archive_mode))
 
-    def save_tasks(self, conn):
-        "保存任务"
-        table_name = 'archive_tasks'
-        fieldname_list = ['config_id', 'source_host', 'source_port', 'source_db', 'source_table', 'dest_host',
-                          'dest_port', 'dest_db', 'dest_table', 'archive_mode', 'exec_time_window', 'priority',
-                          'exec_status', 'archive_cmd']
+    def get_task_rows(self, task_date):
+        "生成的任务（按TASK_FIELDS的顺序）"
         rows = []
         for cmd in self.archive_cmd_list:
-            row = [self.id, self.source_host, self.source_port, self.source_db, self.source_table,
+            row = [self.id, task_date, self.source_host, self.source_port, self.source_db, self.source_table,
                    self.dest_host, self.dest_port, self.dest_db, self.dest_table, self.archive_mode,
                    self.exec_time_window, self.priority,
-                   self.exec_status, cmd]
+                   self.exec_status, cmd, self.auto_plan]
             rows.append(row)
-        conn.batch_insert(table_name, fieldname_list, rows)
+        return rows
 
-    def start(self, conn):
-        "生成任务"
-        if self.is_need_run(conn):
-            self.generate_cmds()
-            self.save_tasks(conn)
+    def save_tasks(self, conn):
+        "保存任务"
+        conn.batch_insert_chunks('archive_tasks', TASK_FIELDS, self.get_task_rows(datetime.date.today()), ignore=True)
+
+
+def get_dest_key(conf):
+    "任务占用并发的目标实例(host:port)，不写目标实例的模式返回None"
+    if conf['archive_mode'] in ['delete', 'archive-to-file', 'archive-to-file-native']:
+        return None  # 不写目标实例，不占用目标实例的并发
+    return "{}:{}".format(conf['dest_host'], conf['dest_port'])
 
 
 class ArchiveTask:
 
     def __init__(self, conf):
         self.id = conf['id']
+        self.config_id = conf.get('config_id')
         self.user = settings.ARCHIVE_USER
         self.password = settings.ARCHIVE_PASSWORD
         self.source_host = conf['source_host']
@@ -292,44 +610,50 @@ class ArchiveTask:
         self.dest_table = conf['dest_table']
         self.archive_cmd = conf['archive_cmd']
         self.exec_time_window = conf['exec_time_window']
+        self.auto_plan = conf.get('auto_plan') or 0
         self.exec_seconds = 0
         self.exec_log = ""
+        self.log_summary = None
         self.logfile = "logs/{}.log".format(self.id)
+        self.sentinel_file = "logs/{}.sentinel".format(self.id)
+        # 暂停后继续执行时，累加之前的执行时间
+        self.paused_seconds = (conf.get('exec_seconds') or 0) if conf.get('exec_status') == 'paused' else 0
+        self.process = None
+        self.stats = None
+        self.start_ts = time.time()
+        self.stop_requested = False
+        self.stop_lock = threading.Lock()
+        self.source_key = "{}:{}".format(self.source_host, self.source_port)
+        self.dest_key = get_dest_key(conf)
 
     def __str__(self):
         return str(self.__dict__)
 
     def log_task_begin(self):
-        "记录任务开始"
+        "记录任务开始，返回是否仍持有任务（租约过期被其他节点回收时返回False）"
         conn = get_configdb_conn()
-        sql = "update archive_tasks set exec_status='running',exec_start=now() where id={0}".format(self.id)
-        conn.execute(sql)
+        sql = "update archive_tasks set exec_status='running',exec_start=now(),lease_expire=date_add(now(),interval {1} second) where id={0} and owner=%s and exec_status='waiting'".format(
+            self.id, getattr(settings, 'LEASE_SECONDS', 60))
+        cnt = conn.update(sql, (get_owner(),))
         conn.close()
+        return cnt == 1
 
     def log_task_status(self):
-        "记录任务状态"
+        "记录任务状态（只更新本进程持有的任务）"
         conn = get_configdb_conn()
-        sql = "update archive_tasks set exec_status='{1}',exec_seconds={2},exec_end=now() where id={0}".format(
+        sql = "update archive_tasks set exec_status='{1}',exec_seconds={2},exec_end=now(),lease_expire=null where id={0} and owner=%s".format(
             self.id, self.exec_status, self.exec_seconds)
-        conn.execute(sql)
+        conn.update(sql, (get_owner(),))
         conn.close()
 
     def update_task_log(self):
         "更新任务日志"
         conn = get_configdb_conn()
-        sql = "update archive_tasks set exec_log='{1}' where id={0}".format(self.id, self.exec_log.replace("'", '"'))
-        conn.execute(sql)
+        sql = "update archive_tasks set exec_log=%s,log_summary=%s where id=%s"
+        log_summary = json.dumps(self.log_summary, ensure_ascii=False) if self.log_summary else None
+        conn.execute(sql, (self.exec_log, log_summary, self.id))
         conn.close()
 
-    @staticmethod
-    def get_table_fields(conf, table):
-        "获取表结构信息"
-        sql = "desc {}".format(table)
-        conn = util.mysql(conf)
-        rows = conn.query(sql)
-        conn.close()
-        return rows
-
     def check(self):
         "检查"
         retcode = 0
@@ -346,24 +670,18 @@ class ArchiveTask:
             logging.error("time_window格式错误:{}".format(self.exec_time_window))
             return retcode
 
-        # 检查归档库和表是否存在或列是否一致
-        if self.archive_mode in ['archive', 'archive-slow']:
-            source_conf = {'host': self.source_host, 'port': self.source_port, 'db': self.source_db, 'user': self.user,
+        # 检查归档库和表是否存在，字段名、类型、字符集是否兼容（表结构按CREATE_TIME和字段数缓存）
+        if self.archive_mode in SCHEMA_CHECK_MODES:
+            source_conf = {'host': self.source_host, 'port': self.source_port, 'user': self.user,
                            'password': self.password}
-            dest_conf = {'host': self.dest_host, 'port': self.dest_port, 'db': self.dest_db, 'user': self.user,
-                         'password': self.password}
+            dest_conf = {'host': self.dest_host, 'port': self.dest_port, 'user': self.user, 'password': self.password}
             try:
-                source_tb_fields = self.get_table_fields(source_conf, self.source_table)
-                dest_tb_fields = self.get_table_fields(dest_conf, self.dest_table)
-                source_fieldnames = [i['Field'] for i in source_tb_fields]
-                dest_fieldnames = [i['Field'] for i in dest_tb_fields]
-                field_not_exist_in_dest = [i for i in source_fieldnames if i not in dest_fieldnames]
-                if field_not_exist_in_dest:
+                source_schema, dest_schema = SCHEMA_CACHE.get_pair(source_conf, self.source_db, self.source_table,
+                                                                   dest_conf, self.dest_db, self.dest_table)
+                errors = SCHEMA_CACHE.compare(source_schema, dest_schema)
+                if errors:
                     self.exec_status = "check failed"
-                    self.exec_log = "目标表字段不存在：{}".format(','.join(field_not_exist_in_dest))
-                elif len(source_fieldnames) != len(dest_fieldnames):
-                    self.exec_status = "check failed"
-                    self.exec_log = "字段数量不一致"
+                    self.exec_log = '；'.join(errors)
                 else:
                     self.exec_status = "check passed"
                     self.exec_log = "检查通过"
@@ -374,48 +692,199 @@ class ArchiveTask:
                 logging.error(self, exc_info=True)
         else:
             retcode = 1
+        if retcode == 1:
+            self.plan()
         return retcode
 
-    def start(self):
-        "开始任务"
+    def get_chunk_size_bounds(self):
+        "归档配置的批次大小上下限（chunk_size_min、chunk_size_max），auto_plan计算的批次大小不超出该范围"
+        conn = get_configdb_conn()
+        try:
+            res = conn.query("select chunk_size_min,chunk_size_max from archive_config where id=%s", (self.config_id,))
+        finally:
+            conn.close()
+        if not res:
+            return 100, 20000
+        return res[0]['chunk_size_min'] or 100, res[0]['chunk_size_max'] or 20000
+
+    def plan(self):
+        "EXPLAIN归档条件，记录估算的行数和使用的索引，auto_plan=1时自动调整扫描方式和批次大小"
+        if self.archive_mode.startswith('archive-partition'):
+            return
+        where = planner.get_where(self.archive_cmd)
+        if not where:
+            return
+        source_conf = {'host': self.source_host, 'port': self.source_port, 'db': self.source_db, 'user': self.user,
+                       'password': self.password}
+        native = self.archive_mode in ['archive-native', 'archive-to-file-native']
+        try:
+            chunk_size_min, chunk_size_max = self.get_chunk_size_bounds()
+            o = planner.ArchivePlanner(source_conf, self.source_db, self.source_table, where, chunk_size_min,
+                                       chunk_size_max, getattr(settings, 'PLANNER_CHUNK_BYTES', 4194304))
+            plan = o.plan()
+            if self.auto_plan:
+                self.archive_cmd = o.apply(self.archive_cmd, plan, native)
+            est_plan = "ascend={},chunk_size={},scan_rows={},table_rows={},applied={}".format(
+                'native' if native else int(plan['ascend']), plan['chunk_size'], plan['scan_rows'],
+                plan['table_rows'], self.auto_plan)
+            logging.info("归档计划：[task_id:{}] 估算行数：{}，索引：{}，{}".format(self.id, plan['est_rows'],
+                                                                     plan['est_key'], est_plan))
+            conn = get_configdb_conn()
+            conn.execute("update archive_tasks set est_rows=%s,est_key=%s,est_plan=%s,archive_cmd=%s where id=%s",
+                         (plan['est_rows'], plan['est_key'], est_plan, self.archive_cmd, self.id))
+            conn.close()
+        except Exception as e:
+            logging.warning("生成归档计划报错：[task_id:{}] {}".format(self.id, e))
+
+    def get_run_cmd(self):
+        "生成实际执行的命令：pt-archiver增加--sentinel，原生引擎和分区表归档用exec启动，以便直接接收SIGTERM"
+        if self.archive_cmd.startswith('pt-archiver '):
+            return self.archive_cmd.replace(' --where=', ' --sentinel={} --where='.format(self.sentinel_file), 1)
+        if self.archive_cmd.startswith('python3 '):
+            return 'exec ' + self.archive_cmd
+        return self.archive_cmd
+
+    def set_process(self, process):
+        "记录任务进程（util.run_command的on_start回调）"
+        with self.stop_lock:
+            self.process = process
+        if self.stop_requested:
+            self.request_stop()
+
+    def request_stop(self):
+        "执行时间窗口关闭，通知任务在批次之间停止：pt-archiver创建sentinel文件，原生引擎和分区表归档发送SIGTERM"
+        with self.stop_lock:
+            self.stop_requested = True
+            if self.process is None or self.process.poll() is not None:
+                return
+            logging.info("执行时间窗口关闭，通知任务暂停：[task_id:{}]".format(self.id))
+            if self.archive_cmd.startswith('pt-archiver '):
+                with open(self.sentinel_file, 'w') as f:
+                    f.write(str(self.id))
+            elif self.archive_cmd.startswith('python3 '):
+                self.process.send_signal(signal.SIGTERM)
+
+    def get_window_close_seconds(self):
+        "距离执行时间窗口关闭的秒数，不需要暂停时返回None"
+        if not getattr(settings, 'PAUSE_AT_WINDOW_END', True):
+            return None
+        now = datetime.datetime.now()
+        close_time = scheduler.compile_time_window(self.exec_time_window).close_time(now)
+        if close_time is None:
+            return None
+        return (close_time - now).total_seconds()
+
+    def start_window_timer(self):
+        "在执行时间窗口关闭时通知任务停止，返回定时器"
+        seconds = self.get_window_close_seconds()
+        if seconds is None:
+            return None
+        timer = threading.Timer(seconds, self.request_stop)
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def begin(self):
+        "执行命令前：记录开始、检查，返回是否需要执行命令"
         logging.info("开始执行：[task_id:{}]".format(self.id))
-        ts = time.time()
+        self.start_ts = time.time()
         self.exec_status = 'running'
-        self.log_task_begin()
+        if not self.log_task_begin():
+            logging.warning("任务已被其他节点回收，跳过：[task_id:{}]".format(self.id))
+            return False
         if self.check() == 1:
             logging.info("检查通过：[task_id:{}]".format(self.id))
             self.exec_log = ""
-            exit_code = util.run_command(self.archive_cmd, self.logfile)
-            if exit_code == 0:
-                self.exec_status = 'done & ok'
-            else:
-                self.exec_status = 'done & error:[exit_code={}]'.format(exit_code)
-            with open(self.logfile, 'r') as f:
-                self.exec_log = f.read()
-            self.update_task_log()
-            self.exec_seconds = int(time.time() - ts)
-            self.log_task_status()
-            logging.info("执行结束：[task_id:{}]，耗时：{}s".format(self.id, self.exec_seconds))
+            self.stats = task_stats.TaskStats(self.id, self.config_id, get_configdb_conn,
+                                              getattr(settings, 'STATS_FLUSH_SECONDS', 10))
+            try:
+                self.stats.load()  # 暂停后继续执行时在上次的统计信息上累加
+            except Exception as e:
+                logging.warning("读取统计信息报错：[task_id:{}] {}".format(self.id, e))
+            if os.path.exists(self.sentinel_file):
+                os.remove(self.sentinel_file)
+            return True
+        # 检查失败
+        logging.info("检查失败：[task_id:{0},exec_status:{1}] ".format(self.id, self.exec_status))
+        self.exec_seconds = int(time.time() - self.start_ts)
+        self.log_task_status()
+        self.update_task_log()
+        return False
+
+    def finish(self, exit_code):
+        "命令结束后：记录状态、日志和统计信息"
+        if os.path.exists(self.sentinel_file):
+            os.remove(self.sentinel_file)
+        if exit_code == 0 and self.stop_requested:
+            self.exec_status = 'paused'
+        elif exit_code == 0:
+            self.exec_status = 'done & ok'
         else:
-            # 检查失败
-            logging.info("检查失败：[task_id:{0},exec_status:{1}] ".format(self.id, self.exec_status))
-            self.exec_seconds = int(time.time() - ts)
-            self.log_task_status()
-            self.update_task_log()
+            self.exec_status = 'done & error:[exit_code={}]'.format(exit_code)
+        self.save_log(exit_code)
+        self.update_task_log()
+        run_seconds = int(time.time() - self.start_ts)
+        self.exec_seconds = run_seconds + self.paused_seconds
+        self.stats.finish(run_seconds)
+        self.log_task_status()
+        logging.info("执行结束：[task_id:{}]，耗时：{}s".format(self.id, self.exec_seconds))
+
+    def save_log(self, exit_code):
+        "逐行压缩保存完整日志，exec_log只保留首尾若干行，log_summary记录行数、错误行等摘要"
+        try:
+            o = task_log.TaskLog(self.id, getattr(settings, 'LOG_ARCHIVE_DIR', 'logs/archive'),
+                                 getattr(settings, 'EXEC_LOG_HEAD_LINES', 50),
+                                 getattr(settings, 'EXEC_LOG_TAIL_LINES', 200))
+            o.archive(self.logfile)
+            self.exec_log = o.text()
+            self.log_summary = o.summary()
+            self.log_summary['exit_code'] = exit_code
+            self.log_summary['exec_status'] = self.exec_status
+        except Exception as e:
+            logging.error("保存任务日志报错：[task_id:{}]".format(self.id), exc_info=True)
+            self.exec_log = "保存任务日志报错：{}，日志文件：{}".format(e, self.logfile)
+
+    def start(self):
+        "开始任务"
+        if not self.begin():
+            return
+        timer = None
+        exit_code = -1  # 执行命令报错时记录为失败，保证任务状态和统计信息被记录
+        try:
+            timer = self.start_window_timer()
+            exit_code = util.run_command(self.get_run_cmd(), self.logfile, self.stats.on_line, self.set_process)
+        except Exception:
+            logging.error("执行命令报错：[task_id:{}]".format(self.id), exc_info=True)
+        finally:
+            if timer:
+                timer.cancel()
+        self.finish(exit_code)
 
 
 def generate_tasks():
-    "生成归档任务"
-    conf_list = None
+    "生成归档任务：一次查询需要执行的配置，在内存中生成命令，在一个事务内分批写入（唯一键(config_id,task_date)保证重复执行不生成重复任务）"
     conn = get_configdb_conn()
-    conf_list = get_archive_config(conn)
-    for conf in conf_list:
-        try:
-            o = ArchiveConfig(conf)
-            o.start(conn)
-        except Exception:
-            logging.error(conf, exc_info=True)
-    conn.close()
+    try:
+        conf_list = get_archive_config(conn)
+        need_run_ids = get_need_run_config_ids(conn)
+        task_date = datetime.date.today()
+        rows = []
+        for conf in conf_list:
+            if conf['id'] not in need_run_ids:
+                logging.debug("不满足间隔天数:[ id:{},interval_day:{} ]".format(conf['id'], conf['interval_day']))
+                continue
+            try:
+                o = ArchiveConfig(conf)
+                o.generate_cmds()
+                rows += o.get_task_rows(task_date)
+            except Exception:
+                logging.error(conf, exc_info=True)
+        cnt = conn.batch_insert_chunks('archive_tasks', TASK_FIELDS, rows,
+                                       getattr(settings, 'GENERATE_BATCH_SIZE', 1000), ignore=True)
+        logging.info('配置数：{}，需要执行：{}，新生成任务：{}'.format(len(conf_list), len(rows), cnt))
+    finally:
+        conn.close()
+    SCHEDULER.notify()  # 唤醒调度线程加载新任务
 
 
 def generate_task_job():
@@ -432,7 +901,12 @@ def generate_task_job():
                 generate_tasks()
             except Exception:
                 logging.error(exc_info=True)
-        elif now_time == "08:00" and hasattr(settings, 'WXWORK_WEBHOOK'):
+            try:
+                task_log.purge_logs(getattr(settings, 'LOG_ARCHIVE_DIR', 'logs/archive'),
+                                    getattr(settings, 'LOG_RETENTION_DAYS', 30))
+            except Exception:
+                logging.error('清理任务日志报错', exc_info=True)
+        elif now_time == "08:00" and hasattr(settings, 'WXWORK_WEBHOOK') and getattr(settings, 'SEND_REPORT', True):
             logging.info('发送归档报告')
             send_exec_result()
         else:
@@ -440,30 +914,54 @@ def generate_task_job():
 
 
 def produce_job():
-    "生产作业"
+    "生产作业：睡眠到下一个任务的窗口开启时间，有新任务或到达刷新间隔时重新加载任务"
     global JOB_QUEUE
     global PRODUCER_FINISH
+    refresh_seconds = getattr(settings, 'SCHEDULER_REFRESH_SECONDS', 60)
+    next_refresh = datetime.datetime.now()
     task_list = []
     while True:
-        # 6秒检测一次
-        for i in range(10):
-            time.sleep(6)
-            if PRODUCER_FINISH:
-                return 1
+        if PRODUCER_FINISH:
+            return 1
         try:
-            conn = get_configdb_conn()
-            task_list = get_archive_tasks(conn)
-            # 过滤不在执行时间窗口的
-            to_exec_task_list = [i for i in task_list if is_during_time_window(i['exec_time_window']) == 1]
-            logging.info('有{}个任务推送到执行队列'.format(len(to_exec_task_list)))
-            for task_conf in to_exec_task_list:
-                sql = "update archive_tasks set exec_status='waiting' where id={0}".format(task_conf['id'])
-                conn.execute(sql)
-                obj = ArchiveTask(task_conf)
-                JOB_QUEUE.put(obj)
-            conn.close()
+            now = datetime.datetime.now()
+            if SCHEDULER.need_reload() or now >= next_refresh:
+                conn = get_configdb_conn()
+                task_list = get_archive_tasks(conn)
+                for task in task_list:
+                    task['saved_planned_start'] = task.get('planned_start')
+                    task['saved_predicted_seconds'] = task.get('predicted_seconds')
+                try:
+                    predict_task_seconds(conn, task_list)
+                    task_list = scheduler.plan_tasks(task_list, PARALLEL, now)
+                    save_task_plan(conn, task_list)
+                except Exception:
+                    logging.error('排列任务报错，按优先级执行', exc_info=True)
+                conn.close()
+                SCHEDULER.load(task_list, now)
+                next_refresh = now + datetime.timedelta(seconds=refresh_seconds)
+                logging.debug('加载{}个待执行任务'.format(len(task_list)))
+
+            to_exec_task_list = SCHEDULER.pop_due(now)
+            if to_exec_task_list:
+                logging.info('有{}个任务推送到执行队列'.format(len(to_exec_task_list)))
+                conn = get_configdb_conn()
+                for task_conf in to_exec_task_list:
+                    # 条件update原子认领任务，多个节点同时认领时只有一个成功
+                    sql = "update archive_tasks set exec_status='waiting',owner=%s,lease_expire=date_add(now(),interval {1} second) where id={0} and exec_status in ('initial','waiting timeout','paused')".format(
+                        task_conf['id'], getattr(settings, 'LEASE_SECONDS', 60))
+                    if conn.update(sql, (get_owner(),)) == 1:
+                        obj = ArchiveTask(task_conf)
+                        JOB_QUEUE.put(obj)
+                conn.close()
+
+            # 睡眠到下一个窗口开启或下一次刷新
+            next_time = SCHEDULER.next_time()
+            until = next_refresh if next_time is None else min(next_time, next_refresh)
+            SCHEDULER.wait(until)
         except Exception:
             logging.error(task_list, exc_info=True)
+            time.sleep(6)
 
 
 def consume_job():
@@ -473,10 +971,15 @@ def consume_job():
     obj = None
     while True:
         try:
-            obj = JOB_QUEUE.get()  # 取实例信息
+            obj = JOB_QUEUE.get()  # 取实例并发未满的任务
             if obj == STOP_TOKEN:
                 break
-            obj.start()
+            add_running_task(obj)
+            try:
+                obj.start()
+            finally:
+                remove_running_task(obj)
+                JOB_QUEUE.done(obj)  # 释放实例并发
         except Exception:
             logging.error(obj, exc_info=True)
 
@@ -493,11 +996,31 @@ if __name__ == "__main__":
     set_log_level(settings.LOGGING_LEVEL)
 
     PARALLEL = settings.PARALLEL
+    EXECUTOR = getattr(settings, 'EXECUTOR', 'thread')
+    if EXECUTOR == 'asyncio':
+        PARALLEL = getattr(settings, 'ASYNC_PARALLEL', PARALLEL)
     PRODUCER_FINISH = False
     STOP_TOKEN = 'stop!!!'  # 停止信号
-    JOB_QUEUE = queue.Queue(maxsize=1000)
+    JOB_QUEUE = scheduler.SlotDispatcher(getattr(settings, 'SOURCE_SLOTS', 0), getattr(settings, 'DEST_SLOTS', 0),
+                                         getattr(settings, 'SLOT_OVERRIDES', {}))
+    SCHEDULER = scheduler.TaskScheduler()
 
     logging.info('【程序开始启动】')
+    try:
+        check_lease_settings()
+    except ValueError as e:
+        logging.error(e)
+        sys.exit(1)
+
+    # 回收本节点上一个进程遗留的任务
+    try:
+        conn = get_configdb_conn()
+        try:
+            reclaim_node_tasks(conn)
+        finally:
+            conn.close()
+    except Exception:
+        logging.error('回收本节点遗留的任务报错', exc_info=True)
 
     # 开启generate_task_job线程
     task_generator = threading.Thread(name='TaskGenerator', target=generate_task_job, args=())  # 创建线程
@@ -505,18 +1028,41 @@ if __name__ == "__main__":
     task_generator.start()  # 启动线程
     logging.info('{0}线程已启动！'.format(task_generator.name))
 
+    # 开启心跳线程
+    heartbeat = threading.Thread(name='Heartbeat', target=heartbeat_job, args=())
+    heartbeat.setDaemon(True)
+    heartbeat.start()
+    logging.info('{0}线程已启动！节点：{1}'.format(heartbeat.name, get_owner()))
+
     # 开启生产线程
     producer = threading.Thread(name='Producer', target=produce_job, args=())  # 创建线程
     producer.setDaemon(True)  # 设置为守护线程
     producer.start()  # 启动线程
     logging.info('{0}线程已启动！'.format(producer.name))
 
-    # 开启消费线程
-    consumers = [threading.Thread(name='Consumer-' + str(i), target=consume_job, args=()) for i in range(PARALLEL)]
+    # 开启消费线程（asyncio执行核心只需一个线程运行事件循环）
+    if EXECUTOR == 'asyncio':
+        core = orchestrator.AsyncOrchestrator(JOB_QUEUE, STOP_TOKEN, PARALLEL,
+                                              getattr(settings, 'ASYNC_DB_THREADS', 8), add_running_task,
+                                              remove_running_task)
+        consumers = [threading.Thread(name='Orchestrator', target=core.run, args=())]
+    else:
+        consumers = [threading.Thread(name='Consumer-' + str(i), target=consume_job, args=()) for i in
+                     range(PARALLEL)]
     [i.setDaemon(True) for i in consumers]  # 设置为守护线程
     [i.start() for i in consumers]  # 启动线程
     [logging.info('{0}线程已启动！'.format(i.name)) for i in consumers]
 
+    # 开启监控指标接口
+    metrics_server = None
+    if getattr(settings, 'METRICS_PORT', 0):
+        try:
+            metrics_server = metrics.MetricsServer(collect_metrics, settings.METRICS_PORT,
+                                                   getattr(settings, 'METRICS_HOST', '0.0.0.0'))
+            metrics_server.start()
+        except Exception:
+            logging.error('监控指标接口启动失败', exc_info=True)
+
     # 接收停止信号
     signal.signal(signal.SIGTERM, exit_handler)
 
@@ -545,5 +1091,8 @@ if __name__ == "__main__":
         i.join()
         logging.info('{0}线程已退出！'.format(i.name))
 
+    if metrics_server:
+        metrics_server.stop()
+
     # 程序退出
     logging.info('【程序退出成功】')
@@ -0,0 +1,444 @@
+#!/bin/python3
+# -*- encoding: utf-8 -*-
+"""
+####################################################################################################
+#  Name        :  benchmark.py
+#  Author      :  Elison
+#  Email       :  Ly99@qq.com
+#  Description :  归档性能测试：在测试实例生成合成数据表（行数、行宽、索引、分区可配置），
+#                 用ArchiveConfig.generate_cmds生成的命令逐个执行归档模式，结果写入json文件
+#  Updates     :
+#      Version     When            What
+#      --------    -----------     -----------------------------------------------------------------
+#      v1.0        2026-10-18
+####################################################################################################
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import string
+import datetime
+import argparse
+import logging
+import threading
+import util
+import settings
+import task_stats
+import archiver
+
+# 索引布局
+INDEX_LAYOUTS = {
+    'pk': [],
+    'time': ['key `idx_add_time` (`add_time`)'],
+    'time-status': ['key `idx_add_time` (`add_time`)', 'key `idx_status_add_time` (`status`,`add_time`)'],
+    'all': ['key `idx_add_time` (`add_time`)', 'key `idx_status_add_time` (`status`,`add_time`)',
+            'key `idx_user_id` (`user_id`)'],
+}
+ROW_MODES = ['archive', 'archive-no-ascend', 'archive-slow', 'delete', 'archive-to-file', 'archive-native',
+             'archive-to-file-native']
+PARTITION_MODES = ['archive-partition', 'archive-partition-slow-copy', 'archive-partition-slow-replace']
+FILE_MODES = ['archive-to-file', 'archive-to-file-native']
+BASE_TIME = datetime.datetime(2026, 1, 1)  # 固定的数据起始时间，保证每次生成的数据相同
+FIELDS = ['id', 'add_time', 'status', 'user_id', 'payload']
+CHECKPOINT_REGEX = re.compile(r' --checkpoint-id \d+')
+
+
+def set_log_level(level='info'):
+    "设置日志等级"
+    if level == 'debug':
+        lv = logging.DEBUG
+    else:
+        lv = logging.INFO
+    logging.basicConfig(stream=sys.stdout, level=lv,
+                        format='[%(asctime)s.%(msecs)d] [%(levelname)s] %(funcName)s: %(message)s',
+                        datefmt='%Y-%m-%d %H:%M:%S')
+
+
+def get_args():
+    '获取参数'
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-v", "--version", action='store_true', help="查看版本")
+    parser.add_argument("-S", "--source", type=str, default='127.0.0.1:3306', help="源表所在的测试实例IP和端口")
+    parser.add_argument("-T", "--target", type=str, help="归档表所在的测试实例IP和端口，默认与源表相同")
+    parser.add_argument("-d", "--database", type=str, default='archiver_bench', help="测试库，会自动创建")
+    parser.add_argument("-m", "--modes", type=str,
+                        help="归档模式，逗号分隔，默认：不分区时为{}，分区时为{}".format(','.join(ROW_MODES),
+                                                                       ','.join(PARTITION_MODES)))
+    parser.add_argument("-r", "--rows", type=int, default=100000, help="源表行数")
+    parser.add_argument("-w", "--row-width", type=int, default=200, help="payload字段的长度（字节）")
+    parser.add_argument("-i", "--indexes", type=str, default='time', choices=list(INDEX_LAYOUTS.keys()),
+                        help="二级索引布局")
+    parser.add_argument("--partitioned", action='store_true', help="按天分区（RANGE TO_DAYS(add_time)）")
+    parser.add_argument("--days", type=int, default=30, help="数据跨越的天数")
+    parser.add_argument("--archive-ratio", type=float, default=0.5, help="归档的数据比例（按天取整）")
+    parser.add_argument("-l", "--limit", type=int, default=1000, help="每批次行数（chunk_size）")
+    parser.add_argument("-n", "--split-parallel", type=int, default=1, help="archive-native按主键拆分的段数")
+    parser.add_argument("--writer", type=str, default='insert', choices=['insert', 'load-data'],
+                        help="archive-native写入归档表的方式")
+    parser.add_argument("--repeat", type=int, default=1, help="每个模式执行的次数，每次重新生成数据")
+    parser.add_argument("--probe-interval", type=int, default=50,
+                        help="探测线程更新未归档行的间隔（毫秒），用于测量对源表业务的影响，0表示不探测")
+    parser.add_argument("--seed", type=int, default=20261018, help="随机数种子")
+    parser.add_argument("-o", "--output", type=str, help="结果文件，默认：logs/benchmark_<时间>.json")
+    parser.add_argument("--keep", action='store_true', help="结束后保留测试表")
+    args = parser.parse_args()
+
+    # 处理参数
+    if args.version:
+        print(__doc__)
+        sys.exit()
+
+    dct = {}
+    try:
+        source_host, source_port = args.source.split(':')
+        dct['source_host'] = source_host
+        dct['source_port'] = int(source_port)
+    except Exception as e:
+        print("无效参数：-S")
+        sys.exit(1)
+
+    try:
+        target_host, target_port = (args.target or args.source).split(':')
+        dct['target_host'] = target_host
+        dct['target_port'] = int(target_port)
+    except Exception as e:
+        print("无效参数：-T")
+        sys.exit(1)
+
+    if args.modes:
+        dct['modes'] = [i.strip() for i in args.modes.split(',') if i.strip()]
+    else:
+        dct['modes'] = PARTITION_MODES if args.partitioned else ROW_MODES
+    for mode in dct['modes']:
+        if mode not in ROW_MODES + PARTITION_MODES:
+            print("无效参数：-m {}".format(mode))
+            sys.exit(1)
+        if mode in PARTITION_MODES and not args.partitioned:
+            print("{}模式需要指定--partitioned".format(mode))
+            sys.exit(1)
+
+    dct['database'] = args.database
+    dct['rows'] = args.rows
+    dct['row_width'] = args.row_width
+    dct['indexes'] = args.indexes
+    dct['partitioned'] = args.partitioned
+    dct['days'] = max(args.days, 2)
+    dct['archive_ratio'] = args.archive_ratio
+    dct['limit'] = args.limit
+    dct['split_parallel'] = args.split_parallel
+    dct['writer'] = args.writer
+    dct['repeat'] = max(args.repeat, 1)
+    dct['probe_interval'] = args.probe_interval
+    dct['seed'] = args.seed
+    dct['output'] = args.output or time.strftime('logs/benchmark_%Y%m%d_%H%M%S.json', time.localtime())
+    dct['keep'] = args.keep
+    return dct
+
+
+def get_global_status(conn, names):
+    "读取全局状态变量（list模式连接）"
+    sql = "show global status where variable_name in ({})".format(','.join(['%s' for i in names]))
+    res = {k: int(v) for k, v in conn.query(sql, names)}
+    return {i: res.get(i, 0) for i in names}
+
+
+def get_dir_bytes(dirname):
+    "目录下所有文件的大小"
+    total = 0
+    for root, dirs, files in os.walk(dirname):
+        for i in files:
+            total += os.path.getsize(os.path.join(root, i))
+    return total
+
+
+def percentile(values, pct):
+    "百分位数"
+    if not values:
+        return None
+    values = sorted(values)
+    return values[int(round((len(values) - 1) * pct))]
+
+
+class Benchmark:
+    "归档性能测试"
+
+    def __init__(self, args):
+        self.args = args
+        self.source_host = args['source_host']
+        self.source_port = args['source_port']
+        self.target_host = args['target_host']
+        self.target_port = args['target_port']
+        self.db = args['database']
+        self.source_table = 'bench_source'
+        self.target_table = 'bench_target'
+        self.user = settings.ARCHIVE_USER  # 生成的归档命令使用归档账号，需要有测试库的建表、删表权限
+        self.password = settings.ARCHIVE_PASSWORD
+        self.source_conf = {'host': self.source_host, 'port': self.source_port, 'user': self.user,
+                            'password': self.password, 'charset': 'utf8mb4'}
+        self.target_conf = {'host': self.target_host, 'port': self.target_port, 'user': self.user,
+                            'password': self.password, 'charset': 'utf8mb4'}
+        self.archive_days = max(1, min(args['days'] - 1, int(round(args['days'] * args['archive_ratio']))))
+        self.cutoff_time = BASE_TIME + datetime.timedelta(days=self.archive_days)
+        self.where = "add_time < '{}'".format(self.cutoff_time.strftime('%Y-%m-%d %H:%M:%S'))
+        self.cutoff_id = 0  # 小于等于该id的行符合归档条件
+        self.started = None
+        self.server_info = {}
+        self.results = []
+
+    def __str__(self):
+        return str(self.__dict__)
+
+    def row_time(self, i):
+        "第i行的时间，均匀分布在days天内"
+        return BASE_TIME + datetime.timedelta(seconds=int(self.args['days'] * 86400 * (i - 1) / self.args['rows']))
+
+    def create_tables(self):
+        "创建源表和归档表"
+        conn = util.mysql(self.source_conf, mode='list')
+        try:
+            conn.execute("create database if not exists `{}`".format(self.db))
+            conn.execute("drop table if exists `{}`.`{}`".format(self.db, self.source_table))
+            pk = '`id`,`add_time`' if self.args['partitioned'] else '`id`'
+            keys = ['primary key ({})'.format(pk)] + INDEX_LAYOUTS[self.args['indexes']]
+            sql = """create table `{}`.`{}` (
+  `id` bigint not null,
+  `add_time` datetime not null,
+  `status` tinyint not null default '0',
+  `user_id` int not null,
+  `payload` varchar({}) not null,
+  {}
+) engine=innodb default charset=utf8mb4""".format(self.db, self.source_table, self.args['row_width'],
+                                                  ',\n  '.join(keys))
+            if self.args['partitioned']:
+                parts = []
+                for i in range(1, self.args['days'] + 1):
+                    dt = BASE_TIME + datetime.timedelta(days=i)
+                    parts.append("partition p{} values less than (to_days('{}'))".format(
+                        (dt - datetime.timedelta(days=1)).strftime('%Y%m%d'), dt.strftime('%Y-%m-%d')))
+                parts.append("partition pmax values less than maxvalue")
+                sql += "\npartition by range (to_days(`add_time`)) ({})".format(','.join(parts))
+            conn.execute(sql)
+        finally:
+            conn.close()
+
+        conn = util.mysql(self.target_conf, mode='list')
+        try:
+            conn.execute("create database if not exists `{}`".format(self.db))
+            conn.execute("drop table if exists `{}`.`{}`".format(self.db, self.target_table))
+            pk = '`id`,`add_time`' if self.args['partitioned'] else '`id`'
+            sql = """create table `{}`.`{}` (
+  `id` bigint not null,
+  `add_time` datetime not null,
+  `status` tinyint not null default '0',
+  `user_id` int not null,
+  `payload` varchar({}) not null,
+  primary key ({})
+) engine=innodb default charset=utf8mb4""".format(self.db, self.target_table, self.args['row_width'], pk)
+            conn.execute(sql)
+        finally:
+            conn.close()
+
+    def load_rows(self):
+        "生成源表数据，相同的种子生成相同的数据"
+        rnd = random.Random(self.args['seed'])
+        letters = string.ascii_letters + string.digits
+        table_name = '`{}`.`{}`'.format(self.db, self.source_table)
+        conn = util.mysql(self.source_conf, mode='list')
+        try:
+            rows = []
+            self.cutoff_id = 0
+            for i in range(1, self.args['rows'] + 1):
+                add_time = self.row_time(i)
+                if add_time < self.cutoff_time:
+                    self.cutoff_id = i
+                rows.append((i, add_time, rnd.randint(0, 3), rnd.randint(1, 100000),
+                             ''.join(rnd.choices(letters, k=self.args['row_width']))))
+                if len(rows) >= 5000:
+                    conn.batch_insert(table_name, FIELDS, rows)
+                    rows = []
+            if rows:
+                conn.batch_insert(table_name, FIELDS, rows)
+            conn.execute("analyze table {}".format(table_name))
+        finally:
+            conn.close()
+
+    def count_rows(self):
+        "符合归档条件的行数和数据量（字节）"
+        conn = util.mysql(self.source_conf, mode='list')
+        try:
+            sql = "select count(*),coalesce(sum(length(concat_ws('#',{}))),0) from `{}`.`{}` where {}".format(
+                ','.join(['`{}`'.format(i) for i in FIELDS]), self.db, self.source_table, self.where)
+            cnt, size = conn.query(sql)[0]
+        finally:
+            conn.close()
+        return int(cnt), int(size)
+
+    def generate_cmd(self, mode):
+        "用ArchiveConfig生成归档命令，与正式任务相同"
+        conf = {'id': 0, 'source_host': self.source_host, 'source_port': self.source_port, 'source_db': self.db,
+                'source_table': self.source_table, 'dest_host': self.target_host, 'dest_port': self.target_port,
+                'dest_db': self.db, 'dest_table': self.target_table, 'archive_mode': mode, 'charset': 'utf8mb4',
+                'interval_day': 1, 'archive_condition': self.where, 'exec_time_window': '00:00-24:00',
+                'priority': 1, 'chunk_size': self.args['limit'], 'split_parallel': self.args['split_parallel'],
+                'dest_writer': self.args['writer']}
+        o = archiver.ArchiveConfig(conf)
+        o.generate_cmds()
+        return CHECKPOINT_REGEX.sub('', o.archive_cmd_list[0])  # 不在configdb记录断点
+
+    def file_dir(self):
+        "归档到文件模式的目录"
+        return "archive_data/{}_{}/{}.{}".format(self.source_host, self.source_port, self.db, self.source_table)
+
+    def probe(self, stop_event, latencies):
+        "探测线程：按固定间隔更新一行不归档的数据，记录耗时（毫秒）"
+        if self.cutoff_id >= self.args['rows']:
+            return
+        rnd = random.Random(self.args['seed'])
+        conn = util.mysql(self.source_conf, mode='list')
+        sql = "update `{}`.`{}` set user_id=user_id+1 where id=%s".format(self.db, self.source_table)
+        try:
+            while not stop_event.wait(self.args['probe_interval'] / 1000):
+                ts = time.time()
+                conn.update(sql, (rnd.randint(self.cutoff_id + 1, self.args['rows']),))
+                latencies.append((time.time() - ts) * 1000)
+        except Exception as e:
+            logging.warning("探测线程报错：{}".format(e))
+        finally:
+            conn.close()
+
+    def run_mode(self, mode, round_no):
+        "执行一个归档模式，返回测试结果"
+        self.create_tables()
+        self.load_rows()
+        rows_before, logical_bytes = self.count_rows()
+        if mode in FILE_MODES and os.path.exists(self.file_dir()):
+            shutil.rmtree(self.file_dir())
+
+        cmd = self.generate_cmd(mode)
+        logfile = "logs/benchmark_{}.log".format(mode)
+        stats = task_stats.TaskStats(0, 0, None)
+        logging.info("开始测试：[mode:{},round:{}] {}".format(mode, round_no, cmd))
+
+        source_conn = util.mysql(self.source_conf, mode='list')
+        target_conn = util.mysql(self.target_conf, mode='list')
+        lock_names = ['Innodb_row_lock_time', 'Innodb_row_lock_waits']
+        write_names = ['Innodb_data_written', 'Innodb_os_log_written']
+        try:
+            lock_begin = get_global_status(source_conn, lock_names)
+            write_begin = get_global_status(target_conn, write_names)
+            latencies = []
+            stop_event = threading.Event()
+            prober = None
+            if self.args['probe_interval'] > 0:
+                prober = threading.Thread(name='Probe', target=self.probe, args=(stop_event, latencies))
+                prober.setDaemon(True)
+                prober.start()
+            ts = time.time()
+            exit_code = util.run_command(cmd, logfile, stats.parse_line)
+            seconds = time.time() - ts
+            stop_event.set()
+            if prober:
+                prober.join()
+            lock_end = get_global_status(source_conn, lock_names)
+            write_end = get_global_status(target_conn, write_names)
+        finally:
+            source_conn.close()
+            target_conn.close()
+
+        rows_after = self.count_rows()[0]
+        rows = rows_before - rows_after
+        if mode in FILE_MODES:
+            dest_bytes = get_dir_bytes(self.file_dir())
+            shutil.rmtree(self.file_dir(), ignore_errors=True)
+        elif mode == 'delete':
+            dest_bytes = None
+        else:
+            # 源表和归档表在同一实例时，包含源表删除产生的写入
+            dest_bytes = sum([write_end[i] - write_begin[i] for i in write_names])
+
+        result = {'mode': mode, 'round': round_no, 'exit_code': exit_code, 'seconds': round(seconds, 3),
+                  'rows_expected': rows_before, 'rows': rows,
+                  'rows_per_sec': round(rows / seconds, 2) if seconds > 0 else None,
+                  'logical_bytes': logical_bytes,
+                  'row_lock_time_ms': lock_end['Innodb_row_lock_time'] - lock_begin['Innodb_row_lock_time'],
+                  'row_lock_waits': lock_end['Innodb_row_lock_waits'] - lock_begin['Innodb_row_lock_waits'],
+                  'probe_count': len(latencies),
+                  'probe_p99_ms': round(percentile(latencies, 0.99), 3) if latencies else None,
+                  'probe_max_ms': round(max(latencies), 3) if latencies else None,
+                  'dest_bytes_written': dest_bytes,
+                  'write_amplification': round(dest_bytes / logical_bytes, 3) if dest_bytes is not None and
+                                                                                 logical_bytes else None,
+                  'stats': stats.snapshot(), 'archive_cmd': cmd}
+        logging.info("测试结束：[mode:{},round:{}] 退出码：{}，行数：{}/{}，耗时：{}s，每秒行数：{}，写放大：{}".format(
+            mode, round_no, exit_code, rows, rows_before, result['seconds'], result['rows_per_sec'],
+            result['write_amplification']))
+        return result
+
+    def get_server_info(self):
+        "测试实例的版本和主要参数"
+        conn = util.mysql(self.source_conf, mode='list')
+        try:
+            names = ['version', 'innodb_buffer_pool_size', 'innodb_flush_log_at_trx_commit', 'sync_binlog',
+                     'log_bin', 'innodb_doublewrite']
+            sql = "show global variables where variable_name in ({})".format(','.join(['%s' for i in names]))
+            return dict(conn.query(sql, names))
+        finally:
+            conn.close()
+
+    def save(self):
+        "写入结果文件"
+        params = {k: v for k, v in self.args.items() if k not in ('output',)}
+        params['where'] = self.where
+        data = {'started': self.started, 'finished': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime()),
+                'server': self.server_info, 'params': params, 'results': self.results}
+        dirname = os.path.dirname(self.args['output'])
+        if dirname and not os.path.exists(dirname):
+            os.makedirs(dirname)
+        with open(self.args['output'], 'w') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+        logging.info("结果已写入：{}".format(self.args['output']))
+
+    def drop_tables(self):
+        "删除测试表"
+        for conf, table_name in [(self.source_conf, self.source_table), (self.target_conf, self.target_table)]:
+            conn = util.mysql(conf, mode='list')
+            try:
+                conn.execute("drop table if exists `{}`.`{}`".format(self.db, table_name))
+            finally:
+                conn.close()
+
+    def run(self):
+        "执行所有模式"
+        self.started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
+        self.server_info = self.get_server_info()
+        logging.info("测试实例：{}".format(self.server_info))
+        try:
+            for round_no in range(1, self.args['repeat'] + 1):
+                for mode in self.args['modes']:
+                    try:
+                        self.results.append(self.run_mode(mode, round_no))
+                    except Exception as e:
+                        logging.error("测试报错：[mode:{},round:{}]".format(mode, round_no), exc_info=True)
+                        self.results.append({'mode': mode, 'round': round_no, 'error': str(e)})
+                    self.save()
+        finally:
+            if not self.args['keep']:
+                self.drop_tables()
+
+
+# main
+if __name__ == "__main__":
+    # 在程序目录执行，生成的归档命令使用相对路径
+    dirname, filename = (os.path.split(os.path.realpath(__file__)))
+    os.chdir(dirname)
+    if not os.path.exists('logs'):
+        os.makedirs('logs')
+    set_log_level()
+    args = get_args()
+    logging.info(args)
+    o = Benchmark(args)
+    o.run()
@@ -0,0 +1,107 @@
+#!/bin/python3
+# -*- encoding: utf-8 -*-
+"""
+####################################################################################################
+#  Name        :  checkpoint.py
+#  Author      :  Elison
+#  Email       :  Ly99@qq.com
+#  Description :  归档断点：记录每个主键范围已删除的最大主键，写入archive_checkpoint表，任务中断后下次从断点继续
+#  Updates     :
+#      Version     When            What
+#      --------    -----------     -----------------------------------------------------------------
+#      v1.0        2026-10-18
+#      v1.1        2026-10-18      记录归档条件的md5（where_hash），归档条件或源表修改后丢弃断点
+####################################################################################################
+"""
+import json
+import time
+import hashlib
+import logging
+import threading
+import archive_file
+
+
+class Checkpoint:
+    "断点（线程安全）：删除线程每批次提交后更新，按固定间隔写入configdb"
+
+    def __init__(self, config_id, get_conn, flush_seconds=10, where=''):
+        self.config_id = config_id
+        self.get_conn = get_conn  # 返回list模式的mysql连接，用完调用close()
+        self.flush_seconds = flush_seconds
+        self.where_hash = hashlib.md5(where.encode('utf8')).hexdigest()  # 断点只对相同的归档条件有效
+        self.stale = False  # 是否丢弃了其他归档条件的断点
+        self.key_ranges = []
+        self.last_pk = []
+        self.rows_done = 0
+        self.last_flush = 0
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def __str__(self):
+        return str({'config_id': self.config_id, 'key_ranges': self.key_ranges, 'last_pk': self.last_pk,
+                    'rows_done': self.rows_done})
+
+    def load(self):
+        "读取上次中断时的断点，返回是否存在，归档条件不同的断点视为不存在"
+        conn = self.get_conn()
+        try:
+            res = conn.query(
+                "select key_ranges,last_pk,rows_done,where_hash from archive_checkpoint where config_id=%s",
+                (self.config_id,))
+        finally:
+            conn.close()
+        if not res:
+            return False
+        key_ranges, last_pk, rows_done, where_hash = res[0]
+        if where_hash != self.where_hash:
+            logging.warning("归档条件已修改，丢弃断点：[config_id:{}]".format(self.config_id))
+            self.stale = True
+            return False
+        self.key_ranges = [tuple(i) for i in json.loads(key_ranges)]
+        self.last_pk = [tuple(i) if i is not None else None for i in json.loads(last_pk)]
+        self.rows_done = rows_done
+        return True
+
+    def init(self, key_ranges):
+        "开始新的归档，记录主键范围"
+        with self.lock:
+            self.key_ranges = list(key_ranges)
+            self.last_pk = [None] * len(key_ranges)
+            self.rows_done = 0
+
+    def update(self, index, last_pk, rows):
+        "主键范围index已删除到last_pk"
+        with self.lock:
+            self.last_pk[index] = tuple(last_pk)
+            self.rows_done += rows
+            self.dirty = True
+        if time.time() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self, force=False):
+        "写入archive_checkpoint"
+        with self.lock:
+            if not self.dirty and not force:
+                return
+            key_ranges = json.dumps([[archive_file.to_json_value(v) for v in i] for i in self.key_ranges])
+            last_pk = json.dumps([[archive_file.to_json_value(v) for v in i] if i is not None else None
+                                  for i in self.last_pk])
+            rows_done = self.rows_done
+            self.dirty = False
+            self.last_flush = time.time()
+        sql = """insert into archive_checkpoint(config_id,where_hash,key_ranges,last_pk,rows_done) values(%s,%s,%s,%s,%s)
+        on duplicate key update where_hash=values(where_hash),key_ranges=values(key_ranges),last_pk=values(last_pk),rows_done=values(rows_done)"""
+        try:
+            conn = self.get_conn()
+            conn.execute(sql, (self.config_id, self.where_hash, key_ranges, last_pk, rows_done))
+            conn.close()
+        except Exception as e:
+            logging.warning("写入断点报错：[config_id:{}] {}".format(self.config_id, e))
+
+    def clear(self):
+        "归档完成，删除断点"
+        conn = self.get_conn()
+        try:
+            conn.execute("delete from archive_checkpoint where config_id=%s", (self.config_id,))
+        finally:
+            conn.close()
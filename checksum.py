@@ -0,0 +1,169 @@
+#!/bin/python3
+# -*- encoding: utf-8 -*-
+"""
+####################################################################################################
+#  Name        :  checksum.py
+#  Author      :  Elison
+#  Email       :  Ly99@qq.com
+#  Description :  源表和归档表数据校验：按主键切分成块，并行比较每块的行数和BIT_XOR(CRC32(...))校验和
+#  Updates     :
+#      Version     When            What
+#      --------    -----------     -----------------------------------------------------------------
+#      v1.0        2026-10-18
+####################################################################################################
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import util
+
+
+def get_table_columns(conn, db, table):
+    "获取字段和主键（conn为list模式）"
+    sql = """select column_name cname from information_schema.COLUMNS where table_schema=%s and table_name=%s order by ordinal_position"""
+    columns = [i[0] for i in conn.query(sql, (db, table))]
+    sql = """select column_name cname from information_schema.KEY_COLUMN_USAGE where table_schema=%s and table_name=%s and constraint_name='PRIMARY' order by ordinal_position"""
+    pk_columns = [i[0] for i in conn.query(sql, (db, table))]
+    return columns, pk_columns
+
+
+def checksum_expr(columns):
+    "行校验和表达式，NULL和空字符串通过ISNULL标记区分"
+    fields = ','.join(['`{}`'.format(i) for i in columns])
+    isnulls = ','.join(['isnull(`{}`)'.format(i) for i in columns])
+    return "coalesce(bit_xor(crc32(concat_ws('#',{},concat({})))),0)".format(fields, isnulls)
+
+
+def pk_text(pk_columns):
+    "主键字段（单列或行构造器）"
+    text = ','.join(['`{}`'.format(i) for i in pk_columns])
+    if len(pk_columns) > 1:
+        text = '({})'.format(text)
+    return text
+
+
+def pk_placeholder(pk_columns):
+    "主键占位符"
+    text = ','.join(['%s' for i in pk_columns])
+    if len(pk_columns) > 1:
+        text = '({})'.format(text)
+    return text
+
+
+def checksum_keys(conn, table_name, columns, pk_columns, pk_list, where=None, lock=False):
+    "计算指定主键列表的行数和校验和，返回(行数, 校验和)，lock=True时对扫描到的行加锁"
+    in_text = ','.join([pk_placeholder(pk_columns) for i in pk_list])
+    sql = "select count(*),{} from {} where {} in ({})".format(checksum_expr(columns), table_name, pk_text(pk_columns),
+                                                              in_text)
+    if where:
+        sql += " and ({})".format(where.replace('%', '%%'))  # 条件和参数一起执行，%需要转义
+    if lock:
+        sql += " for update"
+    args = [v for pk in pk_list for v in pk]
+    cnt, crc = conn.query(sql, args)[0]
+    return cnt, int(crc)
+
+
+class ChunkChecksum:
+    "按主键切分成块，并行比较源端和目标端每块的行数和校验和，只校验where限定的范围"
+
+    def __init__(self, source_conf, target_conf, source_from, target_from, columns, pk_columns, where='1=1',
+                 chunk_size=10000, parallel=4):
+        self.source_conf = source_conf
+        self.target_conf = target_conf
+        self.source_from = source_from  # 如：`orders` partition(p202201)
+        self.target_from = target_from
+        self.columns = columns
+        self.pk_columns = pk_columns
+        self.where = where
+        self.chunk_size = chunk_size
+        self.parallel = parallel
+        self.local = threading.local()
+        self.conns = []
+        self.lock = threading.Lock()
+        self.rows = 0
+
+    def __str__(self):
+        return str(self.__dict__)
+
+    def get_conns(self):
+        "每个线程一对源端、目标端连接"
+        if getattr(self.local, 'conns', None) is None:
+            source_conn = util.mysql(self.source_conf, mode='list')
+            target_conn = util.mysql(self.target_conf, mode='list')
+            self.local.conns = (source_conn, target_conn)
+            with self.lock:
+                self.conns += [source_conn, target_conn]
+        return self.local.conns
+
+    def split_chunks(self):
+        "按主键索引每隔chunk_size行取一个切分点，返回[(下界, 上界)]，左闭右开，None表示不限"
+        if not self.pk_columns:
+            return [(None, None)]
+        fields = ','.join(['`{}`'.format(i) for i in self.pk_columns])
+        conn = util.mysql(self.source_conf, mode='list')
+        try:
+            points = []
+            while True:
+                sql = "select {} from {} where ({})".format(fields, self.source_from, self.where.replace('%', '%%'))
+                args = []
+                if points:
+                    sql += " and {} >= {}".format(pk_text(self.pk_columns), pk_placeholder(self.pk_columns))
+                    args = list(points[-1])
+                sql += " order by {} limit {},1".format(fields, self.chunk_size if points else 0)
+                res = conn.query(sql, args)
+                if not res:
+                    break
+                points.append(tuple(res[0]))
+        finally:
+            conn.close()
+        if not points:
+            return [(None, None)]
+        bounds = [None] + points[1:] + [None]
+        return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+
+    def chunk_where(self, chunk):
+        "块的主键范围条件和参数"
+        lower, upper = chunk
+        where = "({})".format(self.where.replace('%', '%%'))  # 条件和参数一起执行，%需要转义
+        args = []
+        if lower is not None:
+            where += " and {} >= {}".format(pk_text(self.pk_columns), pk_placeholder(self.pk_columns))
+            args += list(lower)
+        if upper is not None:
+            where += " and {} < {}".format(pk_text(self.pk_columns), pk_placeholder(self.pk_columns))
+            args += list(upper)
+        return where, args
+
+    def check_chunk(self, chunk):
+        "校验一个块，返回(是否一致, 源端(行数, 校验和), 目标端(行数, 校验和))"
+        source_conn, target_conn = self.get_conns()
+        where, args = self.chunk_where(chunk)
+        expr = checksum_expr(self.columns)
+        source = source_conn.query("select count(*),{} from {} where {}".format(expr, self.source_from, where),
+                                   args)[0]
+        target = target_conn.query("select count(*),{} from {} where {}".format(expr, self.target_from, where),
+                                   args)[0]
+        source, target = (source[0], int(source[1])), (target[0], int(target[1]))
+        with self.lock:
+            self.rows += source[0]
+        return source == target, source, target
+
+    def run(self):
+        "并行校验所有块，返回不一致的块列表：[(块, 源端, 目标端)]"
+        chunks = self.split_chunks()
+        logging.info("校验范围：{}，共{}块".format(self.where, len(chunks)))
+        diffs = []
+        try:
+            with ThreadPoolExecutor(max_workers=self.parallel) as executor:
+                for chunk, res in zip(chunks, executor.map(self.check_chunk, chunks)):
+                    is_same, source, target = res
+                    if not is_same:
+                        logging.info("数据不一致：主键范围{}，源端(行数,校验和)：{}，目标端：{}".format(chunk, source, target))
+                        diffs.append((chunk, source, target))
+        finally:
+            for i in self.conns:
+                i.close()
+            self.conns = []
+        logging.info("校验结束，行数：{}，不一致的块：{}".format(self.rows, len(diffs)))
+        return diffs
@@ -11,11 +11,22 @@ CREATE TABLE `archive_config` (
   `dest_port` int(11) NOT NULL DEFAULT '3306' COMMENT '目标服务器端口',
   `dest_db` varchar(64) NOT NULL DEFAULT '' COMMENT '目标数据库schema',
   `dest_table` varchar(128) NOT NULL DEFAULT '' COMMENT '目标数据库表',
-  `archive_mode` varchar(20) NOT NULL DEFAULT 'archive' COMMENT '归档模式：archive（归档），archive-slow(慢模式，兼容性高),delete(只删除不归档)，archive-to-file(归档到文件)',
+  `archive_mode` varchar(40) NOT NULL DEFAULT 'archive' COMMENT '归档模式：archive（归档），archive-slow(慢模式，兼容性高),delete(只删除不归档)，archive-to-file(归档到文件)，archive-native(原生引擎)，archive-to-file-native(原生引擎归档到压缩文件)',
   `charset` varchar(20) NOT NULL DEFAULT 'utf8mb4' COMMENT '字符集',
   `archive_condition` varchar(1000) NOT NULL DEFAULT '' COMMENT '归档条件',
   `exec_time_window` varchar(1000) NOT NULL DEFAULT '00:00-06:00' COMMENT '执行时间窗口，如：00:00-06:00,22:00-24:00',
   `priority` tinyint(4) DEFAULT '1' COMMENT '优化级，数值越高，在执行时间窗口的有多个任务时，优先执行',
+  `split_parallel` tinyint(4) NOT NULL DEFAULT '1' COMMENT '按主键范围拆分并行归档的段数，仅archive-native模式有效',
+  `chunk_size` int(11) NOT NULL DEFAULT '1000' COMMENT '每批次行数（pt-archiver的--limit/--txn-size），archive-native模式为初始批次行数',
+  `chunk_size_min` int(11) NOT NULL DEFAULT '100' COMMENT 'archive-native模式自适应调整批次大小的下限，auto_plan计算批次大小的下限',
+  `chunk_size_max` int(11) NOT NULL DEFAULT '20000' COMMENT 'archive-native模式自适应调整批次大小的上限，auto_plan计算批次大小的上限',
+  `txn_target_ms` int(11) NOT NULL DEFAULT '500' COMMENT 'archive-native模式单个事务的目标耗时（毫秒），0表示固定批次大小',
+  `replica_hosts` varchar(1000) NOT NULL DEFAULT '' COMMENT '需要检查复制延迟的从库，如：10.0.0.202:3306,10.0.0.203:3306',
+  `file_compress` varchar(10) NOT NULL DEFAULT 'gzip' COMMENT 'archive-to-file-native模式的压缩格式：gzip、zstd(需要安装zstandard)',
+  `time_column` varchar(64) NOT NULL DEFAULT '' COMMENT '时间字段，archive-to-file-native模式在manifest中记录每个文件的时间范围',
+  `dest_writer` varchar(20) NOT NULL DEFAULT 'insert' COMMENT 'archive-native模式写入归档表的方式：insert(多行insert)、load-data(LOAD DATA LOCAL INFILE，归档实例需开启local_infile)',
+  `verify_checksum` tinyint(4) NOT NULL DEFAULT '0' COMMENT 'archive-native模式删除源表数据前是否比较每批次的行数和校验和',
+  `auto_plan` tinyint(4) NOT NULL DEFAULT '0' COMMENT '执行前EXPLAIN归档条件，自动选择是否按主键顺序扫描（pt-archiver模式）和批次大小（在chunk_size_min和chunk_size_max之间）',
   `sys_ctime` datetime DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
   `sys_utime` datetime DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '修改时间',
   `is_deleted` tinyint(4) DEFAULT '0' COMMENT '是否已删除',
@@ -37,6 +48,8 @@ drop table if exists archive_tasks;
 CREATE TABLE `archive_tasks`
 (
     `id`               int(11) NOT NULL AUTO_INCREMENT COMMENT 'id',
+    `config_id`        int(11) NOT NULL COMMENT 'archive_config.id',
+    `task_date`        date          DEFAULT NULL COMMENT '任务日期，同一配置每天只生成一个任务',
     `source_host`      varchar(64)  NOT NULL COMMENT '源服务器',
     `source_port`      int(11) NOT NULL COMMENT '源服务器端口',
     `source_db`        varchar(64)  NOT NULL COMMENT '源数据库schema',
@@ -45,17 +58,67 @@ CREATE TABLE `archive_tasks`
     `dest_port`        int(11) NOT NULL COMMENT '目标服务器端口',
     `dest_db`          varchar(64)   DEFAULT NULL COMMENT '目标数据库schema',
     `dest_table`       varchar(128)  DEFAULT NULL COMMENT '目标数据库表',
-    `archive_mode`     varchar(20)   DEFAULT 'archive' COMMENT '归档模式：archive（归档），archive-slow(慢模式，兼容性高),delete(只删除不归档)，archive-to-file(归档到文件)',
+    `archive_mode`     varchar(40)   DEFAULT 'archive' COMMENT '归档模式：archive（归档），archive-slow(慢模式，兼容性高),delete(只删除不归档)，archive-to-file(归档到文件)，archive-native(原生引擎)，archive-to-file-native(原生引擎归档到压缩文件)',
     `exec_time_window` varchar(1000) DEFAULT NULL COMMENT '执行时间窗口',
     `priority`         tinyint(4) DEFAULT '1' COMMENT '优化级，数值越高，在执行时间窗口的有多个任务时，优先执行',
-    `exec_status`      varchar(100)  DEFAULT 'initial' COMMENT '运行的状态，initial:初始状态，running:执行中，check failed:检查不通过，wait timeout:等待超时，done:已执行',
+    `exec_status`      varchar(100)  DEFAULT 'initial' COMMENT '运行的状态，initial:初始状态，running:执行中，check failed:检查不通过，wait timeout:等待超时，paused:窗口关闭暂停，done:已执行',
     `exec_start`       datetime      DEFAULT NULL COMMENT '归档开始时间',
     `exec_end`         datetime      DEFAULT NULL COMMENT '归档结束时间',
     `exec_seconds`     int(11) DEFAULT NULL COMMENT '执行时间（秒）',
     `archive_cmd`      varchar(2000) DEFAULT NULL COMMENT '归档命令',
-    `exec_log`         longtext COMMENT '执行日志',
+    `auto_plan`        tinyint(4) DEFAULT '0' COMMENT '是否根据归档计划自动调整归档命令',
+    `est_rows`         bigint(20) DEFAULT NULL COMMENT '执行前估算的归档行数',
+    `est_key`          varchar(64)   DEFAULT NULL COMMENT '归档计划使用的索引',
+    `est_plan`         varchar(200)  DEFAULT NULL COMMENT '归档计划：是否按主键顺序扫描、批次大小、估算扫描行数',
+    `predicted_seconds` int(11) DEFAULT NULL COMMENT '根据历史预测的执行时间（秒），与exec_seconds对比',
+    `planned_start`    datetime      DEFAULT NULL COMMENT '计划开始时间',
+    `owner`            varchar(100)  DEFAULT NULL COMMENT '认领任务的进程（节点标识:进程号:启动时间）',
+    `lease_expire`     datetime      DEFAULT NULL COMMENT '租约过期时间，节点定期续租，过期后其他节点回收任务',
+    `exec_log`         longtext COMMENT '执行日志（首尾若干行，完整日志见log_summary.log_file）',
+    `log_summary`      text COMMENT '日志摘要（json）：行数、字节数、错误行、退出码、压缩日志文件',
+    `sys_ctime`        datetime      DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
     `sys_utime`        datetime      DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '修改时间',
     PRIMARY KEY (`id`),
+    UNIQUE KEY         `uk_config_id_task_date` (`config_id`,`task_date`),
     KEY                `idx_source_db_table` (`source_db`,`source_table`,`exec_start`),
-    KEY                `idx_source_host_port` (`source_host`,`source_port`,`exec_start`)
-) ENGINE=InnoDB DEFAULT CHARSET=utf8 COMMENT='归档任务表';
\ No newline at end of file
+    KEY                `idx_source_host_port` (`source_host`,`source_port`,`exec_start`),
+    KEY                `idx_config_id` (`config_id`,`exec_start`),
+    KEY                `idx_sys_ctime` (`sys_ctime`),
+    KEY                `idx_exec_status_lease_expire` (`exec_status`,`lease_expire`),
+    KEY                `idx_owner` (`owner`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COMMENT='归档任务表';
+
+
+drop table if exists archive_task_stats;
+CREATE TABLE `archive_task_stats`
+(
+    `task_id`          int(11) NOT NULL COMMENT 'archive_tasks.id',
+    `config_id`        int(11) DEFAULT NULL COMMENT 'archive_config.id',
+    `rows_selected`    bigint(20) NOT NULL DEFAULT '0' COMMENT '读取行数',
+    `rows_inserted`    bigint(20) NOT NULL DEFAULT '0' COMMENT '写入行数',
+    `rows_deleted`     bigint(20) NOT NULL DEFAULT '0' COMMENT '删除行数',
+    `rows_per_sec`     decimal(12,2) NOT NULL DEFAULT '0.00' COMMENT '每秒处理行数',
+    `elapsed_seconds`  int(11) NOT NULL DEFAULT '0' COMMENT '已运行秒数',
+    `select_seconds`   decimal(12,4) NOT NULL DEFAULT '0.0000' COMMENT 'select耗时（秒）',
+    `insert_seconds`   decimal(12,4) NOT NULL DEFAULT '0.0000' COMMENT 'insert/写文件耗时（秒）',
+    `delete_seconds`   decimal(12,4) NOT NULL DEFAULT '0.0000' COMMENT 'delete耗时（秒）',
+    `commit_seconds`   decimal(12,4) NOT NULL DEFAULT '0.0000' COMMENT 'commit耗时（秒）',
+    `throttle_seconds` decimal(12,4) NOT NULL DEFAULT '0.0000' COMMENT '限流暂停时间（秒）',
+    `sys_ctime`        datetime DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    `sys_utime`        datetime DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '修改时间',
+    PRIMARY KEY (`task_id`),
+    KEY                `idx_config_id` (`config_id`,`sys_ctime`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COMMENT='归档任务统计表';
+
+drop table if exists archive_checkpoint;
+CREATE TABLE `archive_checkpoint`
+(
+    `config_id`  int(11) NOT NULL COMMENT 'archive_config.id',
+    `where_hash` char(32) NOT NULL DEFAULT '' COMMENT '源表和归档条件的md5，修改后丢弃断点',
+    `key_ranges` text     NOT NULL COMMENT '主键范围（json），按主键拆分并行归档时每段一个范围',
+    `last_pk`    text     NOT NULL COMMENT '每个主键范围已删除的最大主键（json）',
+    `rows_done`  bigint(20) NOT NULL DEFAULT '0' COMMENT '已归档行数',
+    `sys_ctime`  datetime DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    `sys_utime`  datetime DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '修改时间',
+    PRIMARY KEY (`config_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COMMENT='原生引擎归档断点表';
\ No newline at end of file
@@ -0,0 +1,119 @@
+#!/bin/python3
+# -*- encoding: utf-8 -*-
+"""
+####################################################################################################
+#  Name        :  metrics.py
+#  Author      :  Elison
+#  Email       :  Ly99@qq.com
+#  Description :  监控指标：后台线程提供HTTP接口，按Prometheus文本格式输出指标，不依赖第三方库
+#  Updates     :
+#      Version     When            What
+#      --------    -----------     -----------------------------------------------------------------
+#      v1.0        2026-10-18
+####################################################################################################
+"""
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape_label(value):
+    "转义标签值"
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def format_value(value):
+    "格式化指标值"
+    if isinstance(value, float):
+        return repr(value)
+    return str(int(value))
+
+
+class MetricFamily:
+    "同名指标：类型为gauge、counter、summary"
+
+    def __init__(self, name, mtype, help_text):
+        self.name = name
+        self.mtype = mtype
+        self.help_text = help_text
+        self.samples = []
+
+    def __str__(self):
+        return str(self.__dict__)
+
+    def add(self, value, suffix='', **labels):
+        "添加一个样本，suffix如_sum、_count"
+        self.samples.append((suffix, labels, value))
+        return self
+
+    def render(self):
+        "输出文本格式"
+        lines = ['# HELP {} {}'.format(self.name, self.help_text), '# TYPE {} {}'.format(self.name, self.mtype)]
+        for suffix, labels, value in self.samples:
+            text = ','.join(['{}="{}"'.format(k, escape_label(v)) for k, v in sorted(labels.items())])
+            lines.append('{}{}{} {}'.format(self.name, suffix, '{' + text + '}' if text else '', format_value(value)))
+        return '\n'.join(lines)
+
+
+def render(families):
+    "输出所有指标"
+    return ''.join([i.render() + '\n' for i in families])
+
+
+class MetricsServer:
+    "指标HTTP服务：GET /metrics时调用collect()采集指标，collect返回MetricFamily列表"
+
+    def __init__(self, collect, port, host='0.0.0.0'):
+        self.collect = collect
+        self.port = port
+        self.host = host
+        self.server = None
+        self.thread = None
+
+    def __str__(self):
+        return str({'host': self.host, 'port': self.port})
+
+    def handler_class(self):
+        "请求处理类"
+        collect = self.collect
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                try:
+                    body = render(collect()).encode('utf-8')
+                except Exception:
+                    logging.error('采集监控指标报错', exc_info=True)
+                    self.send_error(500)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.debug('metrics: ' + format % args)
+
+        return Handler
+
+    def start(self):
+        "在后台线程启动HTTP服务"
+        self.server = ThreadingHTTPServer((self.host, self.port), self.handler_class())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(name='Metrics', target=self.server.serve_forever, args=())
+        self.thread.setDaemon(True)
+        self.thread.start()
+        logging.info('监控指标接口已启动：http://{}:{}/metrics'.format(self.host, self.port))
+
+    def stop(self):
+        "停止HTTP服务"
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
@@ -0,0 +1,787 @@
+#!/bin/python3
+# -*- encoding: utf-8 -*-
+"""
+####################################################################################################
+#  Name        :  native_archiver.py
+#  Author      :  Elison
+#  Email       :  Ly99@qq.com
+#  Description :  原生归档引擎：按主键分页读取，读取、写入、删除三段流水线并行执行
+#  Updates     :
+#      Version     When            What
+#      --------    -----------     -----------------------------------------------------------------
+#      v1.0        2026-10-18
+#      v1.1        2026-10-18      增加-n参数，按主键范围拆分并行归档
+#      v1.2        2026-10-18      根据事务耗时自适应调整批次大小
+#      v1.3        2026-10-18      根据复制延迟、Threads_running限流
+#      v1.4        2026-10-18      增加--file-dir参数，归档到压缩分块文件
+#      v1.5        2026-10-18      增加--writer参数，支持LOAD DATA LOCAL INFILE写入归档表
+#      v1.6        2026-10-18      增加--verify参数，删除源表数据前比较每批次的行数和校验和
+#      v1.7        2026-10-18      增加--checkpoint-id参数，记录断点，任务中断后下次从断点继续
+#      v1.8        2026-10-18      收到SIGTERM时停止读取，写完、删完已读取的批次后暂停退出（退出码0）
+#      v1.9        2026-10-18      从断点继续时先用replace写入，断点之后已写入归档表、未删除的行不再主键冲突
+#      v1.10       2026-10-18      限流期间按间隔输出throttle统计行，执行中即可看到限流暂停时间
+#      v1.11       2026-10-18      断点记录源表和归档条件，修改后丢弃断点重新拆分主键范围
+####################################################################################################
+"""
+import sys
+import time
+import argparse
+import logging
+import threading
+import signal
+import queue
+import os
+import util
+import settings
+import archive_file
+import checksum
+from checkpoint import Checkpoint
+from throttle import Throttler, parse_hosts
+from archiver import expr_to_date
+
+
+def set_log_level(level='info'):
+    "设置日志等级"
+    if level == 'debug':
+        lv = logging.DEBUG
+    else:
+        lv = logging.INFO
+    logging.basicConfig(stream=sys.stdout, level=lv,
+                        format='[%(asctime)s.%(msecs)d] [%(levelname)s] %(funcName)s: %(message)s',
+                        datefmt='%Y-%m-%d %H:%M:%S')
+
+
+def get_args():
+    '获取参数'
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-v", "--version", action='store_true', help="查看版本")
+    parser.add_argument("-S", "--source", type=str, required=True, help="源表所在的实例IP和端口, 如: 10.0.0.201:3306")
+    parser.add_argument("-T", "--target", type=str, help="归档表所在的实例IP和端口, 如: 10.0.0.201:3306（指定--file-dir时不需要）")
+    parser.add_argument("-d", "--database", type=str, required=True,
+                        help="归档表的数据库名，如：orderdb或orderdb:orderdb_history(可以使用冒号分别指定源端和目标端db名)")
+    parser.add_argument("-t", "--table", type=str, required=True,
+                        help="归档表的表名，如：orders或orders:orders_history(可以使用冒号分别指定源端和目标端table名)")
+    parser.add_argument("-w", "--where", type=str, required=True, help="归档条件")
+    parser.add_argument("-c", "--charset", default='utf8mb4', choices=['utf8', 'utf8mb4', 'gbk'], help="字符集")
+    parser.add_argument("-u", "--user", type=str, default=settings.ARCHIVE_USER, help="用户名")
+    parser.add_argument("-p", "--password", type=str, default=settings.ARCHIVE_PASSWORD, help="密码")
+    parser.add_argument("-l", "--limit", type=int, default=1000, help="每批次处理的初始行数")
+    parser.add_argument("--min-limit", type=int, default=100, help="自适应调整时每批次的最小行数")
+    parser.add_argument("--max-limit", type=int, default=20000, help="自适应调整时每批次的最大行数")
+    parser.add_argument("--txn-target", type=int, default=500, help="单个事务的目标耗时（毫秒），0表示不自适应调整批次大小")
+    parser.add_argument("--progress", type=int, default=10000, help="每处理多少行输出一次进度")
+    parser.add_argument("-n", "--parallel", type=int, default=1, help="按主键范围拆分成N段并行归档，默认不拆分")
+    parser.add_argument("--replicas", type=str, default='', help="需要检查复制延迟的从库，如：10.0.0.202:3306,10.0.0.203:3306")
+    parser.add_argument("--max-lag", type=int, default=30, help="从库复制延迟超过N秒时暂停归档，0表示不检查")
+    parser.add_argument("--max-threads-running", type=int, default=0, help="源库Threads_running超过N时暂停归档，0表示不检查")
+    parser.add_argument("--check-interval", type=int, default=1, help="限流采样间隔（秒）")
+    parser.add_argument("--writer", type=str, default='insert', choices=['insert', 'load-data'],
+                        help="写入归档表的方式：insert(多行insert)、load-data(LOAD DATA LOCAL INFILE，归档实例需开启local_infile)")
+    parser.add_argument("--verify", action='store_true', help="删除源表数据前比较源表和归档表每批次的行数和校验和")
+    parser.add_argument("--checkpoint-id", type=int, help="断点id（archive_config.id），指定后记录断点，中断后下次从断点继续")
+    parser.add_argument("--file-dir", type=str, help="归档到文件的目录，指定后不写归档表")
+    parser.add_argument("--compress", type=str, default='gzip', choices=['gzip', 'zstd'], help="归档文件压缩格式")
+    parser.add_argument("--file-size", type=int, default=256, help="单个归档文件压缩前的大小上限（MB）")
+    parser.add_argument("--time-column", type=str, help="时间字段，manifest中记录每个文件的时间范围")
+    args = parser.parse_args()
+
+    # 处理参数
+    if args.version:
+        print(__doc__)
+        sys.exit()
+
+    dct = {}
+    try:
+        source_host, source_port = args.source.split(':')
+        dct['source_host'] = source_host
+        dct['source_port'] = int(source_port)
+    except Exception as e:
+        print("无效参数：-S")
+        sys.exit(1)
+
+    if args.file_dir:
+        dct['target_host'] = None
+        dct['target_port'] = None
+    else:
+        try:
+            target_host, target_port = args.target.split(':')
+            dct['target_host'] = target_host
+            dct['target_port'] = int(target_port)
+        except Exception as e:
+            print("无效参数：-T")
+            sys.exit(1)
+
+    # db
+    db_list = args.database.split(':')
+    if len(db_list) == 2:
+        dct['source_db'] = db_list[0]
+        dct['target_db'] = db_list[1]
+    else:
+        dct['source_db'] = db_list[0]
+        dct['target_db'] = db_list[0]
+
+    # table
+    tb_list = args.table.split(':')
+    if len(tb_list) == 2:
+        dct['source_table'] = tb_list[0]
+        dct['target_table'] = tb_list[1]
+    else:
+        dct['source_table'] = tb_list[0]
+        dct['target_table'] = tb_list[0]
+
+    dct['where'] = args.where
+    dct['charset'] = args.charset
+    dct['user'] = args.user
+    dct['password'] = args.password
+    dct['limit'] = args.limit
+    dct['min_limit'] = min(args.min_limit, args.limit)
+    dct['max_limit'] = max(args.max_limit, args.limit)
+    dct['txn_target'] = args.txn_target
+    try:
+        dct['replicas'] = parse_hosts(args.replicas)
+    except Exception as e:
+        print("无效参数：--replicas")
+        sys.exit(1)
+    dct['max_lag'] = args.max_lag
+    dct['max_threads_running'] = args.max_threads_running
+    dct['check_interval'] = args.check_interval
+    dct['writer'] = args.writer
+    dct['verify'] = args.verify
+    dct['checkpoint_id'] = args.checkpoint_id
+    dct['file_dir'] = args.file_dir
+    dct['compress'] = args.compress
+    dct['file_size'] = args.file_size
+    dct['time_column'] = args.time_column
+    dct['progress'] = args.progress
+    dct['parallel'] = max(args.parallel, 1)
+
+    return dct
+
+
+class ArchiveStats:
+    "归档统计信息（线程安全），输出格式与pt-archiver --statistics保持一致"
+
+    ACTIONS = ['select', 'inserting', 'verify', 'deleting', 'commit', 'throttle']
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.end_time = None
+        self.rows = {'SELECT': 0, 'INSERT': 0, 'DELETE': 0}
+        self.actions = {i: [0, 0.0] for i in self.ACTIONS}
+
+    def add_rows(self, name, cnt):
+        "累加行数"
+        with self.lock:
+            self.rows[name] += cnt
+
+    def add_action(self, action, seconds, count=1):
+        "累加动作耗时"
+        with self.lock:
+            self.actions[action][0] += count
+            self.actions[action][1] += seconds
+
+    def action_line(self, action):
+        "一个动作的统计行"
+        total = (self.end_time or time.time()) - self.start_time
+        cnt, seconds = self.actions[action]
+        pct = seconds / total * 100 if total > 0 else 0
+        return "{:<10} {:>10} {:>12.4f} {:>8.2f}".format(action, cnt, seconds, pct)
+
+    def report(self, source_dsn, dest_dsn):
+        "生成统计报告"
+        self.end_time = self.end_time or time.time()
+        total = self.end_time - self.start_time
+        lines = ["Started at {}, ended at {}".format(
+            time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.start_time)),
+            time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.end_time))),
+            "Source: {}".format(source_dsn),
+            "Dest:   {}".format(dest_dsn)]
+        for name in ['SELECT', 'INSERT', 'DELETE']:
+            lines.append("{} {}".format(name, self.rows[name]))
+        lines.append("{:<10} {:>10} {:>12} {:>8}".format('Action', 'Count', 'Time', 'Pct'))
+        for action in self.ACTIONS:
+            lines.append(self.action_line(action))
+        return "\n".join(lines)
+
+
+class ChunkSizer:
+    "自适应批次大小：根据select、insert、delete每行耗时的滑动平均，调整批次行数使最慢阶段的事务耗时接近目标值"
+
+    def __init__(self, limit, min_limit, max_limit, target_ms):
+        self.lock = threading.Lock()
+        self.limit = limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_seconds = target_ms / 1000.0
+        self.row_seconds = {}  # 各阶段每行耗时
+
+    def feedback(self, stage, rows, seconds):
+        "反馈某个阶段一个批次的耗时，重新计算批次大小"
+        if self.target_seconds <= 0 or rows <= 0:
+            return
+        with self.lock:
+            per_row = seconds / rows
+            old = self.row_seconds.get(stage)
+            self.row_seconds[stage] = per_row if old is None else old * 0.7 + per_row * 0.3
+            slowest = max(self.row_seconds.values())
+            if slowest <= 0:
+                return
+            new_limit = int(self.target_seconds / slowest)
+            new_limit = max(min(new_limit, self.limit * 2), self.limit // 2)  # 每次最多翻倍或减半，避免抖动
+            new_limit = max(self.min_limit, min(self.max_limit, new_limit))
+            if new_limit != self.limit:
+                logging.debug("批次大小调整：{} -> {}，各阶段每行耗时：{}".format(self.limit, new_limit, self.row_seconds))
+                self.limit = new_limit
+
+
+class InsertWriter:
+    "多行insert写入归档表"
+
+    def __init__(self, o):
+        self.conn = util.mysql(o.target_conf, mode='list')
+        fields = ','.join(['`{}`'.format(i) for i in o.columns])
+        values = ','.join(['%s' for i in o.columns])
+        self.sql = "insert into `{}`.`{}`({}) values({})".format(o.target_db, o.target_table, fields, values)
+        self.replace_sql = "replace into `{}`.`{}`({}) values({})".format(o.target_db, o.target_table, fields, values)
+
+    def write(self, rows, replace=False):
+        "写入一批行并提交，replace=True时替换已存在的行，返回(写入耗时, 提交耗时, 替换的行数)"
+        ts = time.time()
+        cur = self.conn.conn.cursor()
+        cnt = cur.executemany(self.replace_sql if replace else self.sql, rows)  # pymysql会将executemany改写为多行insert
+        cur.close()
+        ts2 = time.time()
+        self.conn.conn.commit()
+        return ts2 - ts, time.time() - ts2, cnt - len(rows) if replace else 0  # replace每替换一行影响行数为2
+
+    def close(self):
+        "关闭"
+        self.conn.close()
+
+
+class LoadDataWriter:
+    "LOAD DATA LOCAL INFILE写入归档表：批次编码为TSV后通过命名管道流式导入，二进制字段以十六进制传输"
+
+    def __init__(self, o):
+        self.conn = util.mysql(o.target_conf, mode='list')
+        self.table_name = "`{}`.`{}`".format(o.target_db, o.target_table)
+        self.columns = o.columns
+        self.charset = o.charset
+        self.binary_flags = [o.column_types.get(i) in archive_file.BINARY_TYPES for i in o.columns]
+        self.binary_fields = [i for i, b in zip(o.columns, self.binary_flags) if b]
+
+    def write(self, rows, replace=False):
+        "写入一批行并提交，replace=True时替换已存在的行，返回(写入耗时, 提交耗时, 替换的行数)"
+        ts = time.time()
+        lines = (archive_file.encode_row(i, self.charset, self.binary_flags) for i in rows)
+        try:
+            cnt = util.load_data_stream(self.conn, self.table_name, self.columns, lines, self.charset,
+                                        self.binary_fields, replace)
+            # LOCAL模式下主键冲突、数据转换错误只产生警告，行数不一致时回滚，避免删除未归档的数据
+            if cnt != len(rows) and not (replace and cnt > len(rows)):
+                raise RuntimeError("LOAD DATA导入行数不一致：{}/{}，可能存在主键冲突".format(cnt, len(rows)))
+        except Exception:
+            self.conn.conn.rollback()
+            raise
+        ts2 = time.time()
+        self.conn.conn.commit()
+        return ts2 - ts, time.time() - ts2, cnt - len(rows)
+
+    def close(self):
+        "关闭"
+        self.conn.close()
+
+
+class FileWriter:
+    "写入压缩分块文件"
+
+    def __init__(self, o, manifest, index):
+        prefix = "{}_{}_{}".format(time.strftime('%Y%m%d_%H%M%S', time.localtime(o.stats.start_time)), os.getpid(),
+                                   index)
+        self.writer = archive_file.ChunkFileWriter(manifest, prefix, o.columns, o.pk_columns, o.column_types,
+                                                   o.charset, o.compress, o.file_size * 1024 * 1024, o.time_column)
+
+    def write(self, rows, replace=False):
+        "写入一批行并刷新到磁盘，返回(写入耗时, 0, 0)，文件中重复的行由restore.py导入时忽略"
+        ts = time.time()
+        self.writer.write_rows(rows)
+        return time.time() - ts, 0, 0
+
+    def close(self):
+        "关闭当前分块，写入manifest"
+        self.writer.close()
+
+
+class NativeArchiver:
+    "原生归档引擎"
+
+    def __init__(self, conf):
+        self.source_host = conf['source_host']
+        self.source_port = conf['source_port']
+        self.source_db = conf['source_db']
+        self.source_table = conf['source_table']
+        self.target_host = conf['target_host']
+        self.target_port = conf['target_port']
+        self.target_db = conf['target_db']
+        self.target_table = conf['target_table']
+        self.user = conf['user']
+        self.password = conf['password']
+        self.charset = conf['charset']
+        self.where = expr_to_date(conf['where'])
+        self.limit = conf['limit']
+        self.min_limit = conf['min_limit']
+        self.max_limit = conf['max_limit']
+        self.txn_target = conf['txn_target']
+        self.writer = conf['writer']
+        self.verify = conf['verify']
+        self.checkpoint = None
+        self.resumed = False  # 是否从断点继续
+        if conf['checkpoint_id']:
+            # 断点按源表和未展开的归档条件区分（{{TODAY}}每天展开的值不同，暂停的任务第二天仍从断点继续）
+            self.checkpoint = Checkpoint(conf['checkpoint_id'], lambda: util.mysql(settings.CONFIG_DB, mode='list'),
+                                         getattr(settings, 'CHECKPOINT_FLUSH_SECONDS', 10),
+                                         '{}.{}:{}'.format(self.source_db, self.source_table, conf['where']))
+        self.file_dir = conf['file_dir']
+        self.compress = conf['compress']
+        self.file_size = conf['file_size']
+        self.time_column = conf['time_column']
+        self.manifest = None
+        self.progress = conf['progress']
+        self.parallel = conf['parallel']
+        self.source_conf = {"host": self.source_host, "port": self.source_port, "db": self.source_db, 'user': self.user,
+                            "password": self.password, "charset": self.charset}
+        self.target_conf = {"host": self.target_host, "port": self.target_port, "db": self.target_db, 'user': self.user,
+                            "password": self.password, "charset": self.charset}
+        if self.writer == 'load-data':
+            self.target_conf['local_infile'] = True
+        replica_confs = [{"host": host, "port": port, 'user': self.user, "password": self.password}
+                         for host, port in conf['replicas']]
+        self.throttler = Throttler(self.source_conf, replica_confs, conf['max_lag'], conf['max_threads_running'],
+                                   conf['check_interval'])
+        self.pk_columns = []
+        self.columns = []
+        self.stats = ArchiveStats()
+        self.stop_event = threading.Event()
+        self.pause_event = threading.Event()  # 停止读取：暂停或出现异常时设置
+        self.progress_lock = threading.Lock()
+        self.next_progress = self.progress
+        self.throttle_printed = (0, 0.0)  # 上次输出的限流统计
+        self.throttle_print_ts = 0
+        self.errors = []
+        self.status = 'begin'
+
+    def __str__(self):
+        return str(self.__dict__)
+
+    def get_table_meta(self):
+        "获取主键和字段信息"
+        conn = util.mysql(self.source_conf)
+        sql = """select column_name cname from information_schema.KEY_COLUMN_USAGE where table_schema='{}' and table_name='{}' and constraint_name='PRIMARY' order by ordinal_position""".format(
+            self.source_db, self.source_table)
+        self.pk_columns = [i['cname'] for i in conn.query(sql)]
+        sql = """select column_name cname,data_type ctype from information_schema.COLUMNS where table_schema='{}' and table_name='{}' order by ordinal_position""".format(
+            self.source_db, self.source_table)
+        res = conn.query(sql)
+        self.columns = [i['cname'] for i in res]
+        self.column_types = {i['cname']: i['ctype'] for i in res}
+        conn.close()
+        if not self.columns:
+            logging.error("源表不存在：{}.{}".format(self.source_db, self.source_table))
+            sys.exit(1)
+        if not self.pk_columns:
+            logging.error("源表没有主键，不支持原生归档：{}.{}".format(self.source_db, self.source_table))
+            sys.exit(1)
+        self.pk_index = [self.columns.index(i) for i in self.pk_columns]
+
+    def pk_text(self):
+        "主键字段（单列或行构造器）"
+        text = ','.join(['`{}`'.format(i) for i in self.pk_columns])
+        if len(self.pk_columns) > 1:
+            text = '({})'.format(text)
+        return text
+
+    def pk_placeholder(self):
+        "主键占位符"
+        text = ','.join(['%s' for i in self.pk_columns])
+        if len(self.pk_columns) > 1:
+            text = '({})'.format(text)
+        return text
+
+    def pk_of(self, row):
+        "取行的主键值"
+        return tuple(row[i] for i in self.pk_index)
+
+    def range_where(self, key_range):
+        "主键范围条件（按主键第一列拆分，左闭右开）"
+        lower, upper = key_range
+        text = ""
+        if lower is not None:
+            text += " and `{}` >= %s".format(self.pk_columns[0])
+        if upper is not None:
+            text += " and `{}` < %s".format(self.pk_columns[0])
+        return text
+
+    @staticmethod
+    def range_args(key_range):
+        "主键范围条件的参数"
+        return [i for i in key_range if i is not None]
+
+    def split_ranges(self):
+        "按主键第一列把源表拆分成N个互不重叠的范围：整数主键按min/max等分，其它类型沿主键索引每隔table_rows/N行取一个切分点"
+        if self.parallel <= 1:
+            return [(None, None)]
+        pk = self.pk_columns[0]
+        conn = util.mysql(self.source_conf, mode='list')
+        try:
+            if self.column_types[pk] in ['tinyint', 'smallint', 'mediumint', 'int', 'bigint']:
+                sql = "select min(`{0}`),max(`{0}`) from `{1}`.`{2}` where ({3})".format(
+                    pk, self.source_db, self.source_table, self.where)
+                min_pk, max_pk = conn.query(sql)[0]
+                if min_pk is None:
+                    return [(None, None)]
+                step = (max_pk - min_pk) // self.parallel + 1
+                points = [min_pk + step * i for i in range(1, self.parallel) if min_pk + step * i <= max_pk]
+            else:
+                sql = "select table_rows from information_schema.TABLES where table_schema='{}' and table_name='{}'".format(
+                    self.source_db, self.source_table)
+                table_rows = conn.query(sql)[0][0] or 0
+                step = table_rows // self.parallel
+                points = []
+                # 从上一个切分点开始每次向后跳过step行，整个主键索引只扫描一次，不再每个切分点都从头offset
+                for i in range(1, self.parallel):
+                    if step == 0:
+                        break
+                    if points:
+                        sql = "select `{0}` from `{1}`.`{2}` force index(`PRIMARY`) where `{0}` > %s order by `{0}` limit 1 offset {3}".format(
+                            pk, self.source_db, self.source_table, step - 1)
+                        res = conn.query(sql, (points[-1],))
+                    else:
+                        sql = "select `{0}` from `{1}`.`{2}` force index(`PRIMARY`) order by `{0}` limit 1 offset {3}".format(
+                            pk, self.source_db, self.source_table, step)
+                        res = conn.query(sql)
+                    if not res:
+                        break
+                    points.append(res[0][0])
+        finally:
+            conn.close()
+        bounds = [None] + points + [None]
+        return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+
+    def build_select_sql(self, key_range, has_last_pk):
+        "生成按主键分页的查询语句"
+        fields = ','.join(['`{}`'.format(i) for i in self.columns])
+        order_by = ','.join(['`{}`'.format(i) for i in self.pk_columns])
+        where = "({})".format(self.where.replace('%', '%%')) + self.range_where(key_range)  # 条件中的%需要转义
+        if has_last_pk:
+            where += " and {} > {}".format(self.pk_text(), self.pk_placeholder())
+        return "select {} from `{}`.`{}` force index(`PRIMARY`) where {} order by {} limit %s".format(
+            fields, self.source_db, self.source_table, where, order_by)
+
+    def put(self, q, item):
+        "放入队列，下游异常退出时不阻塞"
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self, q):
+        "从队列取数据，出现异常时返回None"
+        while not self.stop_event.is_set():
+            try:
+                return q.get(timeout=1)
+            except queue.Empty:
+                continue
+        return None
+
+    def fail(self, e):
+        "记录异常并通知其它线程退出"
+        self.errors.append(e)
+        self.stop_event.set()
+        self.pause_event.set()
+        logging.error(e, exc_info=True)
+
+    def pause(self, signum=None, frame=None):
+        "暂停：读取线程停止读取，写入、删除线程处理完已读取的批次后退出"
+        if not self.pause_event.is_set():
+            logging.info("收到暂停信号，处理完已读取的批次后退出")
+        self.pause_event.set()
+
+    def read_job(self, insert_queue, key_range, sizer, start_pk=None):
+        "读取线程：按主键分页读取源表，start_pk为断点（从断点之后开始读取）"
+        conn = None
+        try:
+            conn = util.mysql(self.source_conf, mode='list')
+            conn.conn.autocommit(True)  # 每批读取不持有长事务快照
+            last_pk = start_pk
+            range_args = self.range_args(key_range)
+            while not self.pause_event.is_set():
+                throttle_seconds = self.throttler.wait(self.pause_event, self.on_throttle)
+                if throttle_seconds > 0:
+                    self.stats.add_action('throttle', 0)  # 暂停时间已在on_throttle中累加，这里只计次数
+                    self.print_throttle()
+                limit = sizer.limit
+                ts = time.time()
+                if last_pk is None:
+                    rows = conn.query(self.build_select_sql(key_range, False), range_args + [limit])
+                else:
+                    rows = conn.query(self.build_select_sql(key_range, True),
+                                      range_args + list(last_pk) + [limit])
+                seconds = time.time() - ts
+                self.stats.add_action('select', seconds)
+                sizer.feedback('select', len(rows), seconds)
+                if not rows:
+                    break
+                self.stats.add_rows('SELECT', len(rows))
+                last_pk = self.pk_of(rows[-1])
+                if not self.put(insert_queue, rows):
+                    break
+                self.check_progress()
+                if len(rows) < limit:
+                    break
+        except Exception as e:
+            self.fail(e)
+        finally:
+            self.put(insert_queue, None)
+            if conn:
+                conn.close()
+
+    def create_writer(self, index):
+        "创建写入器：归档表或压缩分块文件"
+        if self.file_dir:
+            return FileWriter(self, self.manifest, index)
+        if self.writer == 'load-data':
+            return LoadDataWriter(self)
+        return InsertWriter(self)
+
+    def insert_job(self, insert_queue, delete_queue, sizer, index):
+        "写入线程：写入归档表（或归档文件），提交后交给删除线程"
+        writer = None
+        # 进程被kill时，断点之后可能有已写入归档表、未删除源表的行，从断点继续时先用replace写入，
+        # 直到某个批次出现新插入的行（按主键顺序写入，之后的行都未写入过），再改为insert
+        replace = self.resumed
+        replaced_rows = 0
+        try:
+            writer = self.create_writer(index)
+            while True:
+                rows = self.get(insert_queue)
+                if rows is None:
+                    break
+                write_seconds, commit_seconds, replaced = writer.write(rows, replace)
+                if replace:
+                    replaced_rows += replaced
+                    if replaced < len(rows):
+                        replace = False
+                        logging.info("主键范围{}：断点之后已写入归档表的行数：{}，改为insert写入".format(index, replaced_rows))
+                self.stats.add_action('inserting', write_seconds)
+                if commit_seconds:
+                    self.stats.add_action('commit', commit_seconds)
+                sizer.feedback('insert', len(rows), write_seconds + commit_seconds)
+                self.stats.add_rows('INSERT', len(rows))
+                if not self.put(delete_queue, [self.pk_of(i) for i in rows]):
+                    break
+        except Exception as e:
+            self.fail(e)
+        finally:
+            self.put(delete_queue, None)
+            if writer:
+                try:
+                    writer.close()
+                except Exception as e:
+                    self.fail(e)
+
+    def verify_keys(self, conn, target_conn, pk_list):
+        "在删除事务中锁定源表的行，比较源表和归档表的行数和校验和，不一致时抛出异常"
+        ts = time.time()
+        source = checksum.checksum_keys(conn, "`{}`.`{}`".format(self.source_db, self.source_table), self.columns,
+                                        self.pk_columns, pk_list, self.where, lock=True)
+        target = checksum.checksum_keys(target_conn, "`{}`.`{}`".format(self.target_db, self.target_table),
+                                        self.columns, self.pk_columns, pk_list)
+        target_conn.conn.commit()
+        self.stats.add_action('verify', time.time() - ts)
+        if source != target:
+            raise RuntimeError("源表和归档表数据不一致，主键范围：{} - {}，源端(行数,校验和)：{}，归档表：{}".format(
+                pk_list[0], pk_list[-1], source, target))
+
+    def delete_job(self, delete_queue, sizer, index):
+        "删除线程：归档表提交成功后，按主键删除源表数据"
+        conn = None
+        target_conn = None
+        try:
+            conn = util.mysql(self.source_conf, mode='list')
+            if self.verify and not self.file_dir:
+                target_conn = util.mysql(self.target_conf, mode='list')
+            while True:
+                pk_list = self.get(delete_queue)
+                if pk_list is None:
+                    break
+                if target_conn:
+                    try:
+                        self.verify_keys(conn, target_conn, pk_list)
+                    except Exception:
+                        conn.conn.rollback()
+                        raise
+                in_text = ','.join([self.pk_placeholder() for i in pk_list])
+                sql = "delete from `{}`.`{}` where {} in ({}) and ({})".format(
+                    self.source_db, self.source_table, self.pk_text(), in_text, self.where.replace('%', '%%'))
+                args = [v for pk in pk_list for v in pk]
+                ts = time.time()
+                cur = conn.conn.cursor()
+                cnt = cur.execute(sql, args)
+                cur.close()
+                ts2 = time.time()
+                self.stats.add_action('deleting', ts2 - ts)
+                conn.conn.commit()
+                self.stats.add_action('commit', time.time() - ts2)
+                sizer.feedback('delete', len(pk_list), time.time() - ts)
+                self.stats.add_rows('DELETE', cnt)
+                if self.checkpoint:
+                    self.checkpoint.update(index, pk_list[-1], cnt)
+        except Exception as e:
+            self.fail(e)
+        finally:
+            if conn:
+                conn.close()
+            if target_conn:
+                target_conn.close()
+
+    def check_progress(self):
+        "达到进度行数时输出进度"
+        if not self.progress:
+            return
+        with self.progress_lock:
+            if self.stats.rows['SELECT'] >= self.next_progress:
+                self.print_progress()
+                self.next_progress = (self.stats.rows['SELECT'] // self.progress + 1) * self.progress
+        self.print_throttle()
+
+    def on_throttle(self, seconds):
+        "限流暂停期间的回调：累加暂停时间，按间隔输出限流统计"
+        self.stats.add_action('throttle', seconds, count=0)
+        self.print_throttle()
+
+    def print_throttle(self):
+        "限流统计有变化时输出一行（格式与--statistics的Action行相同，供调度进程实时解析），最多每10秒一次"
+        with self.progress_lock:
+            current = tuple(self.stats.actions['throttle'])
+            if current == self.throttle_printed or time.time() - self.throttle_print_ts < 10:
+                return
+            self.throttle_printed = current
+            self.throttle_print_ts = time.time()
+            print(self.stats.action_line('throttle'), flush=True)
+
+    def print_progress(self):
+        "输出进度，格式与pt-archiver --progress保持一致"
+        elapsed = int(time.time() - self.stats.start_time)
+        print("{:<19} {:>7} {:>7}".format(time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime()), elapsed,
+                                          self.stats.rows['SELECT']), flush=True)
+
+    def dsn(self, host, port, db, table):
+        "生成不含密码的dsn"
+        return "A={},D={},P={},h={},t={}".format(self.charset, db, port, host, table)
+
+    def init_manifest(self):
+        "初始化归档目录的manifest，补录上次异常退出时未关闭的分块"
+        if not os.path.exists(self.file_dir):
+            os.makedirs(self.file_dir)
+        self.manifest = archive_file.ChunkManifest(self.file_dir)
+        recovered = self.manifest.recover_orphans()
+        if recovered:
+            logging.info("补录未关闭的归档文件：{}".format(recovered))
+        self.manifest.init_table({'source': "{}:{}".format(self.source_host, self.source_port),
+                                  'db': self.source_db, 'table': self.source_table, 'columns': self.columns,
+                                  'column_types': self.column_types, 'pk_columns': self.pk_columns,
+                                  'time_column': self.time_column, 'charset': self.charset,
+                                  'compress': self.compress})
+
+    def init_ranges(self):
+        "获取主键范围和每个范围的起始主键：存在断点时从断点继续，否则重新拆分"
+        if self.checkpoint and any([self.column_types[i] in archive_file.BINARY_TYPES for i in self.pk_columns]):
+            logging.warning("二进制类型的主键不支持断点")
+            self.checkpoint = None
+        if self.checkpoint:
+            try:
+                if self.checkpoint.load():
+                    logging.info("从断点继续：{}".format(self.checkpoint))
+                    self.resumed = True
+                    return self.checkpoint.key_ranges, self.checkpoint.last_pk
+            except Exception as e:
+                logging.warning("读取断点报错，从头开始归档：{}".format(e))
+            self.resumed = self.checkpoint.stale  # 丢弃的断点之后也可能有已写入归档表、未删除源表的行
+        key_ranges = self.split_ranges()
+        logging.info("主键范围拆分为{}段：{}".format(len(key_ranges), key_ranges))
+        if self.checkpoint:
+            self.checkpoint.init(key_ranges)
+        return key_ranges, [None] * len(key_ranges)
+
+    def run(self):
+        "运行"
+        self.get_table_meta()
+        logging.info("主键：{}，条件：{}".format(self.pk_columns, self.where))
+        if self.time_column and self.time_column not in self.columns:
+            logging.error("时间字段不存在：{}".format(self.time_column))
+            sys.exit(1)
+        if self.file_dir:
+            self.init_manifest()
+        key_ranges, start_pks = self.init_ranges()
+        print("{:<19} {:>7} {:>7}".format('TIME', 'ELAPSED', 'COUNT'), flush=True)
+        self.print_progress()
+
+        # 每个主键范围一条流水线，队列长度限制内存占用，同时允许读取、写入、删除三个阶段重叠执行
+        threads = []
+        sizers = []
+        for i, (key_range, start_pk) in enumerate(zip(key_ranges, start_pks)):
+            insert_queue = queue.Queue(maxsize=2)
+            delete_queue = queue.Queue(maxsize=2)
+            sizer = ChunkSizer(self.limit, self.min_limit, self.max_limit, self.txn_target)
+            sizers.append(sizer)
+            threads += [threading.Thread(name='Reader-{}'.format(i), target=self.read_job,
+                                         args=(insert_queue, key_range, sizer, start_pk)),
+                        threading.Thread(name='Inserter-{}'.format(i), target=self.insert_job,
+                                         args=(insert_queue, delete_queue, sizer, i)),
+                        threading.Thread(name='Deleter-{}'.format(i), target=self.delete_job,
+                                         args=(delete_queue, sizer, i))]
+        self.throttler.start()
+        [i.start() for i in threads]
+        [i.join() for i in threads]
+        self.throttler.stop()
+
+        self.stats.end_time = time.time()
+        self.print_progress()
+        logging.info("最终批次大小：{}".format([i.limit for i in sizers]))
+        if self.file_dir:
+            dest_dsn = "file={}".format(self.file_dir)
+        else:
+            dest_dsn = self.dsn(self.target_host, self.target_port, self.target_db, self.target_table)
+        print(self.stats.report(self.dsn(self.source_host, self.source_port, self.source_db, self.source_table),
+                                dest_dsn), flush=True)
+        if self.errors:
+            self.status = 'done & error'
+        elif self.pause_event.is_set():
+            self.status = 'paused'
+            logging.info("归档已暂停")
+        else:
+            self.status = 'done & ok'
+        if self.checkpoint:
+            try:
+                if self.status == 'done & ok':
+                    self.checkpoint.clear()
+                else:
+                    self.checkpoint.flush(force=True)
+                    logging.info("已记录断点：{}".format(self.checkpoint))
+            except Exception as e:
+                logging.warning("更新断点报错：{}".format(e))
+
+
+# main
+if __name__ == "__main__":
+    set_log_level()
+    args = get_args()
+    o = NativeArchiver(args)
+    signal.signal(signal.SIGTERM, o.pause)
+    o.run()
+    if o.status not in ['done & ok', 'paused']:
+        sys.exit(1)
@@ -0,0 +1,167 @@
+#!/bin/python3
+# -*- encoding: utf-8 -*-
+"""
+####################################################################################################
+#  Name        :  orchestrator.py
+#  Author      :  Elison
+#  Email       :  Ly99@qq.com
+#  Description :  asyncio执行核心：一个事件循环管理所有任务的子进程，异步读取输出，configdb读写放到线程池，
+#                 并发数由参数限制，不再每个任务占用一个线程
+#  Updates     :
+#      Version     When            What
+#      --------    -----------     -----------------------------------------------------------------
+#      v1.0        2026-10-18
+#      v1.1        2026-10-18      执行命令报错时记录为exit_code=-1，保证调用finish
+#      v1.2        2026-10-18      输出行超过STREAM_LIMIT时分块读取写入日志，不再中断任务
+####################################################################################################
+"""
+import asyncio
+import codecs
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+STREAM_LIMIT = 1024 * 1024  # 单行输出的长度上限，超过时分块读取
+
+
+class ProcessHandle:
+    "asyncio子进程的Popen兼容接口（poll、send_signal），供ArchiveTask.request_stop使用"
+
+    def __init__(self, process):
+        self.process = process
+
+    def poll(self):
+        return self.process.returncode
+
+    def send_signal(self, sig):
+        self.process.send_signal(sig)
+
+
+async def run_command_async(command, logfile, line_callback=None, on_start=None):
+    "与util.run_command相同：运行命令，逐行写入日志文件并回调，on_start在进程启动后回调（参数为ProcessHandle）"
+    with open(logfile, 'w') as f:  # 先打开日志文件，打开失败时不启动子进程
+        process = await asyncio.create_subprocess_exec('/bin/sh', '-c', command, stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.STDOUT, env={'LANG': 'en_US.UTF-8'},
+                                                       limit=STREAM_LIMIT)
+        if on_start is not None:
+            on_start(ProcessHandle(process))
+        decoder = codecs.getincrementaldecoder('utf8')(errors='replace')  # 超长行分块读取时不截断多字节字符
+        long_line = False  # 正在分块读取超过STREAM_LIMIT的行，超长行只写入日志，不回调
+        while True:
+            try:
+                line = await process.stdout.readuntil(b'\n')
+                is_chunk = False
+            except asyncio.IncompleteReadError as e:
+                line = e.partial  # 最后一行没有换行符，或已到达输出末尾
+                is_chunk = False
+            except asyncio.LimitOverrunError:
+                line = await process.stdout.read(STREAM_LIMIT)
+                is_chunk = True
+            if not line:
+                break
+            text = decoder.decode(line)
+            f.write(text)
+            f.flush()
+            if is_chunk:
+                if not long_line:
+                    logging.warning('输出行超过{}字节，分块写入日志：{}'.format(STREAM_LIMIT, logfile))
+                long_line = not line.endswith(b'\n')
+                continue
+            if long_line:  # 超长行的最后一块
+                long_line = False
+                continue
+            if line_callback is not None:
+                try:
+                    line_callback(text)
+                except Exception:
+                    logging.warning('处理输出行报错：{}'.format(text.rstrip()), exc_info=True)
+        f.write(decoder.decode(b'', final=True))
+    return await process.wait()
+
+
+class AsyncOrchestrator:
+    "从执行队列取任务，在事件循环中执行，同时执行的任务数不超过parallel"
+
+    def __init__(self, job_queue, stop_token, parallel, db_threads=8, on_start=None, on_done=None):
+        self.job_queue = job_queue  # scheduler.SlotDispatcher
+        self.stop_token = stop_token
+        self.parallel = parallel
+        self.db_threads = db_threads
+        self.on_start = on_start  # 任务开始、结束的回调（登记执行中的任务）
+        self.on_done = on_done
+        self.loop = None
+        self.db_pool = None
+
+    def __str__(self):
+        return str({'parallel': self.parallel, 'db_threads': self.db_threads})
+
+    def run(self):
+        "运行事件循环，收到stop_token后等待执行中的任务结束再返回"
+        asyncio.run(self.main())
+
+    async def run_db(self, func, *args):
+        "在线程池中执行阻塞的configdb读写"
+        return await self.loop.run_in_executor(self.db_pool, functools.partial(func, *args))
+
+    async def main(self):
+        self.loop = asyncio.get_running_loop()
+        self.db_pool = ThreadPoolExecutor(max_workers=self.db_threads, thread_name_prefix='AsyncDB')
+        queue_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='AsyncQueue')  # 阻塞等待执行队列
+        semaphore = asyncio.Semaphore(self.parallel)
+        running = set()
+        try:
+            while True:
+                await semaphore.acquire()
+                obj = await self.loop.run_in_executor(queue_pool, self.job_queue.get)
+                if obj == self.stop_token:
+                    semaphore.release()
+                    break
+                task = self.loop.create_task(self.run_task(obj, semaphore))
+                running.add(task)
+                task.add_done_callback(running.discard)
+            if running:
+                logging.info('等待{}个执行中的任务结束'.format(len(running)))
+                await asyncio.gather(*running, return_exceptions=True)
+        finally:
+            queue_pool.shutdown(wait=False)
+            self.db_pool.shutdown(wait=True)
+
+    async def run_task(self, obj, semaphore):
+        "执行一个任务，结束后释放实例并发和并发数"
+        try:
+            if self.on_start:
+                self.on_start(obj)
+            await self.execute(obj)
+        except Exception:
+            logging.error(obj, exc_info=True)
+        finally:
+            if self.on_done:
+                self.on_done(obj)
+            self.job_queue.done(obj)
+            semaphore.release()
+
+    async def flush_stats(self, stats):
+        "按间隔在线程池中写入统计信息，不阻塞事件循环"
+        while True:
+            await asyncio.sleep(stats.flush_seconds)
+            await self.run_db(stats.flush)
+
+    async def execute(self, task):
+        "与ArchiveTask.start相同：检查、执行命令、记录结果，窗口关闭时通知任务停止"
+        if not await self.run_db(task.begin):
+            return
+        timer = None
+        flusher = self.loop.create_task(self.flush_stats(task.stats))
+        exit_code = -1  # 执行命令报错时记录为失败，保证调用finish
+        try:
+            seconds = task.get_window_close_seconds()
+            timer = self.loop.call_later(seconds, task.request_stop) if seconds is not None else None
+            exit_code = await run_command_async(task.get_run_cmd(), task.logfile, task.stats.update,
+                                                task.set_process)
+        except Exception:
+            logging.error("执行命令报错：[task_id:{}]".format(task.id), exc_info=True)
+        finally:
+            if timer:
+                timer.cancel()
+            flusher.cancel()
+        await self.run_db(task.finish, exit_code)
@@ -0,0 +1,98 @@
+#!/bin/python3
+# -*- encoding: utf-8 -*-
+"""
+####################################################################################################
+#  Name        :  planner.py
+#  Author      :  Elison
+#  Email       :  Ly99@qq.com
+#  Description :  归档计划：EXPLAIN归档条件，估算归档行数和扫描行数，选择是否按主键顺序扫描和批次大小
+#  Updates     :
+#      Version     When            What
+#      --------    -----------     -----------------------------------------------------------------
+#      v1.0        2026-10-18
+####################################################################################################
+"""
+import re
+import util
+
+WHERE_REGEX = re.compile(r'--where="(.*)"\s*$', re.S)
+LIMIT_REGEX = re.compile(r'--(limit|txn-size)=\d+')
+NATIVE_LIMIT_REGEX = re.compile(r' -l \d+')
+INDEX_ACCESS_TYPES = ['range', 'ref', 'eq_ref', 'const', 'index_merge']
+
+
+def get_where(archive_cmd):
+    "从归档命令中取出归档条件"
+    res = WHERE_REGEX.search(archive_cmd)
+    return res.group(1) if res else None
+
+
+class ArchivePlanner:
+    "根据EXPLAIN和表统计信息生成归档计划"
+
+    def __init__(self, conf, db, table, where, chunk_size_min=100, chunk_size_max=20000, chunk_bytes=4194304,
+                 no_ascend_ratio=0.5):
+        self.conf = conf
+        self.db = db
+        self.table = table
+        self.where = where
+        self.chunk_size_min = chunk_size_min
+        self.chunk_size_max = chunk_size_max
+        self.chunk_bytes = chunk_bytes  # 每批次的目标数据量
+        self.no_ascend_ratio = no_ascend_ratio  # 走二级索引的扫描行数小于按主键扫描的该比例时，不按主键顺序扫描
+
+    def __str__(self):
+        return str(self.__dict__)
+
+    def explain(self, conn, force_primary=False):
+        "EXPLAIN归档条件，返回(使用的索引, 访问类型, 扫描行数, 估算的匹配行数)"
+        hint = ' force index(`PRIMARY`)' if force_primary else ''
+        sql = "explain select * from `{}`.`{}`{} where {}".format(self.db, self.table, hint, self.where)
+        row = conn.query(sql)[0]
+        rows = int(row.get('rows') or 0)
+        filtered = float(row.get('filtered') or 100)
+        return row.get('key'), row.get('type'), rows, int(rows * filtered / 100)
+
+    def plan(self):
+        "生成归档计划"
+        conn = util.mysql(self.conf)
+        try:
+            sql = "select table_rows,avg_row_length from information_schema.TABLES where table_schema=%s and table_name=%s"
+            res = conn.query(sql, (self.db, self.table))
+            table_rows = int(res[0]['table_rows'] or 0) if res else 0
+            avg_row_length = int(res[0]['avg_row_length'] or 0) if res else 0
+            key, access_type, scan_rows, est_rows = self.explain(conn)
+            pk_scan_rows = self.explain(conn, force_primary=True)[2]
+        finally:
+            conn.close()
+
+        # 优化器选择了二级索引，且扫描行数远小于按主键扫描时，不按主键顺序扫描（pt-archiver --no-ascend）
+        ascend = True
+        if key and key != 'PRIMARY' and access_type in INDEX_ACCESS_TYPES and \
+                scan_rows < pk_scan_rows * self.no_ascend_ratio:
+            ascend = False
+
+        # 按平均行长度计算批次大小，使每批次的数据量接近chunk_bytes
+        chunk_size = None
+        if avg_row_length > 0:
+            chunk_size = max(self.chunk_size_min, min(self.chunk_size_max, self.chunk_bytes // avg_row_length))
+
+        return {'table_rows': table_rows, 'avg_row_length': avg_row_length, 'est_rows': est_rows,
+                'est_key': 'PRIMARY' if ascend else key, 'scan_rows': pk_scan_rows if ascend else scan_rows,
+                'ascend': ascend, 'chunk_size': chunk_size}
+
+    @staticmethod
+    def apply(archive_cmd, plan, native=False):
+        "把归档计划应用到归档命令"
+        if plan['chunk_size']:
+            if native:
+                archive_cmd = NATIVE_LIMIT_REGEX.sub(' -l {}'.format(plan['chunk_size']), archive_cmd, count=1)
+            else:
+                archive_cmd = LIMIT_REGEX.sub(lambda m: '--{}={}'.format(m.group(1), plan['chunk_size']), archive_cmd)
+        if not native:
+            has_no_ascend = ' --no-ascend' in archive_cmd
+            if plan['ascend'] and has_no_ascend:
+                archive_cmd = archive_cmd.replace(' --no-ascend', '', 1)
+            elif not plan['ascend'] and not has_no_ascend:
+                archive_cmd = archive_cmd.replace(' --where=', ' --no-ascend --where=', 1)
+        return archive_cmd
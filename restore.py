@@ -0,0 +1,339 @@
+#!/bin/python3
+# -*- encoding: utf-8 -*-
+"""
+####################################################################################################
+#  Name        :  restore.py
+#  Author      :  Elison
+#  Email       :  Ly99@qq.com
+#  Description :  从archive-to-file-native归档文件恢复数据：按manifest筛选文件，并行LOAD DATA LOCAL INFILE
+#  Updates     :
+#      Version     When            What
+#      --------    -----------     -----------------------------------------------------------------
+#      v1.0        2026-10-18
+#      v1.1        2026-10-18      按时间字段的类型比较时间范围，整数时间字段（unix时间戳）按整数比较
+####################################################################################################
+"""
+import os
+import sys
+import time
+import datetime
+import argparse
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import util
+import settings
+import archive_file
+
+
+def set_log_level(level='info'):
+    "设置日志等级"
+    if level == 'debug':
+        lv = logging.DEBUG
+    else:
+        lv = logging.INFO
+    logging.basicConfig(stream=sys.stdout, level=lv,
+                        format='[%(asctime)s.%(msecs)d] [%(levelname)s] %(funcName)s: %(message)s',
+                        datefmt='%Y-%m-%d %H:%M:%S')
+
+
+def get_args():
+    '获取参数'
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-v", "--version", action='store_true', help="查看版本")
+    parser.add_argument("-S", "--source", type=str, required=True, help="归档前源表所在的实例IP和端口, 如: 10.0.0.201:3306")
+    parser.add_argument("-T", "--target", type=str, required=True, help="恢复到的实例IP和端口, 如: 10.0.0.201:3306")
+    parser.add_argument("-d", "--database", type=str, required=True,
+                        help="源表的数据库名，如：orderdb或orderdb:orderdb_restore(可以使用冒号分别指定源端和目标端db名)")
+    parser.add_argument("-t", "--table", type=str, required=True,
+                        help="源表的表名，如：orders或orders:orders_restore(可以使用冒号分别指定源端和目标端table名)")
+    parser.add_argument("--time-from", type=str,
+                        help="时间字段的开始值（包含），如：2022-01-01 00:00:00，整数时间字段可以使用unix时间戳或时间")
+    parser.add_argument("--time-to", type=str,
+                        help="时间字段的结束值（不包含），如：2022-02-01 00:00:00，整数时间字段可以使用unix时间戳或时间")
+    parser.add_argument("--pk-from", type=str, help="主键第一列的开始值（包含）")
+    parser.add_argument("--pk-to", type=str, help="主键第一列的结束值（不包含）")
+    parser.add_argument("-u", "--user", type=str, default=settings.ARCHIVE_USER, help="用户名")
+    parser.add_argument("-p", "--password", type=str, default=settings.ARCHIVE_PASSWORD, help="密码")
+    parser.add_argument("-P", "--parallel", type=int, default=4, help="并行恢复的文件数")
+    parser.add_argument("-b", "--batch-rows", type=int, default=100000, help="每个LOAD DATA事务的行数")
+    parser.add_argument("--replace", action='store_true', help="主键冲突时替换，默认忽略冲突的行")
+    parser.add_argument("--data-dir", type=str, default='archive_data', help="归档文件根目录")
+    parser.add_argument("--dry-run", action='store_true', help="只列出需要恢复的文件")
+    args = parser.parse_args()
+
+    # 处理参数
+    if args.version:
+        print(__doc__)
+        sys.exit()
+
+    dct = {}
+    try:
+        source_host, source_port = args.source.split(':')
+        dct['source_host'] = source_host
+        dct['source_port'] = int(source_port)
+    except Exception as e:
+        print("无效参数：-S")
+        sys.exit(1)
+
+    try:
+        target_host, target_port = args.target.split(':')
+        dct['target_host'] = target_host
+        dct['target_port'] = int(target_port)
+    except Exception as e:
+        print("无效参数：-T")
+        sys.exit(1)
+
+    # db
+    db_list = args.database.split(':')
+    if len(db_list) == 2:
+        dct['source_db'] = db_list[0]
+        dct['target_db'] = db_list[1]
+    else:
+        dct['source_db'] = db_list[0]
+        dct['target_db'] = db_list[0]
+
+    # table
+    tb_list = args.table.split(':')
+    if len(tb_list) == 2:
+        dct['source_table'] = tb_list[0]
+        dct['target_table'] = tb_list[1]
+    else:
+        dct['source_table'] = tb_list[0]
+        dct['target_table'] = tb_list[0]
+
+    dct['time_from'] = args.time_from
+    dct['time_to'] = args.time_to
+    dct['pk_from'] = args.pk_from
+    dct['pk_to'] = args.pk_to
+    dct['user'] = args.user
+    dct['password'] = args.password
+    dct['parallel'] = max(args.parallel, 1)
+    dct['batch_rows'] = max(args.batch_rows, 1)
+    dct['replace'] = args.replace
+    dct['data_dir'] = args.data_dir
+    dct['dry_run'] = args.dry_run
+
+    return dct
+
+
+class RestoreTable:
+    "从归档文件恢复表数据"
+
+    def __init__(self, conf):
+        self.source_host = conf['source_host']
+        self.source_port = conf['source_port']
+        self.source_db = conf['source_db']
+        self.source_table = conf['source_table']
+        self.target_host = conf['target_host']
+        self.target_port = conf['target_port']
+        self.target_db = conf['target_db']
+        self.target_table = conf['target_table']
+        self.user = conf['user']
+        self.password = conf['password']
+        self.parallel = conf['parallel']
+        self.batch_rows = conf['batch_rows']
+        self.replace = conf['replace']
+        self.dry_run = conf['dry_run']
+        self.dirname = os.path.join(conf['data_dir'], "{}_{}".format(self.source_host, self.source_port),
+                                    "{}.{}".format(self.source_db, self.source_table))
+        self.manifest = None
+        self.time_from = conf['time_from']
+        self.time_to = conf['time_to']
+        self.pk_from = conf['pk_from']
+        self.pk_to = conf['pk_to']
+        self.lock = threading.Lock()
+        self.rows = 0
+        self.status = 'begin'
+
+    def __str__(self):
+        return str(self.__dict__)
+
+    def load_manifest(self):
+        "读取manifest"
+        if not os.path.exists(os.path.join(self.dirname, archive_file.MANIFEST_NAME)):
+            logging.error("归档目录不存在manifest：{}".format(self.dirname))
+            sys.exit(1)
+        self.manifest = archive_file.ChunkManifest(self.dirname)
+        self.columns = self.manifest.data['columns']
+        self.column_types = self.manifest.data.get('column_types', {})
+        self.pk_columns = self.manifest.data['pk_columns']
+        self.time_column = self.manifest.data.get('time_column')
+        self.charset = self.manifest.data.get('charset', 'utf8mb4')
+        if (self.time_from or self.time_to) and not self.time_column:
+            logging.error("归档时没有指定时间字段，不能按时间范围恢复")
+            sys.exit(1)
+        # 时间字段按整数（unix时间戳）比较或字符串比较，manifest没有字段类型时根据记录的值判断
+        if self.time_column in self.column_types:
+            self.time_is_int = self.column_types[self.time_column] in archive_file.INT_TYPES
+        else:
+            self.time_is_int = any([isinstance(i['time_min'], int) for i in self.manifest.chunks()])
+        try:
+            self.time_from = self.to_time_value(self.time_from)
+            self.time_to = self.to_time_value(self.time_to)
+        except ValueError:
+            logging.error("无效的时间范围：{} - {}".format(self.time_from, self.time_to))
+            sys.exit(1)
+        # 主键按整数比较或字符串比较
+        self.pk_is_int = self.column_types.get(self.pk_columns[0]) in archive_file.INT_TYPES
+        if self.pk_is_int:
+            self.pk_from = int(self.pk_from) if self.pk_from is not None else None
+            self.pk_to = int(self.pk_to) if self.pk_to is not None else None
+
+    def to_time_value(self, value):
+        "时间字段的值转换为可比较的类型：整数时间字段转为unix时间戳，其它转为字符串"
+        if value is None:
+            return None
+        if not self.time_is_int:
+            return str(value)
+        if isinstance(value, int) or str(value).lstrip('-').isdigit():
+            return int(value)
+        text = str(value).strip()
+        fmt = '%Y-%m-%d %H:%M:%S' if ' ' in text else '%Y-%m-%d'
+        return int(time.mktime(datetime.datetime.strptime(text, fmt).timetuple()))
+
+    @staticmethod
+    def overlaps(value_min, value_max, value_from, value_to):
+        "[value_min, value_max]和[value_from, value_to)是否有交集"
+        if value_min is None or value_max is None:
+            return value_from is None and value_to is None
+        if value_from is not None and value_max < value_from:
+            return False
+        if value_to is not None and value_min >= value_to:
+            return False
+        return True
+
+    def filter_chunks(self):
+        "根据manifest中每个文件的时间、主键范围筛选需要恢复的文件"
+        chunks = []
+        for i in self.manifest.chunks():
+            if not self.overlaps(self.to_time_value(i['time_min']), self.to_time_value(i['time_max']), self.time_from,
+                                 self.time_to):
+                continue
+            pk_min = i['pk_min'][0] if i['pk_min'] else None
+            pk_max = i['pk_max'][0] if i['pk_max'] else None
+            if not self.overlaps(pk_min, pk_max, self.pk_from, self.pk_to):
+                continue
+            chunks.append(i)
+        return chunks
+
+    def need_row_filter(self, chunk):
+        "文件的范围是否完全在恢复范围内，不在时需要逐行过滤"
+        time_min = self.to_time_value(chunk['time_min'])
+        time_max = self.to_time_value(chunk['time_max'])
+        if self.time_from is not None and (time_min is None or time_min < self.time_from):
+            return True
+        if self.time_to is not None and (time_max is None or time_max >= self.time_to):
+            return True
+        pk_min = chunk['pk_min'][0] if chunk['pk_min'] else None
+        pk_max = chunk['pk_max'][0] if chunk['pk_max'] else None
+        if self.pk_from is not None and (pk_min is None or pk_min < self.pk_from):
+            return True
+        if self.pk_to is not None and (pk_max is None or pk_max >= self.pk_to):
+            return True
+        return False
+
+    def match_line(self, line):
+        "行是否在恢复范围内"
+        values = archive_file.decode_line(line)
+        if self.time_from is not None or self.time_to is not None:
+            value = values[self.columns.index(self.time_column)]
+            if value is None:
+                return False
+            value = self.to_time_value(value.decode('utf8'))
+            if self.time_from is not None and value < self.time_from:
+                return False
+            if self.time_to is not None and value >= self.time_to:
+                return False
+        if self.pk_from is not None or self.pk_to is not None:
+            value = values[self.columns.index(self.pk_columns[0])]
+            value = int(value) if self.pk_is_int else value.decode('utf8')
+            if self.pk_from is not None and value < self.pk_from:
+                return False
+            if self.pk_to is not None and value >= self.pk_to:
+                return False
+        return True
+
+    def read_batches(self, chunk):
+        "流式解压文件，按batch_rows切分成多个批次"
+        row_filter = self.need_row_filter(chunk)
+        with archive_file.open_reader(os.path.join(self.dirname, chunk['file'])) as f:
+            batch = []
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # 截断的最后一行
+                if row_filter and not self.match_line(line):
+                    continue
+                batch.append(line)
+                if len(batch) >= self.batch_rows:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+    def restore_chunk(self, chunk):
+        "恢复一个文件，每个批次一个LOAD DATA事务"
+        conf = {"host": self.target_host, "port": self.target_port, "db": self.target_db, 'user': self.user,
+                "password": self.password, "charset": self.charset, "local_infile": True}
+        binary_fields = [i for i in self.columns if self.column_types.get(i) in archive_file.BINARY_TYPES]
+        table_name = "`{}`.`{}`".format(self.target_db, self.target_table)
+        ts = time.time()
+        rows = 0
+        conn = util.mysql(conf, mode='list')
+        try:
+            for batch in self.read_batches(chunk):
+                cnt = util.load_data_stream(conn, table_name, self.columns, iter(batch), self.charset, binary_fields,
+                                            self.replace)
+                conn.conn.commit()
+                rows += cnt
+        except Exception:
+            conn.conn.rollback()
+            raise
+        finally:
+            conn.close()
+        with self.lock:
+            self.rows += rows
+        logging.info("恢复完成：{}，行数：{}，耗时：{}s".format(chunk['file'], rows, int(time.time() - ts)))
+        return rows
+
+    def run(self):
+        "运行"
+        ts = time.time()
+        self.load_manifest()
+        orphans = self.manifest.orphan_files()
+        if orphans:
+            logging.warning("存在未记录到manifest的文件（归档未正常结束），不会恢复：{}".format(orphans))
+        chunks = self.filter_chunks()
+        logging.info("共{}个文件，需要恢复{}个文件，预计行数：{}".format(len(self.manifest.chunks()), len(chunks),
+                                                         sum([i['rows'] for i in chunks])))
+        if self.dry_run:
+            for i in chunks:
+                print(i)
+            self.status = 'done & ok'
+            return
+
+        errors = []
+        with ThreadPoolExecutor(max_workers=self.parallel) as executor:
+            futures = [(i, executor.submit(self.restore_chunk, i)) for i in chunks]
+            for chunk, future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    errors.append(chunk['file'])
+                    logging.error("恢复失败：{}，{}".format(chunk['file'], e))
+        logging.info("恢复结束，行数：{}，耗时：{}s".format(self.rows, int(time.time() - ts)))
+        if errors:
+            logging.error("恢复失败的文件：{}".format(errors))
+            self.status = 'done & error'
+        else:
+            self.status = 'done & ok'
+
+
+# main
+if __name__ == "__main__":
+    set_log_level()
+    args = get_args()
+    o = RestoreTable(args)
+    o.run()
+    if o.status != 'done & ok':
+        sys.exit(1)
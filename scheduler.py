@@ -0,0 +1,304 @@
+#!/bin/python3
+# -*- encoding: utf-8 -*-
+"""
+####################################################################################################
+#  Name        :  scheduler.py
+#  Author      :  Elison
+#  Email       :  Ly99@qq.com
+#  Description :  任务调度：预编译执行时间窗口，按窗口开启时间组织最小堆
+#  Updates     :
+#      Version     When            What
+#      --------    -----------     -----------------------------------------------------------------
+#      v1.0        2026-10-18
+#      v1.1        2026-10-18      根据预测耗时模拟执行线程，窗口内长任务先执行，预测无法在窗口内完成的任务排到最后
+#      v1.2        2026-10-18      增加TimeWindow.close_time，计算连续窗口的关闭时间
+#      v1.3        2026-10-18      SlotDispatcher增加get_nowait，供调度模拟使用
+#      v1.4        2026-10-18      SlotDispatcher增加tasks，心跳只续租本进程持有的任务
+####################################################################################################
+"""
+import datetime
+import heapq
+import threading
+import functools
+
+
+class TimeWindow:
+    "预编译的执行时间窗口，如：00:00-06:00,22:00-24:00，支持跨零点，如：22:00-02:00"
+
+    def __init__(self, time_window_str):
+        self.text = time_window_str
+        self.ranges = []  # [(开始分钟, 结束分钟)]，结束分钟所在的这一分钟仍在窗口内
+        for i in time_window_str.split(','):
+            start_time, end_time = i.strip().split('-')
+            start = self.to_minutes(start_time)
+            end = self.to_minutes(end_time)
+            if start == 1440:
+                start = 0
+            self.ranges.append((start, end))
+
+    @staticmethod
+    def to_minutes(hhmm):
+        "HH:MM转为一天中的分钟数"
+        hour, minute = hhmm.strip().split(':')
+        hour, minute = int(hour), int(minute)
+        if not (0 <= hour <= 24 and 0 <= minute < 60) or (hour == 24 and minute != 0):
+            raise ValueError("无效的时间：{}".format(hhmm))
+        return hour * 60 + minute
+
+    def __str__(self):
+        return self.text
+
+    def contains(self, dt):
+        "是否在时间窗口内"
+        minutes = dt.hour * 60 + dt.minute
+        for start, end in self.ranges:
+            if start <= end:
+                if start <= minutes <= end:
+                    return True
+            elif minutes >= start or minutes <= end:  # 跨零点
+                return True
+        return False
+
+    def next_open(self, dt):
+        "下一次窗口开启的时间，当前在窗口内时返回dt"
+        if self.contains(dt):
+            return dt
+        midnight = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+        candidates = []
+        for start, end in self.ranges:
+            for day in range(2):
+                open_time = midnight + datetime.timedelta(days=day, minutes=start)
+                if open_time > dt:
+                    candidates.append(open_time)
+        return min(candidates)
+
+    def current_end(self, dt):
+        "dt所在窗口的关闭时间，不在窗口内时返回None"
+        minutes = dt.hour * 60 + dt.minute
+        midnight = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+        ends = []
+        for start, end in self.ranges:
+            end_minutes = min(end + 1, 1440)
+            if start <= end:
+                if start <= minutes <= end:
+                    ends.append(midnight + datetime.timedelta(minutes=end_minutes))
+            elif minutes >= start:
+                ends.append(midnight + datetime.timedelta(days=1, minutes=end_minutes))
+            elif minutes <= end:
+                ends.append(midnight + datetime.timedelta(minutes=end_minutes))
+        if not ends:
+            return None
+        return max(ends)
+
+    def close_time(self, dt):
+        "dt所在的连续窗口（包括首尾相接的窗口，如：22:00-24:00,00:00-06:00）的关闭时间，不在窗口内或全天窗口返回None"
+        end = self.current_end(dt)
+        limit = dt + datetime.timedelta(days=1)
+        while end is not None and end < limit and self.contains(end):
+            end = self.current_end(end)
+        if end is None or end >= limit:
+            return None
+        return end
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_time_window(time_window_str):
+    "编译时间窗口（带缓存），格式错误时抛出ValueError"
+    if not time_window_str:
+        raise ValueError("时间窗口为空")
+    return TimeWindow(time_window_str)
+
+
+def plan_tasks(task_list, parallel, now=None):
+    """按预测耗时(task['predicted_seconds'])模拟parallel个执行线程，返回排好序的任务列表，并设置task['planned_start']：
+    按窗口开启时间、优先级排序，同优先级内预测耗时长的先执行，预测在窗口关闭前无法完成的任务排到最后"""
+    now = now or datetime.datetime.now()
+    items = []
+    for task in task_list:
+        try:
+            window = compile_time_window(task['exec_time_window'])
+            open_time = window.next_open(now)
+        except Exception:
+            window, open_time = None, now
+        items.append((open_time, -(task.get('priority') or 0), -(task.get('predicted_seconds') or 0), window, task))
+    items.sort(key=lambda x: x[:3])
+
+    free_times = [now] * max(parallel, 1)  # 每个执行线程的空闲时间
+    on_time_list = []
+    late_list = []
+    for open_time, _, neg_seconds, window, task in items:
+        start = max(heapq.heappop(free_times), open_time)
+        end = start + datetime.timedelta(seconds=-neg_seconds)
+        window_end = window.current_end(start) if window else None
+        if window and (window_end is None or end > window_end):
+            heapq.heappush(free_times, start)
+            late_list.append((open_time, task))
+            continue
+        task['planned_start'] = start
+        heapq.heappush(free_times, end)
+        on_time_list.append(task)
+    for open_time, task in late_list:
+        start = max(heapq.heappop(free_times), open_time)
+        task['planned_start'] = start
+        heapq.heappush(free_times, start + datetime.timedelta(seconds=task.get('predicted_seconds') or 0))
+    return on_time_list + [i[1] for i in late_list]
+
+
+class TaskScheduler:
+    "事件驱动的任务调度：按窗口开启时间组织最小堆，睡眠到下一个窗口开启，有新任务时立即唤醒"
+
+    def __init__(self):
+        self.heap = []
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.reload_flag = True
+
+    def notify(self, reload=True):
+        "唤醒调度线程，reload=True时重新从configdb加载任务"
+        if reload:
+            self.reload_flag = True
+        self.wakeup.set()
+
+    def need_reload(self):
+        "是否需要重新加载任务"
+        return self.reload_flag
+
+    def load(self, task_list, now=None):
+        "重建任务堆，task_list需按执行顺序排列（priority降序或plan_tasks的结果）"
+        now = now or datetime.datetime.now()
+        heap = []
+        for i, task in enumerate(task_list):
+            try:
+                open_time = compile_time_window(task['exec_time_window']).next_open(now)
+            except Exception:
+                open_time = now  # 时间窗口格式错误，交给执行线程标记check failed
+            heap.append((open_time, i, task))
+        heapq.heapify(heap)
+        with self.lock:
+            self.heap = heap
+            self.reload_flag = False
+
+    def pop_due(self, now=None):
+        "弹出所有已到执行时间的任务，按priority顺序返回"
+        now = now or datetime.datetime.now()
+        due_list = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                open_time, seq, task = heapq.heappop(self.heap)
+                try:
+                    window = compile_time_window(task['exec_time_window'])
+                except Exception:
+                    due_list.append((seq, task))
+                    continue
+                if window.contains(now):
+                    due_list.append((seq, task))
+                else:
+                    # 错过了窗口，放回堆中等待下一次窗口开启
+                    heapq.heappush(self.heap, (window.next_open(now), seq, task))
+        due_list.sort(key=lambda x: x[0])
+        return [i[1] for i in due_list]
+
+    def next_time(self):
+        "下一个任务的窗口开启时间，没有任务时返回None"
+        with self.lock:
+            if self.heap:
+                return self.heap[0][0]
+        return None
+
+    def wait(self, until):
+        "睡眠到指定时间(datetime)，被notify()时提前返回"
+        seconds = (until - datetime.datetime.now()).total_seconds()
+        if seconds > 0:
+            self.wakeup.wait(seconds)
+        self.wakeup.clear()
+
+
+class SlotDispatcher:
+    "按源实例、目标实例限制并发的任务分发：队首任务所在实例的并发已满时，取下一个可执行的任务"
+
+    def __init__(self, source_slots=0, dest_slots=0, slot_overrides=None):
+        self.source_slots = source_slots  # 0表示不限制
+        self.dest_slots = dest_slots
+        self.slot_overrides = slot_overrides or {}  # {'host:port': 并发数}，优先于默认值
+        self.pending = []
+        self.source_running = {}
+        self.dest_running = {}
+        self.cond = threading.Condition()
+
+    def get_limit(self, key, default):
+        "获取实例的并发上限"
+        return self.slot_overrides.get(key, default)
+
+    @staticmethod
+    def is_full(running, key, limit):
+        "实例并发是否已满"
+        if key is None or limit <= 0:
+            return False
+        return running.get(key, 0) >= limit
+
+    def is_runnable(self, task):
+        "任务所在的源实例和目标实例是否都有空闲并发"
+        source_key = getattr(task, 'source_key', None)
+        dest_key = getattr(task, 'dest_key', None)
+        if self.is_full(self.source_running, source_key, self.get_limit(source_key, self.source_slots)):
+            return False
+        if self.is_full(self.dest_running, dest_key, self.get_limit(dest_key, self.dest_slots)):
+            return False
+        return True
+
+    def acquire(self, task):
+        "占用实例并发"
+        for running, key in [(self.source_running, getattr(task, 'source_key', None)),
+                             (self.dest_running, getattr(task, 'dest_key', None))]:
+            if key is not None:
+                running[key] = running.get(key, 0) + 1
+
+    def put(self, task):
+        "加入待执行列表"
+        with self.cond:
+            self.pending.append(task)
+            self.cond.notify_all()
+
+    def take(self):
+        "取出第一个可执行的任务并占用实例并发，没有时返回None（调用方持有self.cond）"
+        for i, task in enumerate(self.pending):
+            if self.is_runnable(task):
+                del self.pending[i]
+                self.acquire(task)
+                return task
+        return None
+
+    def get(self):
+        "取出第一个可执行的任务，没有可执行的任务时阻塞"
+        with self.cond:
+            while True:
+                task = self.take()
+                if task is not None:
+                    return task
+                self.cond.wait()
+
+    def get_nowait(self):
+        "取出第一个可执行的任务，没有可执行的任务时返回None"
+        with self.cond:
+            return self.take()
+
+    def done(self, task):
+        "任务结束，释放实例并发"
+        with self.cond:
+            for running, key in [(self.source_running, getattr(task, 'source_key', None)),
+                                 (self.dest_running, getattr(task, 'dest_key', None))]:
+                if key is not None and running.get(key, 0) > 0:
+                    running[key] -= 1
+                    if running[key] == 0:
+                        del running[key]
+            self.cond.notify_all()
+
+    def qsize(self):
+        "待执行任务数"
+        with self.cond:
+            return len(self.pending)
+
+    def tasks(self):
+        "待执行任务列表（副本）"
+        with self.cond:
+            return list(self.pending)
@@ -0,0 +1,188 @@
+#!/bin/python3
+# -*- encoding: utf-8 -*-
+"""
+####################################################################################################
+#  Name        :  schema_cache.py
+#  Author      :  Elison
+#  Email       :  Ly99@qq.com
+#  Description :  表结构指纹缓存：按host:port/db/table缓存字段名、类型、字符集，表的CREATE_TIME或字段数变化、超过有效期时重新加载，
+#                 执行前比较源表和归档表的兼容性
+#  Updates     :
+#      Version     When            What
+#      --------    -----------     -----------------------------------------------------------------
+#      v1.0        2026-10-18
+#      v1.1        2026-10-18      信任期内不查询数据库，同一实例的表一次查询版本，版本增加字段数（INSTANT加字段不改变CREATE_TIME）
+####################################################################################################
+"""
+import re
+import time
+import hashlib
+import threading
+import util
+
+TYPE_REGEX = re.compile(r'^(\w+)(?:\(([^)]*)\))?\s*(.*)$')
+# 可以放宽的类型，后面的范围包含前面的
+WIDEN_TYPES = [['tinyint', 'smallint', 'mediumint', 'int', 'bigint'],
+               ['tinytext', 'text', 'mediumtext', 'longtext'],
+               ['tinyblob', 'blob', 'mediumblob', 'longblob'],
+               ['float', 'double']]
+CHARSET_ALIASES = {'utf8mb3': 'utf8'}
+# 归档表的字符集包含源表的字符集
+WIDEN_CHARSETS = {'utf8mb4': ['utf8', 'ascii'], 'utf8': ['ascii']}
+
+
+def parse_type(column_type):
+    "解析字段类型，返回(类型, 参数列表, 属性)，如：varchar(64) -> ('varchar', ['64'], '')"
+    res = TYPE_REGEX.match(column_type.lower().strip())
+    if not res:
+        return column_type.lower(), [], ''
+    params = [i.strip() for i in res.group(2).split(',')] if res.group(2) else []
+    return res.group(1), params, res.group(3).strip()
+
+
+def is_type_compatible(source_type, dest_type):
+    "归档表的字段类型能否无损保存源表的值"
+    if source_type == dest_type:
+        return True
+    source_base, source_params, source_attrs = parse_type(source_type)
+    dest_base, dest_params, dest_attrs = parse_type(dest_type)
+    if source_attrs.replace('zerofill', '').strip() != dest_attrs.replace('zerofill', '').strip():
+        return False  # unsigned不一致
+    for types in WIDEN_TYPES:
+        if source_base in types and dest_base in types:
+            return types.index(dest_base) >= types.index(source_base)  # 忽略整数的显示宽度
+    if source_base in ('char', 'varchar') and dest_base in ('char', 'varchar'):
+        if source_base == 'varchar' and dest_base == 'char':
+            return False
+        return int(dest_params[0]) >= int(source_params[0])
+    if source_base in ('varbinary', 'binary') and dest_base == source_base:
+        return int(dest_params[0]) >= int(source_params[0])
+    if source_base in ('datetime', 'timestamp', 'time') and dest_base == source_base:
+        return int((dest_params or [0])[0]) >= int((source_params or [0])[0])  # 小数秒精度
+    if source_base == 'decimal' and dest_base == 'decimal':
+        source_params = [int(i) for i in source_params] + [10, 0][len(source_params):]
+        dest_params = [int(i) for i in dest_params] + [10, 0][len(dest_params):]
+        return dest_params[1] >= source_params[1] and dest_params[0] - dest_params[1] >= source_params[0] - \
+               source_params[1]
+    return source_base == dest_base and source_params == dest_params
+
+
+def is_charset_compatible(source_charset, dest_charset):
+    "归档表的字符集能否保存源表的字符"
+    if not source_charset or not dest_charset:
+        return source_charset == dest_charset or not source_charset
+    source_charset = CHARSET_ALIASES.get(source_charset, source_charset)
+    dest_charset = CHARSET_ALIASES.get(dest_charset, dest_charset)
+    return source_charset == dest_charset or source_charset in WIDEN_CHARSETS.get(dest_charset, [])
+
+
+class SchemaCache:
+    "表结构缓存（线程安全）"
+
+    def __init__(self, ttl_seconds=3600, trust_seconds=60):
+        # 版本为(CREATE_TIME, 字段数)：重建表、INSTANT加减字段时变化；MySQL 8.0的INSTANT/INPLACE修改（如改名、加长varchar）
+        # 不改变CREATE_TIME和字段数，最多在ttl_seconds后重新加载
+        self.ttl_seconds = ttl_seconds
+        self.trust_seconds = trust_seconds  # 距上次检查版本不超过该时间时直接使用缓存，不查询数据库
+        self.tables = {}  # {'host:port/db/table': {'version', 'columns', 'fingerprint', 'loaded', 'checked'}}
+        self.results = {}  # {(源表指纹, 归档表指纹): 不兼容的原因列表}
+        self.lock = threading.Lock()
+
+    def __str__(self):
+        return str({'tables': len(self.tables), 'results': len(self.results)})
+
+    @staticmethod
+    def get_key(conf, db, table):
+        return '{}:{}/{}/{}'.format(conf['host'], conf['port'], db, table)
+
+    @staticmethod
+    def load_columns(conn, db, table):
+        "读取字段：[(字段名, 类型, 字符集)]"
+        sql = """select column_name,column_type,character_set_name from information_schema.COLUMNS where table_schema=%s and table_name=%s order by ordinal_position"""
+        return [(name, column_type, charset) for name, column_type, charset in conn.query(sql, (db, table))]
+
+    @staticmethod
+    def load_versions(conn, tables):
+        "一次查询多个表的版本：{(db, table): 'CREATE_TIME/字段数'}，表名不区分大小写"
+        where = ' or '.join(['(t.table_schema=%s and t.table_name=%s)'] * len(tables))
+        sql = """select t.table_schema,t.table_name,t.create_time,count(c.column_name) from information_schema.TABLES t left join information_schema.COLUMNS c on c.table_schema=t.table_schema and c.table_name=t.table_name where {} group by t.table_schema,t.table_name,t.create_time""".format(
+            where)
+        args = [i for db, table in tables for i in (db, table)]
+        return {(db.lower(), table.lower()): '{}/{}'.format(create_time, cnt) for db, table, create_time, cnt in
+                conn.query(sql, args)}
+
+    def get_tables(self, conf, tables):
+        "获取同一实例上多个表的结构[(db, table)]：在信任期内直接使用缓存，否则用一个连接、一次查询检查版本，版本变化或过期时重新读取字段；表不存在时抛出异常"
+        now = time.time()
+        schemas = {}
+        with self.lock:
+            for db, table in tables:
+                schema = self.tables.get(self.get_key(conf, db, table))
+                if schema and now - schema['checked'] < self.trust_seconds and now - schema['loaded'] < self.ttl_seconds:
+                    schemas[(db, table)] = schema
+        to_check = [i for i in tables if i not in schemas]
+        if to_check:
+            conn = util.mysql(conf, mode='list')
+            try:
+                versions = self.load_versions(conn, to_check)
+                for db, table in to_check:
+                    version = versions.get((db.lower(), table.lower()))
+                    if version is None:
+                        raise Exception("表不存在：{}.{}".format(db, table))
+                    key = self.get_key(conf, db, table)
+                    with self.lock:
+                        schema = self.tables.get(key)
+                    if schema and schema['version'] == version and now - schema['loaded'] < self.ttl_seconds:
+                        schema['checked'] = now
+                    else:
+                        columns = self.load_columns(conn, db, table)
+                        text = '\n'.join(['{}:{}:{}'.format(*i) for i in columns])
+                        schema = {'version': version, 'columns': columns,
+                                  'fingerprint': hashlib.md5(text.encode('utf8')).hexdigest(), 'loaded': now,
+                                  'checked': now}
+                        with self.lock:
+                            self.tables[key] = schema
+                    schemas[(db, table)] = schema
+            finally:
+                conn.close()
+        return [schemas[i] for i in tables]
+
+    def get(self, conf, db, table):
+        "获取一个表的结构"
+        return self.get_tables(conf, [(db, table)])[0]
+
+    def get_pair(self, source_conf, source_db, source_table, dest_conf, dest_db, dest_table):
+        "获取源表和归档表的结构，在同一实例时只用一个连接"
+        if (source_conf['host'], source_conf['port']) == (dest_conf['host'], dest_conf['port']):
+            return self.get_tables(source_conf, [(source_db, source_table), (dest_db, dest_table)])
+        return self.get(source_conf, source_db, source_table), self.get(dest_conf, dest_db, dest_table)
+
+    @staticmethod
+    def compare_columns(source_columns, dest_columns):
+        "比较字段名、类型、字符集，返回不兼容的原因列表"
+        dest_dict = {name.lower(): (column_type, charset) for name, column_type, charset in dest_columns}
+        field_not_exist_in_dest = [name for name, column_type, charset in source_columns if
+                                   name.lower() not in dest_dict]
+        if field_not_exist_in_dest:
+            return ["目标表字段不存在：{}".format(','.join(field_not_exist_in_dest))]
+        if len(source_columns) != len(dest_columns):
+            return ["字段数量不一致"]
+        errors = []
+        for name, column_type, charset in source_columns:
+            dest_type, dest_charset = dest_dict[name.lower()]
+            if not is_type_compatible(column_type, dest_type):
+                errors.append("字段类型不兼容：{} {} -> {}".format(name, column_type, dest_type))
+            elif not is_charset_compatible(charset, dest_charset):
+                errors.append("字段字符集不兼容：{} {} -> {}".format(name, charset, dest_charset))
+        return errors
+
+    def compare(self, source_schema, dest_schema):
+        "比较源表和归档表，结果按指纹缓存，返回不兼容的原因列表"
+        key = (source_schema['fingerprint'], dest_schema['fingerprint'])
+        with self.lock:
+            if key in self.results:
+                return self.results[key]
+        errors = self.compare_columns(source_schema['columns'], dest_schema['columns'])
+        with self.lock:
+            self.results[key] = errors
+        return errors
@@ -1,9 +1,43 @@
 CONFIG_DB = {'host': '10.0.0.200', 'port': 3306, 'db': 'mysql_archiver', 'user': 'mysql_archiver_rw', 'password': 'abc123'} #元数据实例，建议使用tokudb，压缩率高
 PARALLEL = 5
+EXECUTOR = 'thread'  #执行核心：thread（每个任务一个消费线程），asyncio（一个事件循环管理所有任务的子进程，适合大量轻量任务）
+ASYNC_PARALLEL = 100  #asyncio执行核心同时执行的任务数上限（替代PARALLEL）
+ASYNC_DB_THREADS = 8  #asyncio执行核心读写configdb的线程数
+SOURCE_SLOTS = 2  #每个源实例(host:port)同时执行的任务数上限，0表示不限制
+DEST_SLOTS = 3  #每个目标实例(host:port)同时执行的任务数上限，0表示不限制
+SLOT_OVERRIDES = {}  #单独设置某个实例的并发上限，如：{'10.0.0.201:3306': 4}
+CONFIGDB_POOL_MAX_IDLE = 7  #configdb连接池最多保留的空闲连接数
+CONFIGDB_POOL_IDLE_SECONDS = 300  #configdb空闲连接超过该秒数自动关闭
 LOGGING_LEVEL = 'info'
+SCHEDULER_REFRESH_SECONDS = 60  #调度线程从configdb重新加载任务的最大间隔（手工插入、其他节点回收的任务），新任务生成后会立即加载
+ARCHIVE_FILE_SIZE_MB = 256  #archive-to-file-native模式单个归档文件压缩前的大小上限
+EXEC_LOG_HEAD_LINES = 50  #archive_tasks.exec_log保留日志的前N行
+EXEC_LOG_TAIL_LINES = 200  #以及最后N行，完整日志压缩保存到LOG_ARCHIVE_DIR/<日期>/<task_id>_<时分秒>.log.gz
+LOG_ARCHIVE_DIR = 'logs/archive'
+LOG_RETENTION_DAYS = 30  #压缩日志保留天数，0表示不清理
+STATS_FLUSH_SECONDS = 10  #任务运行中，统计信息写入archive_task_stats的间隔
+CHECKPOINT_FLUSH_SECONDS = 10  #原生引擎断点写入archive_checkpoint的间隔
+SCHEMA_CACHE_SECONDS = 3600  #执行前检查缓存的表结构有效期（秒），表的CREATE_TIME或字段数变化时立即失效；不改变二者的INSTANT/INPLACE修改（如改字段名、加长varchar）最多在有效期后生效
+SCHEMA_CACHE_TRUST_SECONDS = 60  #距上次检查不超过该时间（秒）时直接使用缓存的表结构，不查询数据库
+PLANNER_CHUNK_BYTES = 4194304  #auto_plan按平均行长度计算批次大小时，每批次的目标数据量（字节）
+GENERATE_BATCH_SIZE = 1000  #每天0:00生成任务时，每批insert的行数（所有任务在一个事务内写入）
+PREDICT_HISTORY_RUNS = 7  #预测任务耗时时，取每个配置最近N次成功执行的记录
+PREDICT_HISTORY_DAYS = 30  #只使用最近N天的执行记录
+NODE_ID = ''  #节点标识，多节点部署时每个节点不同，默认为主机名；同一个NODE_ID只能运行一个进程（启动时回收该节点遗留的任务）
+LEASE_SECONDS = 60  #任务租约时长，节点超过该时间没有续租时，其他节点回收它的任务
+HEARTBEAT_SECONDS = 15  #续租和回收失效节点任务的间隔，LEASE_SECONDS至少为它的4倍；续租失败超过LEASE_SECONDS-2*HEARTBEAT_SECONDS秒时停止本进程的任务
+SEND_REPORT = True  #是否每天8:00发送执行报告，多节点部署时只在一个节点开启
+PAUSE_AT_WINDOW_END = True  #执行时间窗口关闭时通知任务在批次之间停止（状态为paused），下一个窗口开启时继续执行
+METRICS_PORT = 0  #Prometheus监控指标接口端口（http://host:port/metrics），0表示不开启
+METRICS_HOST = '0.0.0.0'
 
 ARCHIVE_USER = 'dba_archive_user'  #归档账号，需要在每个归档实例都创建
 ARCHIVE_PASSWORD = 'abc123'
 
 #发送执行通知（xxx替换成企业微信WEBHOOK）
 WXWORK_WEBHOOK = 'https://qyapi.weixin.qq.com/cgi-bin/webhook/send?key=xxx'
+
+#限流：从库复制延迟超过THROTTLE_MAX_LAG秒、源库Threads_running超过THROTTLE_MAX_THREADS_RUNNING(0表示不检查)时，在批次之间暂停归档
+THROTTLE_MAX_LAG = 30
+THROTTLE_MAX_THREADS_RUNNING = 0
+THROTTLE_CHECK_INTERVAL = 1
@@ -0,0 +1,379 @@
+#!/bin/python3
+# -*- encoding: utf-8 -*-
+"""
+####################################################################################################
+#  Name        :  simulate.py
+#  Author      :  Elison
+#  Email       :  Ly99@qq.com
+#  Description :  调度模拟：从configdb或json快照加载归档配置和历史耗时，用虚拟时钟重放一天的任务生成、调度和执行，
+#                 不睡眠、不执行命令，输出总耗时、每个任务的排队时间、等待超时和并发利用率
+#  Updates     :
+#      Version     When            What
+#      --------    -----------     -----------------------------------------------------------------
+#      v1.0        2026-10-18
+####################################################################################################
+"""
+import os
+import sys
+import json
+import heapq
+import random
+import datetime
+import argparse
+import logging
+import settings
+import scheduler
+import archiver
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def set_log_level(level='info'):
+    "设置日志等级"
+    if level == 'debug':
+        lv = logging.DEBUG
+    else:
+        lv = logging.INFO
+    logging.basicConfig(stream=sys.stdout, level=lv,
+                        format='[%(asctime)s.%(msecs)d] [%(levelname)s] %(funcName)s: %(message)s',
+                        datefmt='%Y-%m-%d %H:%M:%S')
+
+
+def get_args():
+    '获取参数'
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-v", "--version", action='store_true', help="查看版本")
+    parser.add_argument("-s", "--snapshot", type=str, help="json快照文件，不指定时从configdb加载")
+    parser.add_argument("--dump", type=str, help="从configdb加载归档配置和历史耗时，保存为json快照后退出")
+    parser.add_argument("--date", type=str, help="模拟的日期，如：2026-10-19，默认当天")
+    parser.add_argument("-P", "--parallel", type=int, default=settings.PARALLEL, help="执行线程数（PARALLEL）")
+    parser.add_argument("--source-slots", type=int, default=getattr(settings, 'SOURCE_SLOTS', 0),
+                        help="每个源实例的并发上限（SOURCE_SLOTS）")
+    parser.add_argument("--dest-slots", type=int, default=getattr(settings, 'DEST_SLOTS', 0),
+                        help="每个目标实例的并发上限（DEST_SLOTS）")
+    parser.add_argument("--refresh-seconds", type=int, default=getattr(settings, 'SCHEDULER_REFRESH_SECONDS', 60),
+                        help="调度线程重新加载任务的间隔（SCHEDULER_REFRESH_SECONDS）")
+    parser.add_argument("--pause", type=int, default=int(getattr(settings, 'PAUSE_AT_WINDOW_END', True)),
+                        choices=[0, 1], help="执行时间窗口关闭时是否暂停任务（PAUSE_AT_WINDOW_END）")
+    parser.add_argument("--scale", type=int, default=1, help="把归档配置复制N份，评估增加配置后的容量")
+    parser.add_argument("--default-seconds", type=int, default=600, help="没有历史记录的任务的模拟耗时（秒）")
+    parser.add_argument("--sample", action='store_true', help="从历史耗时中随机抽样作为模拟耗时，默认使用中位数")
+    parser.add_argument("--seed", type=int, default=20261018, help="随机数种子（--sample）")
+    parser.add_argument("-o", "--output", type=str, help="结果文件，默认：logs/simulate_<日期>.json")
+    args = parser.parse_args()
+
+    # 处理参数
+    if args.version:
+        print(__doc__)
+        sys.exit()
+
+    dct = {}
+    try:
+        if args.date:
+            dct['date'] = datetime.datetime.strptime(args.date, '%Y-%m-%d')
+        else:
+            dct['date'] = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    except Exception as e:
+        print("无效参数：--date")
+        sys.exit(1)
+
+    dct['snapshot'] = args.snapshot
+    dct['dump'] = args.dump
+    dct['parallel'] = max(args.parallel, 1)
+    dct['source_slots'] = args.source_slots
+    dct['dest_slots'] = args.dest_slots
+    dct['refresh_seconds'] = max(args.refresh_seconds, 1)
+    dct['pause'] = bool(args.pause)
+    dct['scale'] = max(args.scale, 1)
+    dct['default_seconds'] = args.default_seconds
+    dct['sample'] = args.sample
+    dct['seed'] = args.seed
+    dct['output'] = args.output or 'logs/simulate_{}.json'.format(dct['date'].strftime('%Y%m%d'))
+    return dct
+
+
+def load_from_configdb():
+    "从configdb加载归档配置和历史执行记录"
+    conn = archiver.get_configdb_conn()
+    try:
+        configs = archiver.get_archive_config(conn)
+        history = archiver.get_task_history(conn, sorted([i['id'] for i in configs]))
+    finally:
+        conn.close()
+    return {'configs': configs, 'history': {str(k): v for k, v in history.items()}}
+
+
+def to_datetime(value):
+    "快照中的时间字符串转换为datetime"
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime.strptime(str(value)[:19], DATETIME_FORMAT)
+
+
+class SimTask:
+    "模拟的任务，对应archive_tasks的一行"
+
+    def __init__(self, task_id, conf, seconds):
+        self.id = task_id
+        self.config_id = conf['id']
+        self.conf = {'id': task_id, 'config_id': conf['id'], 'exec_time_window': conf['exec_time_window'],
+                     'priority': conf.get('priority') or 0}
+        self.table = '{}.{}'.format(conf['source_db'], conf['source_table'])
+        self.source_key = "{}:{}".format(conf['source_host'], conf['source_port'])
+        self.dest_key = archiver.get_dest_key(conf)
+        self.seconds = seconds  # 模拟的执行耗时
+        self.remaining = seconds
+        self.exec_status = 'initial'
+        self.queued_at = None
+        self.first_start = None
+        self.exec_end = None
+        self.wait_seconds = 0
+        self.run_seconds = 0
+        self.attempts = 0
+        self.pauses = 0
+        self.timeouts = 0
+
+    def __str__(self):
+        return str(self.__dict__)
+
+    def to_dict(self):
+        "模拟结果"
+        return {'task_id': self.id, 'config_id': self.config_id, 'table': self.table,
+                'priority': self.conf['priority'], 'exec_time_window': self.conf['exec_time_window'],
+                'predicted_seconds': self.conf.get('predicted_seconds'), 'sim_seconds': self.seconds,
+                'planned_start': self.conf.get('planned_start'), 'first_start': self.first_start,
+                'exec_end': self.exec_end, 'wait_seconds': round(self.wait_seconds), 'run_seconds': round(self.run_seconds),
+                'exec_status': self.exec_status, 'attempts': self.attempts, 'pauses': self.pauses,
+                'timeouts': self.timeouts}
+
+
+class Simulator:
+    "用虚拟时钟重放generate_task_job、produce_job、consume_job的调度逻辑"
+
+    def __init__(self, snapshot, args):
+        self.args = args
+        self.configs = snapshot['configs']
+        self.history = {int(k): v for k, v in snapshot['history'].items()}
+        self.day_start = args['date']
+        self.day_end = self.day_start + datetime.timedelta(days=1)
+        self.rnd = random.Random(args['seed'])
+        self.scheduler = scheduler.TaskScheduler()
+        self.dispatcher = scheduler.SlotDispatcher(args['source_slots'], args['dest_slots'],
+                                                   getattr(settings, 'SLOT_OVERRIDES', {}))
+        self.tasks = []
+        self.runs = []  # 每次执行：(开始时间, 结束时间, 任务)
+
+    def __str__(self):
+        return str(self.args)
+
+    def is_need_run(self, conf):
+        "与get_need_run_config_ids相同：interval_day天内已成功执行过的配置不生成任务"
+        since = self.day_start + datetime.timedelta(days=1 - (conf.get('interval_day') or 1))
+        for row in self.history.get(conf['id'], []):
+            exec_start = to_datetime(row.get('exec_start'))
+            if exec_start is not None and since <= exec_start < self.day_start:
+                return False
+        return True
+
+    def sim_seconds(self, config_id, predicted_seconds):
+        "模拟的执行耗时：历史耗时的中位数或随机抽样，没有历史时使用default_seconds"
+        runs = [i['exec_seconds'] for i in self.history.get(config_id, []) if i.get('exec_seconds') is not None]
+        if runs and self.args['sample']:
+            return int(self.rnd.choice(runs))
+        if predicted_seconds is not None:
+            return int(predicted_seconds)
+        return self.args['default_seconds']
+
+    def generate_tasks(self):
+        "0:00生成任务，并按历史预测耗时（与调度线程相同）"
+        configs = []
+        for n in range(self.args['scale']):
+            for conf in self.configs:
+                if n > 0:
+                    conf = dict(conf)
+                    self.history.setdefault(conf['id'] + n * 1000000, self.history.get(conf['id'], []))
+                    conf['id'] += n * 1000000  # 复制的配置使用原配置的历史耗时
+                configs.append(conf)
+
+        for conf in configs:
+            if self.is_need_run(conf):
+                task = SimTask(len(self.tasks) + 1, conf, 0)
+                self.tasks.append(task)
+        archiver.predict_task_seconds(None, [i.conf for i in self.tasks], self.history)
+        for task in self.tasks:
+            task.seconds = task.remaining = self.sim_seconds(task.config_id, task.conf.get('predicted_seconds'))
+        logging.info("生成{}个任务（{}个配置）".format(len(self.tasks), len(configs)))
+
+    def reload(self, now):
+        "与produce_job相同：加载待执行的任务，排列后重建任务堆"
+        task_list = [i.conf for i in self.tasks if i.exec_status in ('initial', 'waiting timeout', 'paused')]
+        task_list.sort(key=lambda x: -x['priority'])
+        task_list = scheduler.plan_tasks(task_list, self.args['parallel'], now)
+        self.scheduler.load(task_list, now)
+
+    def start_task(self, task, now, running):
+        "与consume_job、ArchiveTask.start相同：检查时间窗口，执行到结束或窗口关闭"
+        task.wait_seconds += (now - task.queued_at).total_seconds()
+        task.attempts += 1
+        try:
+            window = scheduler.compile_time_window(task.conf['exec_time_window'])
+        except Exception:
+            task.exec_status = 'check failed'
+            self.dispatcher.done(task)
+            return False
+        if not window.contains(now):
+            task.exec_status = 'waiting timeout'
+            task.timeouts += 1
+            self.dispatcher.done(task)
+            return False
+
+        task.exec_status = 'running'
+        task.first_start = task.first_start or now
+        end = now + datetime.timedelta(seconds=task.remaining)
+        paused = False
+        if self.args['pause']:
+            close_time = window.close_time(now)
+            if close_time is not None and close_time < end:
+                end, paused = close_time, True
+        heapq.heappush(running, (end, task.id, task, paused, now))
+        return True
+
+    def finish_task(self, item):
+        "任务结束或暂停，释放并发"
+        end, _, task, paused, start = item
+        seconds = (end - start).total_seconds()
+        task.run_seconds += seconds
+        task.remaining = max(task.remaining - seconds, 0)
+        task.exec_end = end
+        if paused:
+            task.exec_status = 'paused'
+            task.pauses += 1
+        else:
+            task.exec_status = 'done & ok'
+        self.dispatcher.done(task)
+        self.runs.append((start, end, task))
+
+    def run(self):
+        "模拟一天，当天结束后不再启动新任务，执行中的任务继续到结束"
+        self.generate_tasks()
+        tasks_by_id = {i.id: i for i in self.tasks}
+        running = []  # 最小堆：(结束时间, task_id, 任务, 是否暂停, 开始时间)
+        now = self.day_start
+        next_refresh = now
+        while True:
+            while running and running[0][0] <= now:
+                self.finish_task(heapq.heappop(running))
+            if now >= self.day_end:
+                if not running:
+                    break
+                now = running[0][0]
+                continue
+
+            if self.scheduler.need_reload() or now >= next_refresh:
+                self.reload(now)
+                next_refresh = now + datetime.timedelta(seconds=self.args['refresh_seconds'])
+
+            for conf in self.scheduler.pop_due(now):
+                task = tasks_by_id[conf['id']]
+                if task.exec_status in ('initial', 'waiting timeout', 'paused'):
+                    task.exec_status = 'waiting'
+                    task.queued_at = now
+                    self.dispatcher.put(task)
+
+            while len(running) < self.args['parallel']:
+                task = self.dispatcher.get_nowait()
+                if task is None:
+                    break
+                self.start_task(task, now, running)
+
+            # 跳到下一个事件：任务结束、窗口开启、重新加载、当天结束
+            events = [next_refresh, self.day_end, self.scheduler.next_time()]
+            if running:
+                events.append(running[0][0])
+            now = max(min([i for i in events if i is not None]), now + datetime.timedelta(seconds=1))
+
+        for task in self.tasks:
+            if task.exec_status == 'waiting':
+                task.wait_seconds += (self.day_end - task.queued_at).total_seconds()
+        return self.report()
+
+    def slot_usage(self, key_name, limit):
+        "每个实例的执行时间和最大并发"
+        usage = {}
+        for start, end, task in self.runs:
+            key = getattr(task, key_name)
+            if key is None:
+                continue
+            item = usage.setdefault(key, {'busy_seconds': 0, 'events': []})
+            item['busy_seconds'] += (end - start).total_seconds()
+            item['events'] += [(start, 1), (end, -1)]
+        result = {}
+        for key, item in usage.items():
+            peak = current = 0
+            for t, delta in sorted(item['events'], key=lambda x: (x[0], x[1])):
+                current += delta
+                peak = max(peak, current)
+            result[key] = {'busy_seconds': round(item['busy_seconds']), 'max_running': peak,
+                           'limit': self.dispatcher.get_limit(key, limit)}
+        return result
+
+    def report(self):
+        "汇总模拟结果"
+        status_count = {}
+        for task in self.tasks:
+            status_count[task.exec_status] = status_count.get(task.exec_status, 0) + 1
+        run_seconds = sum([(end - start).total_seconds() for start, end, task in self.runs])
+        first_start = min([i[0] for i in self.runs]) if self.runs else None
+        last_end = max([i[1] for i in self.runs]) if self.runs else None
+        span = (last_end - first_start).total_seconds() if self.runs else 0
+        waits = sorted([i.wait_seconds for i in self.tasks if i.attempts or i.exec_status == 'waiting'])
+        summary = {'date': self.day_start.strftime('%Y-%m-%d'), 'parallel': self.args['parallel'],
+                   'source_slots': self.args['source_slots'], 'dest_slots': self.args['dest_slots'],
+                   'pause_at_window_end': self.args['pause'], 'scale': self.args['scale'],
+                   'tasks': len(self.tasks), 'status': status_count,
+                   'timeouts': sum([i.timeouts for i in self.tasks]), 'pauses': sum([i.pauses for i in self.tasks]),
+                   'first_start': first_start, 'last_end': last_end, 'total_seconds': round(span),
+                   'run_seconds': round(run_seconds),
+                   'consumer_utilization': round(run_seconds / (span * self.args['parallel']), 4) if span else None,
+                   'wait_seconds_avg': round(sum(waits) / len(waits)) if waits else None,
+                   'wait_seconds_p95': round(waits[int(round((len(waits) - 1) * 0.95))]) if waits else None,
+                   'wait_seconds_max': round(waits[-1]) if waits else None,
+                   'source_slots_usage': self.slot_usage('source_key', self.args['source_slots']),
+                   'dest_slots_usage': self.slot_usage('dest_key', self.args['dest_slots'])}
+        return {'summary': summary, 'tasks': [i.to_dict() for i in self.tasks]}
+
+
+def save_json(data, filename):
+    "写入json文件"
+    dirname = os.path.dirname(filename)
+    if dirname and not os.path.exists(dirname):
+        os.makedirs(dirname)
+    with open(filename, 'w') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+
+
+# main
+if __name__ == "__main__":
+    set_log_level()
+    args = get_args()
+    if args['dump']:
+        save_json(load_from_configdb(), args['dump'])
+        logging.info("快照已写入：{}".format(args['dump']))
+        sys.exit()
+
+    if args['snapshot']:
+        with open(args['snapshot'], 'r') as f:
+            snapshot = json.load(f)
+    else:
+        snapshot = json.loads(json.dumps(load_from_configdb(), default=str))
+
+    o = Simulator(snapshot, args)
+    result = o.run()
+    save_json(result, args['output'])
+    summary = result['summary']
+    logging.info("模拟结束：任务数：{}，状态：{}，等待超时：{}次，暂停：{}次".format(
+        summary['tasks'], summary['status'], summary['timeouts'], summary['pauses']))
+    logging.info("总耗时：{}s（{} ~ {}），执行线程利用率：{}，平均排队：{}s，最长排队：{}s".format(
+        summary['total_seconds'], summary['first_start'], summary['last_end'], summary['consumer_utilization'],
+        summary['wait_seconds_avg'], summary['wait_seconds_max']))
+    logging.info("结果已写入：{}".format(args['output']))
@@ -0,0 +1,123 @@
+#!/bin/python3
+# -*- encoding: utf-8 -*-
+"""
+####################################################################################################
+#  Name        :  task_log.py
+#  Author      :  Elison
+#  Email       :  Ly99@qq.com
+#  Description :  任务日志：逐行读取执行日志，压缩保存完整日志，configdb只保存摘要和首尾若干行；按保留天数清理压缩日志
+#  Updates     :
+#      Version     When            What
+#      --------    -----------     -----------------------------------------------------------------
+#      v1.0        2026-10-18
+#      v1.1        2026-10-18      压缩日志文件名增加时分秒，同一天暂停后继续执行不再覆盖上次的日志
+####################################################################################################
+"""
+import os
+import re
+import gzip
+import time
+import shutil
+import logging
+import datetime
+import collections
+
+ERROR_REGEX = re.compile(r'error|exception|traceback|died|失败|报错', re.I)
+DATE_DIR_REGEX = re.compile(r'^\d{8}$')
+
+
+def cut_line(line, max_chars):
+    "截断过长的行"
+    if len(line) > max_chars:
+        return line[:max_chars] + '...(截断{}字符)\n'.format(len(line) - max_chars)
+    return line
+
+
+class TaskLog:
+    "逐行处理执行日志：同时写入gzip文件、保留首尾若干行、统计行数和错误行，不把整个文件读入内存"
+
+    def __init__(self, task_id, archive_dir='logs/archive', head_lines=50, tail_lines=200, max_chars=1000,
+                 max_errors=20):
+        self.task_id = task_id
+        self.archive_dir = archive_dir
+        self.head_lines = head_lines
+        self.tail_lines = tail_lines
+        self.max_chars = max_chars  # 摘要中单行的长度上限
+        self.max_errors = max_errors
+        self.head = []
+        self.tail = collections.deque(maxlen=tail_lines)
+        self.errors = []
+        self.lines = 0
+        self.bytes = 0
+        self.error_lines = 0
+        self.log_file = None
+
+    def __str__(self):
+        return str(self.summary())
+
+    def get_log_file(self):
+        "压缩日志的路径：<archive_dir>/<日期>/<task_id>_<时分秒>.log.gz，暂停后继续执行的每次运行各保存一个文件"
+        dirname = os.path.join(self.archive_dir, time.strftime('%Y%m%d', time.localtime()))
+        if not os.path.exists(dirname):
+            os.makedirs(dirname, exist_ok=True)
+        name = '{}_{}'.format(self.task_id, time.strftime('%H%M%S', time.localtime()))
+        path = os.path.join(dirname, '{}.log.gz'.format(name))
+        seq = 1
+        while os.path.exists(path):
+            seq += 1
+            path = os.path.join(dirname, '{}_{}.log.gz'.format(name, seq))
+        return path
+
+    def add_line(self, line):
+        "处理一行"
+        self.lines += 1
+        self.bytes += len(line.encode('utf8'))
+        if ERROR_REGEX.search(line):
+            self.error_lines += 1
+            if len(self.errors) < self.max_errors:
+                self.errors.append(cut_line(line, self.max_chars).rstrip('\n'))
+        if len(self.head) < self.head_lines:
+            self.head.append(cut_line(line, self.max_chars))
+        else:
+            self.tail.append(cut_line(line, self.max_chars))
+
+    def archive(self, logfile, remove=True):
+        "逐行读取日志文件，压缩保存，remove=True时删除原文件"
+        self.log_file = self.get_log_file()
+        with open(logfile, 'r', encoding='utf8', errors='replace') as f, gzip.open(self.log_file, 'wt',
+                                                                                  encoding='utf8') as gz:
+            for line in f:
+                gz.write(line)
+                self.add_line(line)
+        if remove:
+            os.remove(logfile)
+        return self
+
+    def text(self):
+        "首尾若干行，中间省略"
+        text = ''.join(self.head)
+        skipped = self.lines - len(self.head) - len(self.tail)
+        if skipped > 0:
+            text += '\n...(省略{}行，完整日志：{})...\n\n'.format(skipped, self.log_file)
+        return text + ''.join(self.tail)
+
+    def summary(self):
+        "结构化摘要"
+        return {'lines': self.lines, 'bytes': self.bytes, 'error_lines': self.error_lines, 'errors': self.errors,
+                'log_file': self.log_file}
+
+
+def purge_logs(archive_dir='logs/archive', retention_days=30):
+    "删除超过保留天数的压缩日志（按日期目录），返回删除的目录数"
+    if retention_days <= 0 or not os.path.exists(archive_dir):
+        return 0
+    expire_date = (datetime.date.today() - datetime.timedelta(days=retention_days)).strftime('%Y%m%d')
+    cnt = 0
+    for name in sorted(os.listdir(archive_dir)):
+        path = os.path.join(archive_dir, name)
+        if DATE_DIR_REGEX.match(name) and name < expire_date and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+            cnt += 1
+    if cnt:
+        logging.info('删除{}天前的任务日志：{}个目录'.format(retention_days, cnt))
+    return cnt
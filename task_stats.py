@@ -0,0 +1,148 @@
+#!/bin/python3
+# -*- encoding: utf-8 -*-
+"""
+####################################################################################################
+#  Name        :  task_stats.py
+#  Author      :  Elison
+#  Email       :  Ly99@qq.com
+#  Description :  实时解析pt-archiver/原生引擎的--progress、--statistics输出，写入archive_task_stats表
+#  Updates     :
+#      Version     When            What
+#      --------    -----------     -----------------------------------------------------------------
+#      v1.0        2026-10-18
+#      v1.1        2026-10-18      增加snapshot()，供监控指标读取
+#      v1.2        2026-10-18      增加update()，只解析不写入，asyncio执行核心在线程池中定时flush()
+#      v1.3        2026-10-18      增加load()，暂停后继续执行的任务在上次的统计信息上累加
+####################################################################################################
+"""
+import re
+import time
+import logging
+import threading
+
+PROGRESS_REGEX = re.compile(r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\s+(\d+)\s+(\d+)\s*$')
+ROWS_REGEX = re.compile(r'^(SELECT|INSERT|DELETE)\s+(\d+)\s*$')
+ACTION_REGEX = re.compile(r'^([a-z_]+)\s+(\d+)\s+([\d.]+)\s+([\d.]+)\s*$')
+
+# --statistics中的Action映射到统计字段
+ACTION_FIELDS = {'select': 'select_seconds', 'inserting': 'insert_seconds', 'bulk_inserting': 'insert_seconds',
+                 'print_file': 'insert_seconds', 'deleting': 'delete_seconds', 'bulk_deleting': 'delete_seconds',
+                 'commit': 'commit_seconds', 'throttle': 'throttle_seconds'}
+FIELDS = ['rows_selected', 'rows_inserted', 'rows_deleted', 'rows_per_sec', 'elapsed_seconds', 'select_seconds',
+          'insert_seconds', 'delete_seconds', 'commit_seconds', 'throttle_seconds']
+INT_FIELDS = ['rows_selected', 'rows_inserted', 'rows_deleted', 'elapsed_seconds']  # 其他字段为decimal
+
+
+class TaskStats:
+    "任务统计：逐行解析输出，按固定间隔增量更新archive_task_stats"
+
+    def __init__(self, task_id, config_id, get_conn, flush_seconds=10):
+        self.task_id = task_id
+        self.config_id = config_id
+        self.get_conn = get_conn
+        self.flush_seconds = flush_seconds
+        self.data = {i: 0 for i in FIELDS}  # 本次执行的统计信息
+        self.base = {i: 0 for i in FIELDS}  # 之前执行（暂停、中断前）已写入的统计信息
+        self.last_flush = 0
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def __str__(self):
+        return str(self.data)
+
+    def parse_line(self, line):
+        "解析一行输出，返回是否识别"
+        line = line.strip()
+        res = PROGRESS_REGEX.match(line)
+        if res:
+            elapsed, count = int(res.group(1)), int(res.group(2))
+            with self.lock:
+                self.data['elapsed_seconds'] = elapsed
+                self.data['rows_selected'] = count
+                if elapsed > 0:
+                    self.data['rows_per_sec'] = round(count / elapsed, 2)
+            return True
+        res = ROWS_REGEX.match(line)
+        if res:
+            field = {'SELECT': 'rows_selected', 'INSERT': 'rows_inserted', 'DELETE': 'rows_deleted'}[res.group(1)]
+            with self.lock:
+                self.data[field] = int(res.group(2))
+            return True
+        res = ACTION_REGEX.match(line)
+        if res and res.group(1) in ACTION_FIELDS:
+            field = ACTION_FIELDS[res.group(1)]
+            with self.lock:
+                self.data[field] = round(float(res.group(3)), 4)
+            return True
+        return False
+
+    def snapshot(self):
+        "本次执行的统计信息的副本"
+        with self.lock:
+            return dict(self.data)
+
+    def load(self):
+        "读取之前执行已写入的统计信息，之后写入时在其基础上累加，返回是否存在"
+        sql = "select {} from archive_task_stats where task_id=%s".format(','.join(FIELDS))
+        conn = self.get_conn()
+        try:
+            res = conn.query(sql, (self.task_id,))
+        finally:
+            conn.close()
+        if not res:
+            return False
+        with self.lock:
+            self.base = {i: int(res[0][i] or 0) if i in INT_FIELDS else float(res[0][i] or 0) for i in FIELDS}
+        return True
+
+    def totals(self):
+        "累计的统计信息：之前执行与本次执行相加，每秒处理行数按累计值重新计算"
+        with self.lock:
+            data = {i: self.base[i] + self.data[i] for i in FIELDS if i != 'rows_per_sec'}
+        for i in FIELDS:
+            if i not in INT_FIELDS and i != 'rows_per_sec':
+                data[i] = round(data[i], 4)
+        data['rows_per_sec'] = round(data['rows_selected'] / data['elapsed_seconds'], 2) if data[
+            'elapsed_seconds'] else 0
+        return data
+
+    def update(self, line):
+        "解析一行输出，识别时标记为需要写入，返回是否识别"
+        if self.parse_line(line):
+            self.dirty = True
+            return True
+        return False
+
+    def on_line(self, line):
+        "run_command的逐行回调"
+        if self.update(line) and time.time() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self, force=False):
+        "写入统计表"
+        if not self.dirty and not force:
+            return
+        with self.lock:
+            self.dirty = False
+        data = self.totals()
+        self.last_flush = time.time()
+        fields = ['task_id', 'config_id'] + FIELDS
+        values = [self.task_id, self.config_id] + [data[i] for i in FIELDS]
+        sql = "insert into archive_task_stats({}) values({}) on duplicate key update {}".format(
+            ','.join(fields), ','.join(['%s' for i in fields]),
+            ','.join(['{0}=values({0})'.format(i) for i in FIELDS]))
+        try:
+            conn = self.get_conn()
+            conn.execute(sql, values)
+            conn.close()
+        except Exception as e:
+            logging.warning("写入统计信息报错：[task_id:{}] {}".format(self.task_id, e))
+
+    def finish(self, exec_seconds):
+        "任务结束，补全耗时和速度后写入"
+        with self.lock:
+            if exec_seconds > self.data['elapsed_seconds']:
+                self.data['elapsed_seconds'] = exec_seconds
+            if self.data['elapsed_seconds'] > 0:
+                self.data['rows_per_sec'] = round(self.data['rows_selected'] / self.data['elapsed_seconds'], 2)
+        self.flush(force=True)
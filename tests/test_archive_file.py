@@ -0,0 +1,48 @@
+import datetime
+import decimal
+
+import archive_file
+
+
+def test_encode_values():
+    assert archive_file.encode_value(None) == b'\\N'
+    assert archive_file.encode_value(True) == b'1'
+    assert archive_file.encode_value(12) == b'12'
+    assert archive_file.encode_value(decimal.Decimal('-1.50')) == b'-1.50'
+    assert archive_file.encode_value(0.1) == b'0.1'
+    assert archive_file.encode_value(datetime.datetime(2026, 1, 2, 3, 4, 5)) == b'2026-01-02 03:04:05'
+    assert archive_file.encode_value(datetime.date(2026, 1, 2)) == b'2026-01-02'
+    assert archive_file.encode_value({'b', 'a'}) == b'a,b'
+    assert archive_file.encode_value('中', 'gbk') == '中'.encode('gbk')
+
+
+def test_encode_timedelta():
+    assert archive_file.encode_value(datetime.timedelta(hours=30, minutes=1, seconds=2)) == b'30:01:02'
+    assert archive_file.encode_value(-datetime.timedelta(seconds=1, microseconds=500)) == b'-00:00:01.000500'
+
+
+def test_encode_binary_as_hex():
+    assert archive_file.encode_value(b'\x00\t\xff', is_binary=True) == b'0009ff'
+    assert archive_file.encode_value('ab', is_binary=True) == b'6162'
+
+
+def test_escape_special_characters():
+    assert archive_file.encode_value('a\\b\tc\nd\re\x00') == b'a\\\\b\\tc\\nd\\re\\0'
+
+
+def test_encode_decode_row_round_trip():
+    row = [1, None, 'tab\there', 'back\\slash\\N', 'line\nbreak\r', b'\x00raw', '\\']
+    line = archive_file.encode_row(row)
+    assert line.endswith(b'\n')
+    assert line.count(b'\n') == 1
+    assert archive_file.decode_line(line) == [b'1', None, b'tab\there', b'back\\slash\\N', b'line\nbreak\r',
+                                              b'\x00raw', b'\\']
+
+
+def test_decode_null_only_when_whole_field():
+    assert archive_file.decode_line(b'\\N\t\\\\N\tN\n') == [None, b'\\N', b'N']
+
+
+def test_binary_flags():
+    line = archive_file.encode_row([b'\n', b'\n'], binary_flags=[True, False])
+    assert line == b'0a\t\\n\n'
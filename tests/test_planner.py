@@ -0,0 +1,35 @@
+import planner
+
+PT_CMD = ('pt-archiver --source h=127.0.0.1,P=3306,D=db,t=t1 --dest h=127.0.0.1,P=3307,D=db,t=t1 '
+          '--progress=5000 --limit=1000 --txn-size=1000 --bulk-insert --statistics --where="id < 100 and ts<now()"')
+NATIVE_CMD = ('python3 native_archiver.py -S 127.0.0.1:3306 -T 127.0.0.1:3307 -d db:db -t t1:t1 -c utf8mb4'
+              ' -l 1000 --min-limit 100 --max-limit 20000 --txn-target 500 --where="id < 100"')
+
+
+def test_get_where():
+    assert planner.get_where(PT_CMD) == 'id < 100 and ts<now()'
+    assert planner.get_where('pt-archiver --purge') is None
+
+
+def test_apply_chunk_size_to_pt_archiver():
+    cmd = planner.ArchivePlanner.apply(PT_CMD, {'chunk_size': 5000, 'ascend': True})
+    assert '--limit=5000 --txn-size=5000' in cmd
+    assert '--progress=5000' in cmd
+    assert '--no-ascend' not in cmd
+
+
+def test_apply_no_ascend():
+    cmd = planner.ArchivePlanner.apply(PT_CMD, {'chunk_size': 0, 'ascend': False})
+    assert '--limit=1000 --txn-size=1000' in cmd
+    assert cmd.count(' --no-ascend --where=') == 1
+    # 重复应用不会重复添加
+    assert planner.ArchivePlanner.apply(cmd, {'chunk_size': 0, 'ascend': False}) == cmd
+    # 计划改为按主键顺序扫描时去掉--no-ascend
+    assert planner.ArchivePlanner.apply(cmd, {'chunk_size': 0, 'ascend': True}) == PT_CMD
+
+
+def test_apply_native_only_changes_initial_limit():
+    cmd = planner.ArchivePlanner.apply(NATIVE_CMD, {'chunk_size': 2000, 'ascend': False}, native=True)
+    assert ' -l 2000 --min-limit 100 --max-limit 20000 ' in cmd
+    assert '--no-ascend' not in cmd
+    assert planner.get_where(cmd) == 'id < 100'
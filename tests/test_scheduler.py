@@ -0,0 +1,101 @@
+import datetime
+
+import pytest
+
+import scheduler
+
+DAY = datetime.datetime(2026, 10, 18)
+
+
+def at(hhmm, days=0):
+    hour, minute = [int(i) for i in hhmm.split(':')]
+    return DAY + datetime.timedelta(days=days, hours=hour, minutes=minute)
+
+
+class Task:
+    def __init__(self, source_key=None, dest_key=None):
+        self.source_key = source_key
+        self.dest_key = dest_key
+
+
+def test_time_window_end_minute_is_inclusive():
+    window = scheduler.TimeWindow('01:00-03:00')
+    assert not window.contains(at('00:59'))
+    assert window.contains(at('01:00'))
+    assert window.contains(at('03:00'))
+    assert window.contains(at('03:00') + datetime.timedelta(seconds=59))
+    assert not window.contains(at('03:01'))
+
+
+def test_time_window_cross_midnight():
+    window = scheduler.TimeWindow('22:00-02:00')
+    assert window.contains(at('23:30'))
+    assert window.contains(at('00:00'))
+    assert window.contains(at('02:00'))
+    assert not window.contains(at('02:01'))
+    assert not window.contains(at('12:00'))
+    assert window.next_open(at('12:00')) == at('22:00')
+    assert window.current_end(at('23:00')) == at('02:01', days=1)
+    assert window.current_end(at('01:00')) == at('02:01')
+
+
+def test_time_window_24_00_and_adjacent_ranges():
+    window = scheduler.TimeWindow('22:00-24:00,00:00-06:00')
+    assert window.contains(at('23:59'))
+    assert window.current_end(at('23:00')) == at('00:00', days=1)
+    assert window.close_time(at('23:00')) == at('06:01', days=1)
+    assert scheduler.TimeWindow('00:00-24:00').close_time(at('12:00')) is None
+
+
+def test_time_window_invalid():
+    with pytest.raises(ValueError):
+        scheduler.TimeWindow('25:00-26:00')
+    with pytest.raises(ValueError):
+        scheduler.compile_time_window('')
+
+
+def test_plan_tasks_longest_first_within_priority():
+    tasks = [{'id': i, 'exec_time_window': '00:00-24:00', 'priority': 1, 'predicted_seconds': seconds}
+             for i, seconds in [(1, 60), (2, 600), (3, 300)]]
+    tasks.append({'id': 4, 'exec_time_window': '00:00-24:00', 'priority': 2, 'predicted_seconds': 10})
+    res = scheduler.plan_tasks(tasks, 2, at('01:00'))
+    assert [i['id'] for i in res] == [4, 2, 3, 1]
+    assert res[0]['planned_start'] == at('01:00')
+    assert res[1]['planned_start'] == at('01:00')
+    assert res[2]['planned_start'] == at('01:00') + datetime.timedelta(seconds=10)
+
+
+def test_plan_tasks_late_tasks_last():
+    tasks = [{'id': 1, 'exec_time_window': '01:00-02:00', 'priority': 1, 'predicted_seconds': 7200},
+             {'id': 2, 'exec_time_window': '01:00-02:00', 'priority': 1, 'predicted_seconds': 600}]
+    res = scheduler.plan_tasks(tasks, 1, at('01:00'))
+    assert [i['id'] for i in res] == [2, 1]
+    assert res[1]['planned_start'] == at('01:10')
+
+
+def test_slot_dispatcher_skips_full_instances():
+    dispatcher = scheduler.SlotDispatcher(source_slots=1, dest_slots=0, slot_overrides={'b:3306': 2})
+    a1, a2, b1, b2 = Task('a:3306'), Task('a:3306'), Task('b:3306'), Task('b:3306')
+    for task in (a1, a2, b1, b2):
+        dispatcher.put(task)
+    assert dispatcher.get_nowait() is a1
+    assert dispatcher.get_nowait() is b1  # a:3306的并发已满，跳过a2
+    assert dispatcher.get_nowait() is b2  # b:3306的并发上限为2
+    assert dispatcher.get_nowait() is None
+    assert dispatcher.qsize() == 1
+    dispatcher.done(a1)
+    assert dispatcher.get_nowait() is a2
+    assert dispatcher.source_running == {'a:3306': 1, 'b:3306': 2}
+
+
+def test_slot_dispatcher_dest_slots_and_release():
+    dispatcher = scheduler.SlotDispatcher(source_slots=0, dest_slots=1)
+    t1, t2 = Task('a:3306', 'x:3306'), Task('b:3306', 'x:3306')
+    dispatcher.put(t1)
+    dispatcher.put(t2)
+    assert dispatcher.get_nowait() is t1
+    assert dispatcher.get_nowait() is None
+    dispatcher.done(t1)
+    dispatcher.done(t1)  # 重复释放不会变成负数
+    assert dispatcher.dest_running == {}
+    assert dispatcher.get_nowait() is t2
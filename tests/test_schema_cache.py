@@ -0,0 +1,48 @@
+import schema_cache
+
+compare_columns = schema_cache.SchemaCache.compare_columns
+
+
+def test_identical_columns():
+    columns = [('id', 'bigint(20)', None), ('name', 'varchar(64)', 'utf8mb4')]
+    assert compare_columns(columns, list(columns)) == []
+
+
+def test_missing_column_in_dest():
+    source = [('id', 'int(11)', None), ('name', 'varchar(64)', 'utf8'), ('memo', 'text', 'utf8')]
+    dest = [('id', 'int(11)', None)]
+    assert compare_columns(source, dest) == ['目标表字段不存在：name,memo']
+
+
+def test_column_names_are_case_insensitive():
+    assert compare_columns([('ID', 'int(11)', None)], [('id', 'int(11)', None)]) == []
+
+
+def test_extra_column_in_dest():
+    source = [('id', 'int(11)', None)]
+    dest = [('id', 'int(11)', None), ('archived_at', 'datetime', None)]
+    assert compare_columns(source, dest) == ['字段数量不一致']
+
+
+def test_widened_types_are_compatible():
+    source = [('a', 'int(11)', None), ('b', 'varchar(32)', 'utf8'), ('c', 'decimal(10,2)', None),
+              ('d', 'datetime', None), ('e', 'text', 'utf8mb3')]
+    dest = [('a', 'bigint(20)', None), ('b', 'varchar(64)', 'utf8mb4'), ('c', 'decimal(12,3)', None),
+            ('d', 'datetime(3)', None), ('e', 'longtext', 'utf8')]
+    assert compare_columns(source, dest) == []
+
+
+def test_narrowed_types_are_reported():
+    source = [('a', 'bigint(20)', None), ('b', 'varchar(64)', 'utf8'), ('c', 'int(10) unsigned', None),
+              ('d', 'decimal(12,3)', None)]
+    dest = [('a', 'int(11)', None), ('b', 'char(64)', 'utf8'), ('c', 'int(10)', None), ('d', 'decimal(12,2)', None)]
+    assert compare_columns(source, dest) == ['字段类型不兼容：a bigint(20) -> int(11)',
+                                             '字段类型不兼容：b varchar(64) -> char(64)',
+                                             '字段类型不兼容：c int(10) unsigned -> int(10)',
+                                             '字段类型不兼容：d decimal(12,3) -> decimal(12,2)']
+
+
+def test_narrowed_charset_is_reported():
+    source = [('name', 'varchar(64)', 'utf8mb4')]
+    dest = [('name', 'varchar(64)', 'utf8')]
+    assert compare_columns(source, dest) == ['字段字符集不兼容：name utf8mb4 -> utf8']
@@ -0,0 +1,105 @@
+import decimal
+
+import task_stats
+
+
+class Conn:
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, sql, args=None):
+        self.executed.append((sql, args))
+
+    def close(self):
+        pass
+
+
+def new_stats(conn=None):
+    return task_stats.TaskStats(1, 2, lambda: conn or Conn(), flush_seconds=10)
+
+
+def test_parse_progress_line():
+    stats = new_stats()
+    assert stats.parse_line('2026-10-18T01:02:03 20 500\n')
+    data = stats.snapshot()
+    assert data['elapsed_seconds'] == 20
+    assert data['rows_selected'] == 500
+    assert data['rows_per_sec'] == 25.0
+
+
+def test_parse_statistics_block():
+    stats = new_stats()
+    lines = ['Started at 2026-10-18T01:00:00, ended at 2026-10-18T01:00:20',
+             'Source: D=db,P=3306,h=127.0.0.1,t=t1',
+             'SELECT 1000',
+             'INSERT 999',
+             'DELETE 998',
+             'Action              Count       Time        Pct',
+             'select               1001     0.3000      15.00',
+             'bulk_inserting          2     1.2345      61.73',
+             'deleting              998     0.2000      10.00',
+             'commit               2002     0.1000       5.00',
+             'throttle                1     2.5000      12.50',
+             'other                   0     0.0000       0.00']
+    recognized = [stats.parse_line(i) for i in lines]
+    assert recognized == [False, False, True, True, True, False, True, True, True, True, True, False]
+    data = stats.snapshot()
+    assert (data['rows_selected'], data['rows_inserted'], data['rows_deleted']) == (1000, 999, 998)
+    assert data['select_seconds'] == 0.3
+    assert data['insert_seconds'] == 1.2345
+    assert data['delete_seconds'] == 0.2
+    assert data['commit_seconds'] == 0.1
+    assert data['throttle_seconds'] == 2.5
+
+
+def test_unrecognized_lines_do_not_flush():
+    conn = Conn()
+    stats = new_stats(conn)
+    assert not stats.update('# pt-archiver some message')
+    stats.flush()
+    assert conn.executed == []
+    assert stats.update('SELECT 10')
+    stats.flush()
+    assert len(conn.executed) == 1
+    sql, args = conn.executed[0]
+    assert sql.startswith('insert into archive_task_stats(task_id,config_id,rows_selected')
+    assert args[:3] == [1, 2, 10]
+
+
+def test_finish_fills_elapsed_and_speed():
+    conn = Conn()
+    stats = new_stats(conn)
+    stats.parse_line('SELECT 300')
+    stats.finish(60)
+    data = stats.snapshot()
+    assert data['elapsed_seconds'] == 60
+    assert data['rows_per_sec'] == 5.0
+    assert len(conn.executed) == 1
+
+
+def test_resumed_task_accumulates_previous_runs():
+    class ResumeConn(Conn):
+        def query(self, sql, args=None):
+            assert args == (1,)
+            return [{'rows_selected': 1000, 'rows_inserted': 1000, 'rows_deleted': 900,
+                     'rows_per_sec': decimal.Decimal('10.00'), 'elapsed_seconds': 100,
+                     'select_seconds': decimal.Decimal('1.5000'), 'insert_seconds': decimal.Decimal('2.0000'),
+                     'delete_seconds': decimal.Decimal('3.0000'), 'commit_seconds': decimal.Decimal('0.5000'),
+                     'throttle_seconds': decimal.Decimal('0.0000')}]
+
+    conn = ResumeConn()
+    stats = new_stats(conn)
+    assert stats.load()
+    stats.parse_line('SELECT 500')
+    stats.parse_line('DELETE 500')
+    stats.parse_line('select                501     0.2500      15.00')
+    stats.finish(50)
+    totals = stats.totals()
+    assert totals['rows_selected'] == 1500
+    assert totals['rows_deleted'] == 1400
+    assert totals['elapsed_seconds'] == 150
+    assert totals['rows_per_sec'] == 10.0
+    assert totals['select_seconds'] == 1.75
+    assert stats.snapshot()['rows_selected'] == 500  # 监控指标只看本次执行
+    sql, args = conn.executed[-1]
+    assert args[2] == 1500
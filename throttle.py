@@ -0,0 +1,161 @@
+#!/bin/python3
+# -*- encoding: utf-8 -*-
+"""
+####################################################################################################
+#  Name        :  throttle.py
+#  Author      :  Elison
+#  Email       :  Ly99@qq.com
+#  Description :  归档限流：定时采样源库Threads_running和从库复制延迟，超过阈值时在批次之间暂停
+#  Updates     :
+#      Version     When            What
+#      --------    -----------     -----------------------------------------------------------------
+#      v1.0        2026-10-18
+#      v1.1        2026-10-18      wait()增加on_wait回调，暂停期间增量累计暂停时间
+####################################################################################################
+"""
+import time
+import logging
+import threading
+import util
+
+
+def parse_hosts(hosts_str):
+    "解析实例列表，如：10.0.0.201:3306,10.0.0.202:3306"
+    hosts = []
+    if not hosts_str:
+        return hosts
+    for i in hosts_str.split(','):
+        i = i.strip()
+        if not i:
+            continue
+        host, port = i.split(':')
+        hosts.append((host, int(port)))
+    return hosts
+
+
+class Throttler:
+    "限流器：后台线程按固定间隔采样，归档线程在批次之间调用wait()"
+
+    def __init__(self, source_conf, replica_confs, max_lag, max_threads_running, interval=1):
+        self.source_conf = source_conf
+        self.replica_confs = replica_confs
+        self.max_lag = max_lag
+        self.max_threads_running = max_threads_running
+        self.interval = interval
+        self.conns = {}
+        self.overloaded = False
+        self.reason = ''
+        self.throttle_seconds = 0.0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def is_enabled(self):
+        "是否需要限流"
+        return self.max_threads_running > 0 or (self.max_lag > 0 and len(self.replica_confs) > 0)
+
+    def get_conn(self, conf):
+        "获取采样连接，断开后重连"
+        key = "{}:{}".format(conf['host'], conf['port'])
+        conn = self.conns.get(key)
+        if conn is None:
+            conn = util.mysql(conf)
+            conn.conn.autocommit(True)
+            self.conns[key] = conn
+        return conn
+
+    def close_conn(self, conf):
+        "关闭采样连接"
+        key = "{}:{}".format(conf['host'], conf['port'])
+        conn = self.conns.pop(key, None)
+        if conn:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def get_threads_running(self):
+        "获取源库Threads_running"
+        res = self.get_conn(self.source_conf).query("show global status like 'Threads_running'")
+        return int(res[0]['Value'])
+
+    def get_replica_lag(self, conf):
+        "获取从库复制延迟，复制中断时返回None"
+        res = self.get_conn(conf).query("show slave status")
+        if not res:
+            return 0
+        row = res[0]
+        if 'Seconds_Behind_Master' in row:
+            return row['Seconds_Behind_Master']
+        return row.get('Seconds_Behind_Source')
+
+    def sample(self):
+        "采样一次，返回超过阈值的原因，未超过返回空字符串"
+        reasons = []
+        if self.max_threads_running > 0:
+            try:
+                threads_running = self.get_threads_running()
+                if threads_running > self.max_threads_running:
+                    reasons.append("Threads_running={}".format(threads_running))
+            except Exception as e:
+                logging.warning("采样源库Threads_running报错：{}".format(e))
+                self.close_conn(self.source_conf)
+        if self.max_lag > 0:
+            for conf in self.replica_confs:
+                try:
+                    lag = self.get_replica_lag(conf)
+                    if lag is None:
+                        reasons.append("{}:{} 复制中断".format(conf['host'], conf['port']))
+                    elif lag > self.max_lag:
+                        reasons.append("{}:{} 延迟{}s".format(conf['host'], conf['port'], lag))
+                except Exception as e:
+                    logging.warning("采样从库{}:{}复制延迟报错：{}".format(conf['host'], conf['port'], e))
+                    self.close_conn(conf)
+        return ','.join(reasons)
+
+    def sample_job(self):
+        "采样线程"
+        while not self.stop_event.is_set():
+            reason = self.sample()
+            with self.lock:
+                if reason and not self.overloaded:
+                    logging.info("超过限流阈值，暂停归档：{}".format(reason))
+                elif not reason and self.overloaded:
+                    logging.info("低于限流阈值，恢复归档")
+                self.overloaded = bool(reason)
+                self.reason = reason
+            self.stop_event.wait(self.interval)
+        for conf in [self.source_conf] + self.replica_confs:
+            self.close_conn(conf)
+
+    def start(self):
+        "启动采样线程"
+        if not self.is_enabled():
+            return
+        self.thread = threading.Thread(name='Throttler', target=self.sample_job, args=())
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        "停止采样线程"
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+
+    def wait(self, stop_event=None, on_wait=None):
+        "超过阈值时阻塞，直到恢复或收到停止信号，返回本次暂停的秒数；on_wait在暂停期间每次醒来时回调（参数为新增的暂停秒数）"
+        if not self.overloaded:
+            return 0
+        ts = time.time()
+        last = ts
+        while self.overloaded and not self.stop_event.is_set():
+            if stop_event is not None and stop_event.is_set():
+                break
+            time.sleep(min(self.interval, 1))
+            now = time.time()
+            with self.lock:
+                self.throttle_seconds += now - last
+            if on_wait is not None:
+                on_wait(now - last)
+            last = now
+        return time.time() - ts
@@ -0,0 +1,98 @@
+-- 已部署的configdb升级到当前版本：只增加缺少的字段、索引和表，不删除数据，可以重复执行
+-- 用法：mysql -h<configdb> -P<port> -u<user> -p mysql_archiver < upgrade.sql
+
+drop procedure if exists archiver_add_column;
+drop procedure if exists archiver_add_index;
+delimiter //
+create procedure archiver_add_column(in tb varchar(64), in col varchar(64), in ddl varchar(2000))
+begin
+    if not exists(select 1 from information_schema.COLUMNS where table_schema=database() and table_name=tb and column_name=col) then
+        set @ddl = concat('alter table `', tb, '` add column ', ddl);
+        prepare stmt from @ddl;
+        execute stmt;
+        deallocate prepare stmt;
+    end if;
+end //
+create procedure archiver_add_index(in tb varchar(64), in idx varchar(64), in ddl varchar(2000))
+begin
+    if not exists(select 1 from information_schema.STATISTICS where table_schema=database() and table_name=tb and index_name=idx) then
+        set @ddl = concat('alter table `', tb, '` add ', ddl);
+        prepare stmt from @ddl;
+        execute stmt;
+        deallocate prepare stmt;
+    end if;
+end //
+delimiter ;
+
+-- archive_config
+alter table archive_config modify `archive_mode` varchar(40) NOT NULL DEFAULT 'archive' COMMENT '归档模式：archive（归档），archive-slow(慢模式，兼容性高),delete(只删除不归档)，archive-to-file(归档到文件)，archive-native(原生引擎)，archive-to-file-native(原生引擎归档到压缩文件)';
+call archiver_add_column('archive_config', 'split_parallel', "`split_parallel` tinyint(4) NOT NULL DEFAULT '1' COMMENT '按主键范围拆分并行归档的段数，仅archive-native模式有效' after `priority`");
+call archiver_add_column('archive_config', 'chunk_size', "`chunk_size` int(11) NOT NULL DEFAULT '1000' COMMENT '每批次行数（pt-archiver的--limit/--txn-size），archive-native模式为初始批次行数' after `split_parallel`");
+call archiver_add_column('archive_config', 'chunk_size_min', "`chunk_size_min` int(11) NOT NULL DEFAULT '100' COMMENT 'archive-native模式自适应调整批次大小的下限，auto_plan计算批次大小的下限' after `chunk_size`");
+call archiver_add_column('archive_config', 'chunk_size_max', "`chunk_size_max` int(11) NOT NULL DEFAULT '20000' COMMENT 'archive-native模式自适应调整批次大小的上限，auto_plan计算批次大小的上限' after `chunk_size_min`");
+call archiver_add_column('archive_config', 'txn_target_ms', "`txn_target_ms` int(11) NOT NULL DEFAULT '500' COMMENT 'archive-native模式单个事务的目标耗时（毫秒），0表示固定批次大小' after `chunk_size_max`");
+call archiver_add_column('archive_config', 'replica_hosts', "`replica_hosts` varchar(1000) NOT NULL DEFAULT '' COMMENT '需要检查复制延迟的从库，如：10.0.0.202:3306,10.0.0.203:3306' after `txn_target_ms`");
+call archiver_add_column('archive_config', 'file_compress', "`file_compress` varchar(10) NOT NULL DEFAULT 'gzip' COMMENT 'archive-to-file-native模式的压缩格式：gzip、zstd(需要安装zstandard)' after `replica_hosts`");
+call archiver_add_column('archive_config', 'time_column', "`time_column` varchar(64) NOT NULL DEFAULT '' COMMENT '时间字段，archive-to-file-native模式在manifest中记录每个文件的时间范围' after `file_compress`");
+call archiver_add_column('archive_config', 'dest_writer', "`dest_writer` varchar(20) NOT NULL DEFAULT 'insert' COMMENT 'archive-native模式写入归档表的方式：insert(多行insert)、load-data(LOAD DATA LOCAL INFILE，归档实例需开启local_infile)' after `time_column`");
+call archiver_add_column('archive_config', 'verify_checksum', "`verify_checksum` tinyint(4) NOT NULL DEFAULT '0' COMMENT 'archive-native模式删除源表数据前是否比较每批次的行数和校验和' after `dest_writer`");
+call archiver_add_column('archive_config', 'auto_plan', "`auto_plan` tinyint(4) NOT NULL DEFAULT '0' COMMENT '执行前EXPLAIN归档条件，自动选择是否按主键顺序扫描（pt-archiver模式）和批次大小（在chunk_size_min和chunk_size_max之间）' after `verify_checksum`");
+
+-- archive_tasks
+alter table archive_tasks modify `archive_mode` varchar(40) DEFAULT 'archive' COMMENT '归档模式：archive（归档），archive-slow(慢模式，兼容性高),delete(只删除不归档)，archive-to-file(归档到文件)，archive-native(原生引擎)，archive-to-file-native(原生引擎归档到压缩文件)';
+call archiver_add_column('archive_tasks', 'config_id', "`config_id` int(11) NOT NULL COMMENT 'archive_config.id' after `id`");
+call archiver_add_column('archive_tasks', 'task_date', "`task_date` date DEFAULT NULL COMMENT '任务日期，同一配置每天只生成一个任务' after `config_id`");
+call archiver_add_column('archive_tasks', 'auto_plan', "`auto_plan` tinyint(4) DEFAULT '0' COMMENT '是否根据归档计划自动调整归档命令' after `archive_cmd`");
+call archiver_add_column('archive_tasks', 'est_rows', "`est_rows` bigint(20) DEFAULT NULL COMMENT '执行前估算的归档行数' after `auto_plan`");
+call archiver_add_column('archive_tasks', 'est_key', "`est_key` varchar(64) DEFAULT NULL COMMENT '归档计划使用的索引' after `est_rows`");
+call archiver_add_column('archive_tasks', 'est_plan', "`est_plan` varchar(200) DEFAULT NULL COMMENT '归档计划：是否按主键顺序扫描、批次大小、估算扫描行数' after `est_key`");
+call archiver_add_column('archive_tasks', 'predicted_seconds', "`predicted_seconds` int(11) DEFAULT NULL COMMENT '根据历史预测的执行时间（秒），与exec_seconds对比' after `est_plan`");
+call archiver_add_column('archive_tasks', 'planned_start', "`planned_start` datetime DEFAULT NULL COMMENT '计划开始时间' after `predicted_seconds`");
+call archiver_add_column('archive_tasks', 'owner', "`owner` varchar(100) DEFAULT NULL COMMENT '认领任务的进程（节点标识:进程号:启动时间）' after `planned_start`");
+call archiver_add_column('archive_tasks', 'lease_expire', "`lease_expire` datetime DEFAULT NULL COMMENT '租约过期时间，节点定期续租，过期后其他节点回收任务' after `owner`");
+call archiver_add_column('archive_tasks', 'log_summary', "`log_summary` text COMMENT '日志摘要（json）：行数、字节数、错误行、退出码、压缩日志文件' after `exec_log`");
+call archiver_add_column('archive_tasks', 'sys_ctime', "`sys_ctime` datetime DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间' after `log_summary`");
+-- 已有任务的task_date为NULL，不影响唯一键
+call archiver_add_index('archive_tasks', 'uk_config_id_task_date', "UNIQUE KEY `uk_config_id_task_date` (`config_id`,`task_date`)");
+call archiver_add_index('archive_tasks', 'idx_config_id', "KEY `idx_config_id` (`config_id`,`exec_start`)");
+call archiver_add_index('archive_tasks', 'idx_sys_ctime', "KEY `idx_sys_ctime` (`sys_ctime`)");
+call archiver_add_index('archive_tasks', 'idx_exec_status_lease_expire', "KEY `idx_exec_status_lease_expire` (`exec_status`,`lease_expire`)");
+call archiver_add_index('archive_tasks', 'idx_owner', "KEY `idx_owner` (`owner`)");
+
+-- 新增的表
+CREATE TABLE IF NOT EXISTS `archive_task_stats`
+(
+    `task_id`          int(11) NOT NULL COMMENT 'archive_tasks.id',
+    `config_id`        int(11) DEFAULT NULL COMMENT 'archive_config.id',
+    `rows_selected`    bigint(20) NOT NULL DEFAULT '0' COMMENT '读取行数',
+    `rows_inserted`    bigint(20) NOT NULL DEFAULT '0' COMMENT '写入行数',
+    `rows_deleted`     bigint(20) NOT NULL DEFAULT '0' COMMENT '删除行数',
+    `rows_per_sec`     decimal(12,2) NOT NULL DEFAULT '0.00' COMMENT '每秒处理行数',
+    `elapsed_seconds`  int(11) NOT NULL DEFAULT '0' COMMENT '已运行秒数',
+    `select_seconds`   decimal(12,4) NOT NULL DEFAULT '0.0000' COMMENT 'select耗时（秒）',
+    `insert_seconds`   decimal(12,4) NOT NULL DEFAULT '0.0000' COMMENT 'insert/写文件耗时（秒）',
+    `delete_seconds`   decimal(12,4) NOT NULL DEFAULT '0.0000' COMMENT 'delete耗时（秒）',
+    `commit_seconds`   decimal(12,4) NOT NULL DEFAULT '0.0000' COMMENT 'commit耗时（秒）',
+    `throttle_seconds` decimal(12,4) NOT NULL DEFAULT '0.0000' COMMENT '限流暂停时间（秒）',
+    `sys_ctime`        datetime DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    `sys_utime`        datetime DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '修改时间',
+    PRIMARY KEY (`task_id`),
+    KEY                `idx_config_id` (`config_id`,`sys_ctime`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COMMENT='归档任务统计表';
+
+CREATE TABLE IF NOT EXISTS `archive_checkpoint`
+(
+    `config_id`  int(11) NOT NULL COMMENT 'archive_config.id',
+    `where_hash` char(32) NOT NULL DEFAULT '' COMMENT '源表和归档条件的md5，修改后丢弃断点',
+    `key_ranges` text     NOT NULL COMMENT '主键范围（json），按主键拆分并行归档时每段一个范围',
+    `last_pk`    text     NOT NULL COMMENT '每个主键范围已删除的最大主键（json）',
+    `rows_done`  bigint(20) NOT NULL DEFAULT '0' COMMENT '已归档行数',
+    `sys_ctime`  datetime DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    `sys_utime`  datetime DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '修改时间',
+    PRIMARY KEY (`config_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COMMENT='原生引擎归档断点表';
+-- 已有的断点where_hash为空，第一次执行时丢弃断点，用replace写入
+call archiver_add_column('archive_checkpoint', 'where_hash', "`where_hash` char(32) NOT NULL DEFAULT '' COMMENT '源表和归档条件的md5，修改后丢弃断点' after `config_id`");
+
+drop procedure if exists archiver_add_column;
+drop procedure if exists archiver_add_index;
@@ -5,11 +5,17 @@
 #  Author       :  Elison                        #
 #  Email        :  Ly99@qq.com                   #
 #  Description  :  公共函数                      #
-#  Version      :  v1.0                          #
-#  LastUpdated  :  2021-08-30                    #
+#  Version      :  v1.1                          #
+#  LastUpdated  :  2026-10-18                    #
 # ---------------------------------------------- #
 
+import os
+import sys
 import time
+import shutil
+import tempfile
+import logging
+import threading
 import subprocess
 import requests
 import pymysql
@@ -34,15 +40,36 @@ def send_msg_to_wxwork(webhook, msg_title, msg_content):
     return response.json()
 
 
-def run_command(command, logfile):
-    "运行命令"
+def run_command(command, logfile, line_callback=None, on_start=None):
+    "运行命令，指定line_callback时逐行回调输出，on_start在进程启动后回调（参数为Popen对象）"
     with open(logfile, 'w') as f:
-        p = subprocess.Popen(command, shell=True, stdout=f, stderr=subprocess.STDOUT, bufsize=1,
-                             env={'LANG': 'en_US.UTF-8'})
+        if line_callback is None:
+            p = subprocess.Popen(command, shell=True, stdout=f, stderr=subprocess.STDOUT, bufsize=1,
+                                 env={'LANG': 'en_US.UTF-8'})
+        else:
+            p = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                 env={'LANG': 'en_US.UTF-8'})
+        if on_start is not None:
+            on_start(p)
+        if line_callback is not None:
+            for line in p.stdout:
+                text = line.decode('utf8', errors='replace')
+                f.write(text)
+                f.flush()
+                try:
+                    line_callback(text)
+                except Exception:
+                    logging.warning('处理输出行报错：{}'.format(text.rstrip()), exc_info=True)
         p.wait()
     return p.returncode
 
 
+def run_command_stdout(command):
+    "运行命令，输出直接写到当前进程的标准输出，返回退出码"
+    sys.stdout.flush()
+    return subprocess.call(command, shell=True, env={'LANG': 'en_US.UTF-8'})
+
+
 def run_command_realtime(command):
     "运行命令"
     # 2秒刷新一次标准输出
@@ -65,9 +92,8 @@ def run_command_realtime(command):
             try:
                 text = line.decode('utf8')
                 yield text
-            except Exception as e:
-                print(str(e))
-                print(line)
+            except Exception:
+                logging.warning('解码输出行报错：{}'.format(line), exc_info=True)
         else:
             time.sleep(2)
 
@@ -85,10 +111,10 @@ class mysql:
         # 创建连接
         self.conn = pymysql.connect(**conf)
 
-    def query(self, sql):
+    def query(self, sql, args=None):
         "查询"
         cur = self.conn.cursor()
-        cur.execute(sql)
+        cur.execute(sql, args)
         res = cur.fetchall()
         cur.close()
         return res
@@ -104,6 +130,14 @@ class mysql:
         cur.close()
         return 1
 
+    def update(self, sql, args=None):
+        "执行并返回影响行数"
+        cur = self.conn.cursor()
+        cnt = cur.execute(sql, args)
+        self.conn.commit()
+        cur.close()
+        return cnt
+
     def batch_insert(self, table_name, fieldname_list, rows):
         "批量插入数据"
         cur = self.conn.cursor()
@@ -114,6 +148,27 @@ class mysql:
         self.conn.commit()
         cur.close()
 
+    def batch_insert_chunks(self, table_name, fieldname_list, rows, chunk_size=1000, ignore=False):
+        "在一个事务内分批插入数据，ignore=True时忽略唯一键冲突的行，返回插入的行数"
+        if not rows:
+            return 0
+        value_text = ','.join(['%s' for i in fieldname_list])
+        fieldname_text = ','.join(fieldname_list)
+        sql = 'insert {0}into {1}({2}) values({3})'.format('ignore ' if ignore else '', table_name, fieldname_text,
+                                                          value_text)
+        cur = self.conn.cursor()
+        cnt = 0
+        try:
+            for i in range(0, len(rows), chunk_size):
+                cnt += cur.executemany(sql, rows[i:i + chunk_size])
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cur.close()
+        return cnt
+
     def batch_replace(self, table_name, fieldname_list, rows):
         "批量替换数据"
         cur = self.conn.cursor()
@@ -130,6 +185,212 @@ class mysql:
         self.conn.close()
 
 
+def load_data_stream(conn, table_name, fieldname_list, data_iter, charset='utf8mb4', binary_fields=None,
+                     replace=False):
+    "通过命名管道把data_iter(bytes迭代器)流式导入LOAD DATA LOCAL INFILE，二进制字段为十六进制，返回导入行数（不提交）"
+    binary_fields = binary_fields or []
+    columns = []
+    sets = []
+    for i in fieldname_list:
+        if i in binary_fields:
+            columns.append('@`{}`'.format(i))
+            sets.append('`{0}`=unhex(@`{0}`)'.format(i))
+        else:
+            columns.append('`{}`'.format(i))
+    tmpdir = tempfile.mkdtemp(prefix='load_data_')
+    fifo = os.path.join(tmpdir, 'data.tsv')
+    os.mkfifo(fifo)
+    errors = []
+    stop_event = threading.Event()
+
+    def feed():
+        try:
+            with open(fifo, 'wb') as f:
+                for data in data_iter:
+                    if stop_event.is_set():
+                        break
+                    f.write(data)
+        except BrokenPipeError:
+            pass
+        except Exception as e:
+            errors.append(e)
+
+    sql = "load data local infile '{}' {} into table {} character set {} ({})".format(
+        fifo, 'replace' if replace else '', table_name, charset, ','.join(columns))
+    if sets:
+        sql += " set {}".format(','.join(sets))
+    feeder = threading.Thread(target=feed)
+    feeder.daemon = True
+    feeder.start()
+    try:
+        cur = conn.conn.cursor()
+        cnt = cur.execute(sql)
+        cur.close()
+    finally:
+        if feeder.is_alive():
+            # 服务端未读完管道时（如语句报错），打开读端让写线程退出
+            stop_event.set()
+            try:
+                fd = os.open(fifo, os.O_RDONLY | os.O_NONBLOCK)
+                while feeder.is_alive():
+                    try:
+                        if not os.read(fd, 65536):
+                            feeder.join(0.1)
+                    except BlockingIOError:
+                        feeder.join(0.1)
+                os.close(fd)
+            except OSError:
+                pass
+        feeder.join()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    if errors:
+        raise errors[0]
+    return cnt
+
+
+class pooled_mysql(mysql):
+    "连接池中的mysql连接，close()时归还到连接池"
+
+    def __init__(self, pool, config, mode='dict'):
+        super().__init__(config, mode)
+        self.pool = pool
+        self.refcount = 0
+        self.last_used = time.time()
+
+    def query(self, sql, args=None):
+        "查询（记录耗时）"
+        ts = time.time()
+        try:
+            return super().query(sql, args)
+        finally:
+            self.pool.record(time.time() - ts)
+
+    def execute(self, sql, row=None):
+        "执行（记录耗时）"
+        ts = time.time()
+        try:
+            return super().execute(sql, row)
+        finally:
+            self.pool.record(time.time() - ts)
+
+    def update(self, sql, args=None):
+        "执行并返回影响行数（记录耗时）"
+        ts = time.time()
+        try:
+            return super().update(sql, args)
+        finally:
+            self.pool.record(time.time() - ts)
+
+    def close(self):
+        "归还连接"
+        self.pool.release(self)
+
+    def destroy(self):
+        "真正关闭数据库连接"
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+
+class mysql_pool:
+    "线程安全的mysql连接池：按线程签出连接，复用前做健康检查，空闲超时的连接自动关闭"
+
+    def __init__(self, config, mode='dict', max_idle=5, max_idle_seconds=300, ping_seconds=5):
+        self.config = config
+        self.mode = mode
+        self.max_idle = max_idle
+        self.max_idle_seconds = max_idle_seconds
+        self.ping_seconds = ping_seconds  # 空闲超过该时间的连接，复用前先ping
+        self.idle = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.query_count = 0  # 累计执行的sql数和耗时，用于监控
+        self.query_seconds = 0.0
+
+    def record(self, seconds):
+        "累加sql耗时"
+        with self.lock:
+            self.query_count += 1
+            self.query_seconds += seconds
+
+    def evict(self):
+        "关闭空闲超时的连接"
+        now = time.time()
+        with self.lock:
+            expired = [i for i in self.idle if now - i.last_used > self.max_idle_seconds]
+            self.idle = [i for i in self.idle if now - i.last_used <= self.max_idle_seconds]
+        for i in expired:
+            i.destroy()
+
+    def is_healthy(self, conn):
+        "健康检查"
+        if not conn.conn.open:
+            return False
+        if time.time() - conn.last_used < self.ping_seconds:
+            return True
+        try:
+            conn.conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def get_conn(self):
+        "签出连接，同一线程重复签出时返回同一个连接"
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            if conn.conn.open:
+                conn.refcount += 1
+                return conn
+            conn.destroy()
+            self.local.conn = None
+
+        self.evict()
+        conn = None
+        while True:
+            with self.lock:
+                candidate = self.idle.pop() if self.idle else None
+            if candidate is None:
+                break
+            if self.is_healthy(candidate):
+                conn = candidate
+                break
+            candidate.destroy()
+        if conn is None:
+            conn = pooled_mysql(self, self.config, self.mode)
+        conn.refcount = 1
+        self.local.conn = conn
+        return conn
+
+    def release(self, conn):
+        "归还连接"
+        conn.refcount -= 1
+        if conn.refcount > 0:
+            return
+        if getattr(self.local, 'conn', None) is conn:
+            self.local.conn = None
+        try:
+            conn.conn.rollback()  # 结束未提交的事务，避免复用时读到旧快照
+        except Exception:
+            conn.destroy()
+            return
+        conn.last_used = time.time()
+        with self.lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append(conn)
+                conn = None
+        if conn is not None:
+            conn.destroy()
+        self.evict()
+
+    def close(self):
+        "关闭连接池中所有空闲连接"
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for i in idle:
+            i.destroy()
+
+
 # main
 if __name__ == "__main__":
     mode = 'dict'